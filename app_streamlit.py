@@ -1,10 +1,41 @@
 # app_streamlit.py
 import io
+import os
 from datetime import datetime
+from importlib.machinery import ModuleSpec
 import pandas as pd
 import streamlit as st
 
+# Los workers de lectura (forkserver/spawn) re-ejecutan el script principal salvo
+# que su módulo se llame "__main__": así no vuelven a correr la app entera.
+__spec__ = ModuleSpec("__main__", None)
+
 from core_consolidacion import MESES_ES  # solo para usar nombres de meses
+from core_cubo import ACCIONES_CUBO, CuboDiario
+from core_analisis import (
+    ACCIONES,
+    ESQUEMA_POR_DEFECTO,
+    EXTENSIONES_SOPORTADAS,
+    FILTROS_GLOBALES,
+    FRECUENCIAS_PERIODO,
+    HLL_PRECISION_DEFAULT,
+    NIVELES_JERARQUIA,
+    TODOS_LOS_ARCHIVOS,
+    VENTANAS_DEMANDA,
+    agregar_columnas_adicionales,
+    aplicar_filtros_globales,
+    hll_error_relativo,
+    leer_excels_subidos,
+    listar_hojas,
+    nombre_hoja_excel,
+    optimizar_tipos,
+    ordenar_por_fecha,
+    perfil_calidad,
+)
+from core_sql import ACCIONES_SQL, cargar_dataframe, motores_sql_disponibles
+from core_telemetria import Telemetria, contar_filas
+from core_trabajos import TrabajoAnalisis
+from core_workspace import DIRECTORIO_WORKSPACES, abrir_workspace, guardar_workspace, listar_workspaces
 
 
 st.set_page_config(page_title="Data Workbench de Ventas", layout="wide")
@@ -12,23 +43,16 @@ st.set_page_config(page_title="Data Workbench de Ventas", layout="wide")
 
 # ===================== UTILIDADES =====================
 
-def leer_excels_subidos(uploaded_files):
-    """Combina todos los Excels subidos en un único DataFrame."""
-    frames = []
-    for up in uploaded_files:
-        df = pd.read_excel(up, sheet_name=0)
-        df["_archivo_origen"] = up.name
-        frames.append(df)
-    if not frames:
-        raise ValueError("No se pudo leer ningún archivo.")
-    return pd.concat(frames, ignore_index=True)
-
+def get_schema_mapping(df, defaults=None):
+    """UI: deja al usuario mapear qué columna es qué cosa.
 
-def get_schema_mapping(df):
-    """UI: deja al usuario mapear qué columna es qué cosa."""
+    ``defaults`` (p. ej. el esquema guardado en un workspace) reemplaza a
+    ESQUEMA_POR_DEFECTO como selección inicial.
+    """
     st.subheader("Mapear columnas (esquema)")
 
     cols = ["<Ninguna>"] + list(df.columns)
+    defaults = {**ESQUEMA_POR_DEFECTO, **(defaults or {})}
 
     def select(label, default):
         return st.selectbox(label, options=cols,
@@ -36,25 +60,29 @@ def get_schema_mapping(df):
 
     c1, c2, c3 = st.columns(3)
     with c1:
-        fecha_col = select("Columna de fecha de comprobante", "Fecha")
-        ticket_col = select("Columna de N° de comprobante / ticket", "Ticket")
-        cliente_col = select("Columna de cliente", "IdCliente")
+        fecha_col = select("Columna de fecha de comprobante", defaults["fecha"])
+        ticket_col = select("Columna de N° de comprobante / ticket", defaults["ticket"])
+        cliente_col = select("Columna de cliente", defaults["cliente"])
 
     with c2:
-        prod_col = select("Columna de IdArticulo / SKU", "IdArticulo")
-        desc_col = select("Columna de descripción producto", "Descripcion")
-        depto_col = select("Columna de departamento / familia", "Departamento")
+        prod_col = select("Columna de IdArticulo / SKU", defaults["producto"])
+        desc_col = select("Columna de descripción producto", defaults["descripcion"])
+        depto_col = select("Columna de departamento / familia", defaults["departamento"])
 
     with c3:
-        cant_col = select("Columna de cantidad", "Cantidad")
-        precio_col = select("Columna de precio unitario", "PrecioUnitario")
-        total_col = select("Columna de total de línea / ticket", "Total")
+        cant_col = select("Columna de cantidad", defaults["cantidad"])
+        precio_col = select("Columna de precio unitario", defaults["precio"])
+        total_col = select("Columna de total de línea / ticket", defaults["total"])
 
-    c4, c5 = st.columns(2)
+    c4, c5, c6, c7 = st.columns(4)
     with c4:
-        sucursal_col = select("Columna de sucursal / unidad de negocio", "Sucursal")
+        sucursal_col = select("Columna de sucursal / unidad de negocio", defaults["sucursal"])
     with c5:
-        vendedor_col = select("Columna de vendedor / cajero", "Vendedor")
+        vendedor_col = select("Columna de vendedor / cajero", defaults["vendedor"])
+    with c6:
+        familia_col = select("Columna de familia", defaults["familia"])
+    with c7:
+        subfamilia_col = select("Columna de subfamilia", defaults["subfamilia"])
 
     schema = {
         "fecha": None if fecha_col == "<Ninguna>" else fecha_col,
@@ -63,6 +91,8 @@ def get_schema_mapping(df):
         "producto": None if prod_col == "<Ninguna>" else prod_col,
         "descripcion": None if desc_col == "<Ninguna>" else desc_col,
         "departamento": None if depto_col == "<Ninguna>" else depto_col,
+        "familia": None if familia_col == "<Ninguna>" else familia_col,
+        "subfamilia": None if subfamilia_col == "<Ninguna>" else subfamilia_col,
         "cantidad": None if cant_col == "<Ninguna>" else cant_col,
         "precio": None if precio_col == "<Ninguna>" else precio_col,
         "total": None if total_col == "<Ninguna>" else total_col,
@@ -72,6 +102,37 @@ def get_schema_mapping(df):
     return schema
 
 
+def mostrar_jerarquia(arbol, clave):
+    """Drill-down sobre el árbol ya calculado: cada selección filtra filas, no vuelve a agrupar."""
+    niveles = [nombre for _, nombre in NIVELES_JERARQUIA if nombre in arbol.columns]
+    cruce = list(arbol.columns[:arbol.columns.get_loc("Nivel")])
+    vista = arbol
+    if cruce:
+        valor = st.selectbox(cruce[0], vista[cruce[0]].unique(), key=f"{clave}_cruce")
+        vista = vista[vista[cruce[0]] == valor]
+
+    ruta = []
+    columnas = st.columns(max(len(niveles) - 1, 1))
+    for k, nivel in enumerate(niveles[:-1], start=1):
+        opciones = vista.loc[vista["Nivel"] == k, nivel].tolist()
+        with columnas[k - 1]:
+            eleccion = st.selectbox(nivel, ["(todos)"] + opciones, key=f"{clave}_{nivel}")
+        if eleccion == "(todos)":
+            break
+        vista = vista[vista[nivel] == eleccion]
+        ruta.append(eleccion)
+
+    nodo = vista[vista["Nivel"] == len(ruta)].iloc[0]
+    hijos = vista[vista["Nivel"] == len(ruta) + 1]
+    st.metric(" → ".join(["TOTAL"] + [str(r) for r in ruta]), f"{nodo['Total']:,.2f}",
+              help=f"{nodo['Participacion_total_%']:.2f}% del total")
+    medidas = [c for c in ["Total", "Unidades", "Lineas", "Participacion_padre_%", "Participacion_total_%"]
+               if c in hijos.columns]
+    st.dataframe(hijos[[niveles[len(ruta)]] + medidas], hide_index=True)
+    with st.expander("Árbol completo"):
+        st.dataframe(arbol.drop(columns=niveles), hide_index=True)
+
+
 def get_columnas_adicionales_config():
     """UI para que el usuario seleccione año y columnas mensuales adicionales."""
     st.subheader("Configuración de columnas adicionales")
@@ -120,641 +181,211 @@ def get_columnas_adicionales_config():
     }
 
 
-def agregar_columnas_adicionales(df_resultado, config_cols, df_original, schema):
-    """Agrega las columnas adicionales seleccionadas al DataFrame de resultados."""
-    if not config_cols["columnas"]:
-        return df_resultado
-    
-    df = df_resultado.copy()
-    anio = config_cols["anio"]
-    
-    # Verificar si el df original tiene datos de fecha
-    if schema.get("fecha") and schema.get("total"):
-        df_orig = df_original.copy()
-        df_orig[schema["fecha"]] = pd.to_datetime(df_orig[schema["fecha"]], errors="coerce")
-        df_orig = df_orig.dropna(subset=[schema["fecha"]])
-        
-        # Agregar columnas mensuales
-        for mes_col in config_cols["meses"]:
-            # Extraer número de mes del nombre
-            mes_nombre = mes_col.split()[0]
-            mes_map = {
-                "ENERO": 1, "FEBRERO": 2, "MARZO": 3, "ABRIL": 4,
-                "MAYO": 5, "JUNIO": 6, "JULIO": 7, "AGOSTO": 8, "SEPTIEMBRE": 9
-            }
-            mes_num = mes_map.get(mes_nombre)
-            
-            if mes_num:
-                # Filtrar datos del mes y año específico
-                mask = (df_orig[schema["fecha"]].dt.year == anio) & \
-                       (df_orig[schema["fecha"]].dt.month == mes_num)
-                total_mes = df_orig.loc[mask, schema["total"]].sum()
-                df[mes_col] = total_mes
-        
-        # Agregar columnas de totales (si hay información de sucursal)
-        if schema.get("sucursal"):
-            for total_col in config_cols["totales"]:
-                if total_col == "TOTAL HIPER":
-                    # Filtrar por sucursales tipo "HIPER" (ajustar según tu lógica)
-                    mask = df_orig[schema["sucursal"]].str.contains("HIPER", case=False, na=False)
-                    df[total_col] = df_orig.loc[mask, schema["total"]].sum()
-                elif total_col == "TOTAL CORRIENTES":
-                    # Filtrar por sucursales en Corrientes (ajustar según tu lógica)
-                    mask = df_orig[schema["sucursal"]].str.contains("CORRIENTES", case=False, na=False)
-                    df[total_col] = df_orig.loc[mask, schema["total"]].sum()
-                elif total_col == "TOTAL CONSOLIDADO":
-                    df[total_col] = df_orig[schema["total"]].sum()
-        else:
-            # Si no hay sucursal, poner totales generales
-            for total_col in config_cols["totales"]:
-                if total_col == "TOTAL CONSOLIDADO":
-                    df[total_col] = df_orig[schema["total"]].sum()
-                else:
-                    df[total_col] = 0  # No se puede calcular sin info de sucursal
-    
-    return df
-
-
-# ===================== ACCIONES =====================
-
-def accion_totales_por_periodo(df, schema, periodo="mes", fecha_inicio=None, fecha_fin=None):
-    if not schema["fecha"] or not schema["total"]:
-        return "Requiere columna de fecha y total."
-
-    d = df.copy()
-    d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
-    d = d.dropna(subset=[schema["fecha"]])
-
-    if fecha_inicio:
-        d = d[d[schema["fecha"]] >= pd.to_datetime(fecha_inicio)]
-    if fecha_fin:
-        d = d[d[schema["fecha"]] <= pd.to_datetime(fecha_fin)]
-
-    if d.empty:
-        return pd.DataFrame(columns=["Periodo", "TotalFacturado"])
-
-    if periodo == "dia":
-        d["Periodo"] = d[schema["fecha"]].dt.date
-    elif periodo == "mes":
-        d["Periodo"] = d[schema["fecha"]].dt.to_period("M").astype(str)
-    elif periodo == "rango":
-        total = d[schema["total"]].sum()
-        return pd.DataFrame([{"Periodo": f"{fecha_inicio}–{fecha_fin}", "TotalFacturado": total}])
-    else:
-        d["Periodo"] = d[schema["fecha"]]
-
-    tabla = (
-        d.groupby("Periodo", as_index=False)[schema["total"]]
-        .sum()
-        .rename(columns={schema["total"]: "TotalFacturado"})
-        .sort_values("Periodo")
-    )
-    return tabla
-
-
-def accion_unidades_totales(df, schema, por="producto"):
-    if not schema["cantidad"]:
-        return "Requiere columna de cantidad."
-
-    if por == "producto" and schema["producto"]:
-        grupo = schema["producto"]
-        nombre = "IdArticulo"
-    elif por == "categoria" and schema["departamento"]:
-        grupo = schema["departamento"]
-        nombre = "Categoria"
-    elif por == "vendedor" and schema["vendedor"]:
-        grupo = schema["vendedor"]
-        nombre = "Vendedor"
-    else:
-        return "No se ha mapeado la columna necesaria para esta agregación."
-
-    tabla = (
-        df.groupby(grupo, as_index=False)[schema["cantidad"]]
-        .sum()
-        .rename(columns={grupo: nombre, schema["cantidad"]: "UnidadesVendidas"})
-        .sort_values("UnidadesVendidas", ascending=False)
-    )
-    return tabla
-
-
-def accion_conteo_tickets(df, schema, por="producto"):
-    if not schema["ticket"]:
-        return "Requiere columna de ticket."
-
-    d = df.copy()
-
-    if por == "producto" and schema["producto"]:
-        grupo = [schema["producto"]]
-        nombre = "IdArticulo"
-    elif por == "dia" and schema["fecha"]:
-        d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
-        d = d.dropna(subset=[schema["fecha"]])
-        d["Dia"] = d[schema["fecha"]].dt.date
-        grupo = ["Dia"]
-        nombre = "Dia"
-    elif por == "vendedor" and schema["vendedor"]:
-        grupo = [schema["vendedor"]]
-        nombre = "Vendedor"
-    else:
-        return "No se ha mapeado la columna necesaria para esta agregación."
-
-    tabla = (
-        d.groupby(grupo)[schema["ticket"]]
-        .nunique()
-        .reset_index(name="CantidadTickets")
-        .rename(columns={grupo[0]: nombre})
-        .sort_values("CantidadTickets", ascending=False)
-    )
-    return tabla
-
-
-def accion_productos_unicos(df, schema):
-    if not schema["producto"]:
-        return "Requiere columna de IdArticulo."
-    n = df[schema["producto"]].nunique()
-    lista = (
-        df[[schema["producto"], schema.get("descripcion", schema["producto"])]]
-        .drop_duplicates()
-        .reset_index(drop=True)
-    )
-    return n, lista
-
-
-def accion_productos_unicos_mes(df, schema):
-    if not schema["producto"] or not schema["fecha"]:
-        return "Requiere IdArticulo y fecha."
-    d = df.copy()
-    d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
-    d = d.dropna(subset=[schema["fecha"]])
-    d["Mes"] = d[schema["fecha"]].dt.to_period("M").astype(str)
-    tabla = (
-        d.groupby("Mes")[schema["producto"]]
-        .nunique()
-        .reset_index(name="ProductosUnicos")
-        .sort_values("Mes")
-    )
-    return tabla
-
-
-def accion_clientes_unicos(df, schema):
-    if not schema["cliente"]:
-        return "Requiere columna de cliente."
-    return df[schema["cliente"]].nunique()
-
-
-def accion_clientes_unicos_mes(df, schema):
-    if not schema["cliente"] or not schema["fecha"]:
-        return "Requiere cliente y fecha."
-    d = df.copy()
-    d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
-    d = d.dropna(subset=[schema["fecha"]])
-    d["Mes"] = d[schema["fecha"]].dt.to_period("M").astype(str)
-    tabla = (
-        d.groupby("Mes")[schema["cliente"]]
-        .nunique()
-        .reset_index(name="ClientesUnicos")
-        .sort_values("Mes")
-    )
-    return tabla
-
-
-def accion_clientes_recurrentes(df, schema, min_veces=2):
-    if not schema["cliente"] or not schema["ticket"]:
-        return "Requiere cliente y ticket."
-    tickets_por_cliente = (
-        df.groupby(schema["cliente"])[schema["ticket"]]
-        .nunique()
-        .reset_index(name="Compras")
-    )
-    recurrentes = tickets_por_cliente[tickets_por_cliente["Compras"] >= min_veces]
-    return recurrentes
-
-
-def accion_precio_promedio_producto(df, schema):
-    if not schema["producto"] or not schema["precio"]:
-        return "Requiere IdArticulo y precio unitario."
-    tabla = (
-        df.groupby(schema["producto"], as_index=False)[schema["precio"]]
-        .mean()
-        .rename(columns={schema["producto"]: "IdArticulo",
-                         schema["precio"]: "PrecioPromedio"})
-        .sort_values("PrecioPromedio", ascending=False)
-    )
-    return tabla
-
-
-def accion_ticket_promedio_por(df, schema, por="dia"):
-    if not schema["ticket"] or not schema["total"]:
-        return "Requiere ticket y total."
-
-    d = df.copy()
-    totales_por_ticket = (
-        d.groupby(schema["ticket"], as_index=False)[schema["total"]]
-        .sum()
-        .rename(columns={schema["total"]: "TotalTicket"})
-    )
-
-    if por == "dia" and schema["fecha"]:
-        d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
-        d = d.dropna(subset=[schema["fecha"]])
-        mapa_ticket_dia = d.groupby(schema["ticket"])[schema["fecha"]].min().dt.date
-        totales_por_ticket["Dia"] = totales_por_ticket[schema["ticket"]].map(mapa_ticket_dia)
-        tabla = (
-            totales_por_ticket.groupby("Dia")["TotalTicket"]
-            .mean()
-            .reset_index(name="TicketPromedio")
-        )
-    elif por == "vendedor" and schema["vendedor"]:
-        mapa_ticket_vend = d.groupby(schema["ticket"])[schema["vendedor"]].first()
-        totales_por_ticket["Vendedor"] = totales_por_ticket[schema["ticket"]].map(mapa_ticket_vend)
-        tabla = (
-            totales_por_ticket.groupby("Vendedor")["TotalTicket"]
-            .mean()
-            .reset_index(name="TicketPromedio")
-        )
-    else:
-        return "Falta mapear fecha o vendedor."
-
-    return tabla
-
-
-def accion_participacion(df, schema, nivel="producto"):
-    if not schema["total"]:
-        return "Requiere columna total."
-
-    if nivel == "producto" and schema["producto"]:
-        grupo = schema["producto"]
-        nombre = "IdArticulo"
-    elif nivel == "familia" and schema["departamento"]:
-        grupo = schema["departamento"]
-        nombre = "Familia"
-    else:
-        return "No se ha mapeado la columna necesaria."
-
-    d = df.copy()
-    tabla = (
-        d.groupby(grupo)[schema["total"]]
-        .sum()
-        .reset_index(name="Total")
-        .rename(columns={grupo: nombre})
-    )
-    total_general = tabla["Total"].sum()
-    tabla["Participacion_%"] = (tabla["Total"] / total_general * 100).round(2)
-    tabla = tabla.sort_values("Total", ascending=False)
-    return tabla
-
-
-def accion_segmentacion_sucursal(df, schema):
-    if not schema["sucursal"] or not schema["total"]:
-        return "Requiere sucursal y total."
-    tabla = (
-        df.groupby(schema["sucursal"], as_index=False)[schema["total"]]
-        .sum()
-        .rename(columns={schema["sucursal"]: "Sucursal",
-                         schema["total"]: "TotalFacturado"})
-        .sort_values("TotalFacturado", ascending=False)
-    )
-    return tabla
-
-
-def accion_maestro_productos(df, schema):
-    cols = []
-    for key in ["producto", "descripcion", "departamento"]:
-        col = schema.get(key)
-        if col:
-            cols.append(col)
-    if not cols:
-        return "No hay columnas de producto / descripción / departamento."
-
-    maestro = df[cols].drop_duplicates().reset_index(drop=True)
-    return maestro
-
-
-def accion_ventas_duplicadas(df, schema):
-    subset = []
-    for key in ["ticket", "fecha", "cliente", "total"]:
-        col = schema.get(key)
-        if col:
-            subset.append(col)
-    if len(subset) < 2:
-        return "Se necesitan al menos dos columnas (ej. ticket y fecha) para detectar duplicados."
-
-    d = df.copy()
-    if schema.get("fecha"):
-        d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
-
-    duplicados_mask = d.duplicated(subset=subset, keep=False)
-    dup = d[duplicados_mask].sort_values(subset)
-    return dup
-
-
-def accion_normalizar_fechas(df, schema):
-    if not schema["fecha"]:
-        return "Requiere columna de fecha."
-    d = df.copy()
-    d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
-    d["Fecha_normalizada"] = d[schema["fecha"]].dt.date
-    d["Mes"] = d[schema["fecha"]].dt.to_period("M").astype(str)
-    d["Anio"] = d[schema["fecha"]].dt.year
-    return d
-
-
-def accion_tabla_mensual(df, schema):
-    if not schema["fecha"] or not schema["total"]:
-        return "Requiere fecha y total."
-    d = df.copy()
-    d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
-    d = d.dropna(subset=[schema["fecha"]])
-    d["Anio"] = d[schema["fecha"]].dt.year
-    d["Mes"] = d[schema["fecha"]].dt.month
-
-    tabla = (
-        d.groupby(["Anio", "Mes"], as_index=False)[schema["total"]]
-        .sum()
-        .rename(columns={schema["total"]: "TotalFacturado"})
-        .sort_values(["Anio", "Mes"])
-    )
-    return tabla
-
-
-def accion_comparacion_mensual(df, schema):
-    base = accion_tabla_mensual(df, schema)
-    if isinstance(base, str):
-        return base
-
-    base = base.copy()
-    base["Periodo"] = base["Anio"].astype(str) + "-" + base["Mes"].astype(str).str.zfill(2)
-    base = base.sort_values(["Anio", "Mes"]).reset_index(drop=True)
-
-    base["TotalMesAnterior"] = base["TotalFacturado"].shift(1)
-    base["Delta_vs_MesAnterior"] = (base["TotalFacturado"] - base["TotalMesAnterior"]).fillna(0)
-    base["TotalMismoMes_AñoAnterior"] = base["TotalFacturado"].shift(12)
-    base["Delta_vs_AñoAnterior"] = (base["TotalFacturado"] - base["TotalMismoMes_AñoAnterior"]).fillna(0)
-
-    return base
-
-
-def accion_top_bottom(df, schema, nivel="producto", n=10):
-    if not schema["total"]:
-        return "Requiere total."
-
-    d = df.copy()
-
-    if nivel == "producto" and schema["producto"]:
-        grupo = schema["producto"]
-        nombre = "IdArticulo"
-        g = d.groupby(grupo)[schema["total"]].sum().reset_index(name="Total")
-        g = g.rename(columns={grupo: nombre})
-    elif nivel == "dia" and schema["fecha"]:
-        d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
-        d = d.dropna(subset=[schema["fecha"]])
-        d["Dia"] = d[schema["fecha"]].dt.date
-        g = d.groupby("Dia")[schema["total"]].sum().reset_index(name="Total")
-    elif nivel == "vendedor" and schema["vendedor"]:
-        grupo = schema["vendedor"]
-        nombre = "Vendedor"
-        g = d.groupby(grupo)[schema["total"]].sum().reset_index(name="Total")
-        g = g.rename(columns={grupo: nombre})
-    else:
-        return "Faltan columnas para este análisis."
-
-    top = g.sort_values("Total", ascending=False).head(n)
-    bottom = g.sort_values("Total", ascending=True).head(n)
-    return top, bottom
-
-
-def accion_sumatoria_ventas_mensuales_por_idarticulo(df, schema):
-    """Sumatoria de ventas mensuales por IdArticulo.
-    Mapea cada mes como columna, filtrando por la fecha del Excel fuente.
-    """
-    if not schema["producto"] or not schema["fecha"] or not schema["total"]:
-        return "Requiere IdArticulo, fecha y total."
-    
-    d = df.copy()
-    d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
-    d = d.dropna(subset=[schema["fecha"]])
-    
-    # Crear columnas de año y mes
-    d["Anio"] = d[schema["fecha"]].dt.year
-    d["Mes"] = d[schema["fecha"]].dt.month
-    d["Mes_Nombre"] = d[schema["fecha"]].dt.strftime("%B").map({
-        "January": "ENERO", "February": "FEBRERO", "March": "MARZO",
-        "April": "ABRIL", "May": "MAYO", "June": "JUNIO",
-        "July": "JULIO", "August": "AGOSTO", "September": "SEPTIEMBRE",
-        "October": "OCTUBRE", "November": "NOVIEMBRE", "December": "DICIEMBRE"
-    })
-    
-    # Crear etiqueta Mes-Año
-    d["Mes_Anio"] = d["Mes_Nombre"] + " " + d["Anio"].astype(str)
-    
-    # Agrupar por IdArticulo y Mes_Anio, sumando el total
-    resultado = d.groupby([schema["producto"], "Mes_Anio"], as_index=False)[schema["total"]].sum()
-    resultado = resultado.rename(columns={schema["producto"]: "IdArticulo", schema["total"]: "Venta"})
-    
-    # Pivotar para que cada mes sea una columna
-    tabla_pivot = resultado.pivot_table(
-        index="IdArticulo",
-        columns="Mes_Anio",
-        values="Venta",
-        aggfunc="sum",
-        fill_value=0
-    ).reset_index()
-    
-    # Reordenar columnas de meses en orden cronológico
-    meses_orden = ["ENERO", "FEBRERO", "MARZO", "ABRIL", "MAYO", "JUNIO",
-                   "JULIO", "AGOSTO", "SEPTIEMBRE", "OCTUBRE", "NOVIEMBRE", "DICIEMBRE"]
-    
-    columnas_ordenadas = ["IdArticulo"]
-    for col in tabla_pivot.columns[1:]:
-        # Extraer mes y año de la columna
-        parts = col.split(" ")
-        if len(parts) == 2:
-            mes_nombre, anio = parts
-            if mes_nombre in meses_orden:
-                columnas_ordenadas.append(col)
-    
-    tabla_pivot = tabla_pivot[[c for c in columnas_ordenadas if c in tabla_pivot.columns]]
-    
-    # Agregar columna de TOTAL
-    tabla_pivot["TOTAL"] = tabla_pivot.iloc[:, 1:].sum(axis=1)
-    
-    return tabla_pivot
-
-# ===================== REGISTRO DE ACCIONES =====================
-
-ACCIONES = {
-    "Totales facturados por mes": {
-        "fn": lambda df, schema, **kw: accion_totales_por_periodo(df, schema, "mes", **kw),
-        "tipo": "tabla",
-        "descripcion": "Suma de ventas por mes calendario.",
-    },
-    "Totales facturados por día": {
-        "fn": lambda df, schema, **kw: accion_totales_por_periodo(df, schema, "dia", **kw),
-        "tipo": "tabla",
-        "descripcion": "Suma de ventas por día.",
-    },
-    "Totales facturados en rango": {
-        "fn": lambda df, schema, **kw: accion_totales_por_periodo(df, schema, "rango", **kw),
-        "tipo": "tabla",
-        "descripcion": "Total de ventas en el rango de fechas.",
-    },
-    "Unidades por producto": {
-        "fn": lambda df, schema, **kw: accion_unidades_totales(df, schema, "producto"),
-        "tipo": "tabla",
-        "descripcion": "Unidades totales vendidas por IdArticulo.",
-    },
-    "Unidades por categoría": {
-        "fn": lambda df, schema, **kw: accion_unidades_totales(df, schema, "categoria"),
-        "tipo": "tabla",
-        "descripcion": "Unidades totales por familia/departamento.",
-    },
-    "Unidades por vendedor": {
-        "fn": lambda df, schema, **kw: accion_unidades_totales(df, schema, "vendedor"),
-        "tipo": "tabla",
-        "descripcion": "Unidades totales vendidas por vendedor.",
-    },
-    "Tickets por producto": {
-        "fn": lambda df, schema, **kw: accion_conteo_tickets(df, schema, "producto"),
-        "tipo": "tabla",
-        "descripcion": "Número de tickets en los que aparece cada producto.",
-    },
-    "Tickets por día": {
-        "fn": lambda df, schema, **kw: accion_conteo_tickets(df, schema, "dia"),
-        "tipo": "tabla",
-        "descripcion": "Número de tickets por día.",
-    },
-    "Tickets por vendedor": {
-        "fn": lambda df, schema, **kw: accion_conteo_tickets(df, schema, "vendedor"),
-        "tipo": "tabla",
-        "descripcion": "Número de tickets atendidos por cada vendedor.",
-    },
-    "Productos únicos vendidos": {
-        "fn": lambda df, schema, **kw: accion_productos_unicos(df, schema),
-        "tipo": "mixto",
-        "descripcion": "Cantidad y lista de productos distintos vendidos en el periodo.",
-    },
-    "Productos únicos por mes": {
-        "fn": lambda df, schema, **kw: accion_productos_unicos_mes(df, schema),
-        "tipo": "tabla",
-        "descripcion": "Cantidad de productos distintos vendidos por mes.",
-    },
-    "Clientes únicos (KPI)": {
-        "fn": lambda df, schema, **kw: accion_clientes_unicos(df, schema),
-        "tipo": "kpi",
-        "descripcion": "Número de clientes distintos en el periodo.",
-    },
-    "Clientes únicos por mes": {
-        "fn": lambda df, schema, **kw: accion_clientes_unicos_mes(df, schema),
-        "tipo": "tabla",
-        "descripcion": "Cantidad de clientes distintos por mes.",
-    },
-    "Clientes recurrentes (>=2 compras)": {
-        "fn": lambda df, schema, **kw: accion_clientes_recurrentes(df, schema, min_veces=2),
-        "tipo": "tabla",
-        "descripcion": "Clientes con dos o más compras.",
-    },
-    "Precio promedio por producto": {
-        "fn": lambda df, schema, **kw: accion_precio_promedio_producto(df, schema),
-        "tipo": "tabla",
-        "descripcion": "Precio promedio de venta por IdArticulo.",
-    },
-    "Ticket promedio por día": {
-        "fn": lambda df, schema, **kw: accion_ticket_promedio_por(df, schema, "dia"),
-        "tipo": "tabla",
-        "descripcion": "Ticket promedio por día.",
-    },
-    "Ticket promedio por vendedor": {
-        "fn": lambda df, schema, **kw: accion_ticket_promedio_por(df, schema, "vendedor"),
-        "tipo": "tabla",
-        "descripcion": "Ticket promedio por vendedor.",
-    },
-    "Participación por producto": {
-        "fn": lambda df, schema, **kw: accion_participacion(df, schema, "producto"),
-        "tipo": "tabla",
-        "descripcion": "Participación porcentual de cada producto en el total facturado.",
-    },
-    "Participación por familia": {
-        "fn": lambda df, schema, **kw: accion_participacion(df, schema, "familia"),
-        "tipo": "tabla",
-        "descripcion": "Participación de cada familia/departamento en el total.",
-    },
-    "Segmentación por sucursal": {
-        "fn": lambda df, schema, **kw: accion_segmentacion_sucursal(df, schema),
-        "tipo": "tabla",
-        "descripcion": "Total facturado por sucursal o unidad de negocio.",
-    },
-    "Maestro de productos": {
-        "fn": lambda df, schema, **kw: accion_maestro_productos(df, schema),
-        "tipo": "tabla",
-        "descripcion": "Lista única de productos con sus datos maestros.",
-    },
-    "Ventas duplicadas": {
-        "fn": lambda df, schema, **kw: accion_ventas_duplicadas(df, schema),
-        "tipo": "tabla",
-        "descripcion": "Filas potencialmente duplicadas según ticket/fecha/cliente/total.",
-    },
-    "Normalizar fechas": {
-        "fn": lambda df, schema, **kw: accion_normalizar_fechas(df, schema),
-        "tipo": "tabla",
-        "descripcion": "Añade columnas Fecha_normalizada, Mes y Anio.",
-    },
-    "Tabla mensual": {
-        "fn": lambda df, schema, **kw: accion_tabla_mensual(df, schema),
-        "tipo": "tabla",
-        "descripcion": "Total facturado por año y mes.",
-    },
-    "Comparación vs mes anterior y año anterior": {
-        "fn": lambda df, schema, **kw: accion_comparacion_mensual(df, schema),
-        "tipo": "tabla",
-        "descripcion": "Agrega columnas con diferencias vs mes anterior y mismo mes del año anterior.",
-    },
-    "Top/bottom productos": {
-        "fn": lambda df, schema, **kw: accion_top_bottom(df, schema, "producto", n=10),
-        "tipo": "mixto",
-        "descripcion": "Top y bottom 10 productos por total facturado.",
-    },
-        "Sumatoria Ventas mensuales por IdArticulo": {
-        "fn": lambda df, schema, **kw: accion_sumatoria_ventas_mensuales_por_idarticulo(df, schema),
-        "tipo": "tabla",
-        "descripcion": "Ventas mensuales agregadas por IdArticulo, con cada mes como columna.",
-    },
-}
-
-
 # ===================== UI PRINCIPAL =====================
 
-st.sidebar.header("1. Subir archivos")
-uploaded_files = st.sidebar.file_uploader(
-    "Excels de ventas", type=["xls", "xlsx"], accept_multiple_files=True
-)
+# Telemetría de la sesión: carga, acciones (desde el hilo del trabajo) y exportación
+telemetria = st.session_state.setdefault("telemetria", Telemetria())
+if st.session_state.get("telemetria_memoria", False):
+    telemetria.memoria = True
+elif telemetria.memoria:
+    telemetria.detener_memoria()
 
-if not uploaded_files:
-    st.info("Sube uno o más archivos Excel para comenzar.")
-    st.stop()
-
-st.sidebar.success(f"{len(uploaded_files)} archivo(s) cargado(s).")
+st.sidebar.header("1. Subir archivos")
+origen_datos = st.sidebar.radio("Origen de datos", ["Subir archivos", "Abrir workspace"], horizontal=True)
+
+schema_guardado = None
+if origen_datos == "Abrir workspace":
+    workspaces = listar_workspaces()
+    if not workspaces:
+        st.info(f"No hay workspaces guardados en '{DIRECTORIO_WORKSPACES}'.")
+        st.stop()
+    nombre_workspace = st.sidebar.selectbox("Workspace", workspaces)
+    with telemetria.medir("carga", "Abrir workspace") as registro:
+        df, schema_guardado = abrir_workspace(os.path.join(DIRECTORIO_WORKSPACES, nombre_workspace))
+        registro["FilasSalida"] = len(df)
+    firma_datos = ("workspace", nombre_workspace)
+    st.sidebar.success(f"Workspace '{nombre_workspace}': {len(df):,} filas (memory-mapped).")
+else:
+    uploaded_files = st.sidebar.file_uploader(
+        "Archivos de ventas (Excel, CSV o Parquet)", type=EXTENSIONES_SOPORTADAS, accept_multiple_files=True
+    )
 
-df = leer_excels_subidos(uploaded_files)
+    if not uploaded_files:
+        st.info("Sube uno o más archivos Excel, CSV o Parquet para comenzar.")
+        st.stop()
+
+    st.sidebar.success(f"{len(uploaded_files)} archivo(s) cargado(s).")
+
+    # Hojas de cada Excel: la primera (como siempre), todas o las elegidas por nombre
+    hojas_excel = 0
+    claves_archivos = [(up.name, len(up.getvalue())) for up in uploaded_files]
+    hojas_por_archivo = st.session_state.setdefault("hojas_por_archivo", {})
+    for clave, up in zip(claves_archivos, uploaded_files):
+        if clave not in hojas_por_archivo:
+            hojas_por_archivo[clave] = listar_hojas(up)
+    nombres_hojas = list(dict.fromkeys(h for clave in claves_archivos for h in hojas_por_archivo[clave]))
+    if nombres_hojas:
+        modo_hojas = st.sidebar.radio("Hojas de Excel", ["Primera", "Todas", "Elegir"], horizontal=True)
+        if modo_hojas == "Todas":
+            hojas_excel = None
+        elif modo_hojas == "Elegir":
+            hojas_excel = tuple(st.sidebar.multiselect("Hojas a leer", nombres_hojas, default=nombres_hojas[:1]))
+
+    # La lectura se hace una vez por conjunto de archivos y hojas, no en cada rerun
+    firma_datos = (tuple(claves_archivos), hojas_excel)
+    if st.session_state.get("lectura_firma") != firma_datos:
+        st.session_state.pop("lectura", None)
+        informe_lectura = []
+        # Workers por forkserver/spawn (nunca fork dentro del servidor: otros hilos, de esta
+        # u otras sesiones, pueden tener locks tomados en el momento del fork)
+        procesos = min(len(uploaded_files), os.cpu_count() or 1)
+        barra = st.sidebar.progress(0.0, text=f"Leyendo {len(uploaded_files)} archivo(s)...")
+
+        def avance_lectura(hechos, total, nombre):
+            barra.progress(hechos / total, text=f"Leído {nombre} ({hechos}/{total})")
+
+        with telemetria.medir("carga", f"Lectura de {len(uploaded_files)} archivo(s)") as registro:
+            df = leer_excels_subidos(uploaded_files, informe=informe_lectura, hojas=hojas_excel,
+                                     procesos=procesos, progreso=avance_lectura)
+            registro["FilasSalida"] = len(df)
+        barra.empty()
+        st.session_state["lectura"] = (df, informe_lectura)
+        st.session_state["lectura_firma"] = firma_datos
+    df, informe_lectura = st.session_state["lectura"]
+    with st.sidebar.expander("Detalle de lectura"):
+        st.dataframe(pd.DataFrame(informe_lectura), hide_index=True)
 st.write("Vista previa de datos combinados:", df.head())
 
-schema = get_schema_mapping(df)
+schema = get_schema_mapping(df, schema_guardado)
+
+# Perfil de calidad: una vez por dataset y esquema, sobre los datos tal como se leyeron
+firma_perfil = (firma_datos, tuple(schema.items()))
+if st.session_state.get("perfil_firma") != firma_perfil:
+    with telemetria.medir("carga", "Perfil de calidad", len(df)) as registro:
+        st.session_state["perfil"] = perfil_calidad(df, schema)
+        registro["FilasSalida"] = contar_filas(st.session_state["perfil"])
+    st.session_state["perfil_firma"] = firma_perfil
+perfil = st.session_state["perfil"]
+if isinstance(perfil, pd.DataFrame):
+    totales_perfil = perfil[perfil["Archivo"] == TODOS_LOS_ARCHIVOS]
+    n_anomalias = int(totales_perfil["Anomalias"].sum())
+    n_no_convertibles = int(totales_perfil["NoConvertibles"].sum())
+    with st.expander(f"Calidad de datos: {n_anomalias:,} anomalías, {n_no_convertibles:,} valores no convertibles"):
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Columnas con nulos", int((totales_perfil["Nulos"] > 0).sum()))
+        c2.metric("Valores no convertibles", f"{n_no_convertibles:,}")
+        c3.metric("Anomalías", f"{n_anomalias:,}")
+        archivos_perfil = list(perfil["Archivo"].unique())
+        ver_archivo = st.selectbox("Archivo", archivos_perfil, index=archivos_perfil.index(TODOS_LOS_ARCHIVOS))
+        st.dataframe(perfil[perfil["Archivo"] == ver_archivo], hide_index=True)
+        st.caption("No convertibles: fechas o medidas que las acciones descartan. Atípicos: precio 5 veces "
+                   "mayor o menor que la mediana del producto; cantidad y total fuera de 3 rangos "
+                   "intercuartiles (en escala logarítmica).")
+
+# Tipos y orden por fecha: también una vez por dataset y esquema, no en cada rerun.
+# Los filtros globales se aplican después sobre este frame ya ordenado.
+if st.session_state.get("preparado_firma") != firma_perfil:
+    st.session_state.pop("preparado", None)
+    reporte_memoria = None
+    if schema_guardado is None:
+        with telemetria.medir("carga", "Optimizar tipos", len(df)) as registro:
+            df, reporte_memoria = optimizar_tipos(df, schema)
+            registro["FilasSalida"] = len(df)
+    with telemetria.medir("carga", "Ordenar por fecha", len(df)) as registro:
+        df = ordenar_por_fecha(df, schema)
+        registro["FilasSalida"] = len(df)
+    st.session_state["preparado"] = (df, reporte_memoria)
+    st.session_state["preparado_firma"] = firma_perfil
+df, reporte_memoria = st.session_state["preparado"]
+if reporte_memoria is not None:
+    with st.sidebar.expander("Memoria del dataset"):
+        mb_antes = reporte_memoria["MB_Antes"].sum()
+        mb_despues = reporte_memoria["MB_Despues"].sum()
+        st.metric("Memoria en uso", f"{mb_despues:,.1f} MB", delta=f"{mb_despues - mb_antes:,.1f} MB",
+                  delta_color="inverse")
+        st.dataframe(reporte_memoria, hide_index=True)
 
 # Configuración de columnas adicionales
 config_cols_adicionales = get_columnas_adicionales_config()
 
-# Filtros de fecha para acciones que lo usen
+if schema_guardado is None:
+    with st.sidebar.expander("Guardar como workspace"):
+        nombre_nuevo = st.text_input("Nombre del workspace", value=datetime.now().strftime("ventas_%Y%m"))
+        if st.button("Guardar workspace") and nombre_nuevo.strip():
+            nombre_nuevo = "".join(c if c.isalnum() or c in "-_" else "_" for c in nombre_nuevo.strip())
+            guardar_workspace(df, schema, os.path.join(DIRECTORIO_WORKSPACES, nombre_nuevo))
+            st.success(f"Workspace '{nombre_nuevo}' guardado.")
+
+# Filtros globales: se aplican una vez y todas las acciones usan la vista filtrada
+st.sidebar.header("2. Filtros globales")
+filtros_globales = {}
 usar_rango = False
 rango_inicio = None
 rango_fin = None
-if schema["fecha"]:
-    with st.expander("Filtros de fecha opcionales"):
-        usar_rango = st.checkbox("Aplicar rango de fechas en acciones que lo soportan", value=False)
-        if usar_rango:
-            c1, c2 = st.columns(2)
-            with c1:
-                rango_inicio = st.date_input("Desde", value=df[schema["fecha"]].min())
-            with c2:
-                rango_fin = st.date_input("Hasta", value=df[schema["fecha"]].max())
+if schema["fecha"] and df[schema["fecha"]].notna().any():
+    usar_rango = st.sidebar.checkbox("Filtrar por rango de fechas", value=False)
+    if usar_rango:
+        fecha_min = df[schema["fecha"]].min().date()
+        fecha_max = df[schema["fecha"]].max().date()
+        rango_inicio = st.sidebar.date_input("Desde", value=fecha_min, min_value=fecha_min, max_value=fecha_max)
+        rango_fin = st.sidebar.date_input("Hasta", value=fecha_max, min_value=fecha_min, max_value=fecha_max)
+        filtros_globales["fecha_inicio"] = rango_inicio
+        filtros_globales["fecha_fin"] = rango_fin
+for clave in FILTROS_GLOBALES:
+    if schema.get(clave):
+        opciones = sorted(df[schema[clave]].dropna().unique(), key=str)
+        seleccion = st.sidebar.multiselect(clave.capitalize(), options=opciones)
+        if seleccion:
+            filtros_globales[clave] = seleccion
+
+with telemetria.medir("carga", "Filtros globales", len(df)) as registro:
+    df_filtrado = aplicar_filtros_globales(df, schema, filtros_globales)
+    registro["FilasSalida"] = len(df_filtrado)
+st.sidebar.caption(f"{len(df_filtrado):,} de {len(df):,} filas después de filtros.")
+
+st.sidebar.header("3. Motor de ejecución")
+motor_ejecucion = st.sidebar.selectbox(
+    "Motor", ["pandas"] + motores_sql_disponibles(),
+    help="Los motores SQL cargan el dataset en una base local en disco y resuelven las "
+         "agregaciones con SQL; las acciones sin traducción siguen usando pandas. En la web la "
+         "base se arma desde el dataset ya leído en memoria; para archivos que no entran en "
+         "memoria usar batch_acciones.py --motor, que carga los archivos por lotes.",
+)
+base_sql = None
+if motor_ejecucion != "pandas":
+    # La base se carga una vez por sesión y dataset; los filtros van en cada consulta
+    firma_sql = (motor_ejecucion, firma_datos, tuple(schema.items()))
+    if st.session_state.get("base_sql_firma") != firma_sql:
+        anterior = st.session_state.pop("base_sql", None)
+        if anterior is not None:
+            trabajo_previo = st.session_state.get("trabajo")
+            if trabajo_previo is not None and trabajo_previo.base_sql is anterior:
+                trabajo_previo.cancelar()
+            anterior.cerrar()
+        with st.spinner(f"Cargando el dataset en {motor_ejecucion}..."), \
+                telemetria.medir("carga", "Base SQL", len(df), motor_ejecucion) as registro:
+            st.session_state["base_sql"] = cargar_dataframe(df, schema, motor_ejecucion)
+            registro["FilasSalida"] = st.session_state["base_sql"].filas
+        st.session_state["base_sql_firma"] = firma_sql
+    base_sql = st.session_state["base_sql"]
+    st.sidebar.caption(f"{base_sql.filas:,} filas cargadas en {motor_ejecucion}.")
+
+cubo = None
+usar_cubo = st.sidebar.checkbox(
+    "Usar cubo diario para acciones aditivas", value=True,
+    help="Agrega las ventas por día, producto, departamento, sucursal y vendedor una vez por dataset; "
+         "las acciones que solo suman unidades o totales leen el cubo en vez de todas las líneas.",
+)
+if usar_cubo:
+    # Se arma sobre el dataset sin filtrar; los filtros se aplican al cubo en cada acción
+    firma_cubo = (firma_datos, tuple(schema.items()))
+    if st.session_state.get("cubo_firma") != firma_cubo:
+        with telemetria.medir("carga", "Cubo diario", len(df)) as registro:
+            st.session_state["cubo"] = CuboDiario(df, schema)
+            registro["FilasSalida"] = st.session_state["cubo"].filas
+        st.session_state["cubo_firma"] = firma_cubo
+    cubo = st.session_state["cubo"]
+    st.sidebar.caption(f"Cubo diario: {cubo.filas:,} filas (de {cubo.filas_origen:,} líneas).")
 
 st.markdown("---")
 st.subheader("Elegir acciones a ejecutar")
@@ -765,57 +396,247 @@ acciones_sel = st.multiselect(
     options=acciones_disponibles,
     default=["Totales facturados por mes", "Unidades por producto"],
 )
+if base_sql is not None:
+    sin_sql = [a for a in acciones_sel if a not in ACCIONES_SQL and (cubo is None or a not in ACCIONES_CUBO)]
+    if sin_sql:
+        st.caption(f"Sin traducción SQL, corren con pandas: {', '.join(sin_sql)}.")
+
+# Parámetros de acciones configurables (se pasan como kwargs a "fn")
+parametros_acciones = {}
+if "Ventas casi duplicadas" in acciones_sel:
+    with st.expander("Parámetros: ventas casi duplicadas"):
+        c1, c2, c3, c4 = st.columns(4)
+        with c1:
+            ventana_seg = st.number_input("Ventana de tiempo (segundos)", min_value=0, value=300, step=30)
+        with c2:
+            tol_abs = st.number_input("Tolerancia absoluta en total", min_value=0.0, value=0.0, step=1.0)
+        with c3:
+            tol_rel = st.number_input("Tolerancia relativa en total (%)", min_value=0.0, max_value=100.0,
+                                      value=1.0, step=0.5)
+        with c4:
+            misma = st.selectbox("Misma", ["cliente", "sucursal", "cliente y sucursal"])
+    parametros_acciones["Ventas casi duplicadas"] = {
+        "ventana_segundos": ventana_seg,
+        "tolerancia_abs": tol_abs,
+        "tolerancia_rel": tol_rel / 100,
+        "misma": misma,
+    }
+
+ACCIONES_CONTEO_DISTINTO = [
+    "Tickets por producto", "Tickets por día", "Tickets por vendedor",
+    "Productos únicos por mes", "Clientes únicos (KPI)", "Clientes únicos por mes",
+]
+if any(a in acciones_sel for a in ACCIONES_CONTEO_DISTINTO):
+    with st.expander("Parámetros: conteo de distintos"):
+        aproximado = st.checkbox("Conteo aproximado (HyperLogLog)", value=False)
+        precision = st.slider("Precisión (bits de registro)", min_value=8, max_value=16,
+                              value=HLL_PRECISION_DEFAULT, disabled=not aproximado)
+        if aproximado:
+            st.caption(f"Error relativo típico: ±{hll_error_relativo(precision):.2%}")
+        if aproximado and base_sql is not None:
+            st.caption("Con motor SQL estos conteos se resuelven de forma exacta (COUNT DISTINCT).")
+    if aproximado:
+        for nombre in ACCIONES_CONTEO_DISTINTO:
+            parametros_acciones[nombre] = {"aproximado": True, "precision": precision}
+
+ACCIONES_TOP_BOTTOM = ["Top/bottom productos", "Top/bottom días", "Top/bottom vendedores"]
+if any(a in acciones_sel for a in ACCIONES_TOP_BOTTOM):
+    with st.expander("Parámetros: top/bottom"):
+        c1, c2 = st.columns(2)
+        with c1:
+            top_n = st.number_input("N (filas por extremo)", min_value=1, max_value=1000, value=10)
+        with c2:
+            opciones_por = {"Global": None, "Por sucursal": "sucursal", "Por mes": "mes",
+                            "Por departamento": "departamento", "Por vendedor": "vendedor"}
+            top_por = {}
+            if any(a in acciones_sel for a in ACCIONES_TOP_BOTTOM[:2]):
+                top_por["otras"] = opciones_por[st.selectbox("Ranking", list(opciones_por))]
+            if "Top/bottom vendedores" in acciones_sel:
+                # Los vendedores no se pueden rankear dentro de cada vendedor
+                opciones_vendedor = {k: v for k, v in opciones_por.items() if v != "vendedor"}
+                top_por["vendedor"] = opciones_vendedor[st.selectbox("Ranking de vendedores",
+                                                                     list(opciones_vendedor))]
+    for nombre in ACCIONES_TOP_BOTTOM:
+        por = top_por.get("vendedor" if nombre == "Top/bottom vendedores" else "otras")
+        parametros_acciones[nombre] = {"n": int(top_n), "por": por}
+
+if "Comparación de períodos (MoM/YoY/móvil)" in acciones_sel:
+    with st.expander("Parámetros: comparación de períodos"):
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            frecuencia = st.selectbox("Frecuencia", list(FRECUENCIAS_PERIODO), index=2)
+        with c2:
+            opciones_nivel = {"Total general": None, "Producto": "producto", "Departamento": "departamento",
+                              "Sucursal": "sucursal", "Vendedor": "vendedor"}
+            nivel_periodo = opciones_nivel[st.selectbox("Agrupar por", list(opciones_nivel))]
+        with c3:
+            ventana_periodo = st.number_input("Ventana móvil (períodos)", min_value=1, max_value=60, value=3)
+    parametros_acciones["Comparación de períodos (MoM/YoY/móvil)"] = {
+        "frecuencia": frecuencia,
+        "nivel": nivel_periodo,
+        "ventana": int(ventana_periodo),
+    }
+
+if "Demanda móvil por producto y sucursal" in acciones_sel:
+    with st.expander("Parámetros: demanda móvil"):
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            ventana_corta = st.number_input("Ventana corta (días)", min_value=1, max_value=730,
+                                            value=VENTANAS_DEMANDA[0])
+        with c2:
+            ventana_larga = st.number_input("Ventana larga (días)", min_value=1, max_value=730,
+                                            value=VENTANAS_DEMANDA[1])
+        with c3:
+            demanda_diaria = st.checkbox("Serie diaria completa", value=False,
+                                         help="Sin marcar, una fila por producto y sucursal al último día.")
+    parametros_acciones["Demanda móvil por producto y sucursal"] = {
+        "ventanas": (int(ventana_corta), int(ventana_larga)),
+        "diario": demanda_diaria,
+    }
+
+if "Jerarquía de productos (drill-down)" in acciones_sel:
+    with st.expander("Parámetros: jerarquía de productos"):
+        opciones_cruce = {"Sin cruce": None, "Por sucursal": "sucursal", "Por mes": "mes"}
+        cruce_jerarquia = opciones_cruce[st.selectbox("Cruzar con", list(opciones_cruce))]
+    parametros_acciones["Jerarquía de productos (drill-down)"] = {"cruce": cruce_jerarquia}
+
+ACCIONES_ABC = ["Clasificación ABC (Pareto)", "Transiciones de clase ABC"]
+if any(a in acciones_sel for a in ACCIONES_ABC):
+    with st.expander("Parámetros: clasificación ABC"):
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            opciones_por = {"Global": None, "Por sucursal": "sucursal",
+                            "Por departamento": "departamento", "Por vendedor": "vendedor"}
+            abc_por = opciones_por[st.selectbox("Clasificar dentro de", list(opciones_por))]
+            abc_mes = st.checkbox("Por mes", value=True,
+                                  help="Clasifica cada mes por separado (las transiciones siempre son mensuales).")
+        with c2:
+            corte_a = st.number_input("Corte A (% acumulado)", min_value=1.0, max_value=99.0, value=80.0)
+        with c3:
+            corte_b = st.number_input("Corte B (% acumulado)", min_value=corte_a, max_value=100.0,
+                                      value=max(95.0, corte_a))
+    parametros_acciones["Clasificación ABC (Pareto)"] = {
+        "por": abc_por, "periodo": "mes" if abc_mes else None, "corte_a": corte_a, "corte_b": corte_b,
+    }
+    parametros_acciones["Transiciones de clase ABC"] = {"por": abc_por, "corte_a": corte_a, "corte_b": corte_b}
+
+if "Productos que se venden juntos" in acciones_sel:
+    with st.expander("Parámetros: productos que se venden juntos"):
+        soporte_pct = st.number_input("Soporte mínimo (% de tickets)", min_value=0.0, max_value=100.0,
+                                      value=0.1, step=0.05, format="%.3f")
+    parametros_acciones["Productos que se venden juntos"] = {"soporte_min": soporte_pct / 100}
 
 ejecutar = st.button("Ejecutar análisis")
 
+# El análisis corre en segundo plano: tocar widgets no lo interrumpe y los
+# reruns muestran los resultados guardados en session_state sin recalcular.
 if ejecutar and acciones_sel:
+    anterior = st.session_state.get("trabajo")
+    if anterior is not None and not anterior.terminado:
+        anterior.cancelar()
+    st.session_state["trabajo"] = TrabajoAnalisis(
+        acciones_sel, df_filtrado, schema, parametros_acciones, filtros_globales, base_sql, telemetria,
+        cubo=cubo,
+    ).iniciar()
+
+trabajo = st.session_state.get("trabajo")
+
+
+def panel_trabajo():
+    """Estado en vivo del trabajo; cuando termina fuerza un rerun para mostrar los resultados."""
+    trabajo = st.session_state["trabajo"]
+    st.caption(f"Trabajo {trabajo.id}")
+    st.progress(trabajo.progreso())
+    st.dataframe(trabajo.resumen(), hide_index=True)
+    if not trabajo.terminado:
+        if st.button("Cancelar análisis", disabled=trabajo.cancelado):
+            trabajo.cancelar()
+    elif st.session_state.get("trabajo_mostrado") != trabajo.id:
+        st.rerun()
+
+
+if trabajo is not None:
+    if trabajo.terminado:
+        st.session_state["trabajo_mostrado"] = trabajo.id
+    fragmento = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+    if fragmento and not trabajo.terminado:
+        fragmento(run_every=1)(panel_trabajo)()
+    else:
+        # Sin fragments (Streamlit antiguo) el estado se refresca a mano
+        panel_trabajo()
+        if not trabajo.terminado:
+            st.button("Actualizar estado")
+
+if trabajo is not None:
+    # Tablas con columnas adicionales y libro Excel: una vez por trabajo y configuración,
+    # no en cada rerun. Las acciones ya terminadas no cambian mientras el resto avanza.
+    firma_export = (trabajo.id, tuple(config_cols_adicionales["columnas"]))
+    if st.session_state.get("export_firma") != firma_export:
+        st.session_state["export_tablas"] = {}
+        st.session_state.pop("export_excel", None)
+        st.session_state["export_firma"] = firma_export
+    tablas_enriquecidas = st.session_state["export_tablas"]
+
+    def con_columnas_adicionales(tabla, clave):
+        if not config_cols_adicionales["columnas"]:
+            return tabla
+        if clave not in tablas_enriquecidas:
+            tablas_enriquecidas[clave] = agregar_columnas_adicionales(
+                tabla, config_cols_adicionales, trabajo.df, schema)
+        return tablas_enriquecidas[clave]
+
     resultados_para_exportar = {}
-    tabs = st.tabs(acciones_sel)
+    tabs = st.tabs(trabajo.acciones)
 
-    for tab, nombre_accion in zip(tabs, acciones_sel):
+    for tab, nombre_accion in zip(tabs, trabajo.acciones):
         meta = ACCIONES[nombre_accion]
-        fn = meta["fn"]
         with tab:
             st.markdown(f"**{nombre_accion}**")
             st.caption(meta["descripcion"])
+            estado = trabajo.estado[nombre_accion]
+            if estado == "error":
+                st.error(f"Error en '{nombre_accion}': {trabajo.errores[nombre_accion]}")
+                continue
+            if estado != "listo":
+                st.info(f"Estado: {estado}.")
+                continue
             try:
-                kwargs = {}
-                if "rango" in nombre_accion and usar_rango:
-                    kwargs["fecha_inicio"] = rango_inicio
-                    kwargs["fecha_fin"] = rango_fin
-
-                res = fn(df, schema, **kwargs)
+                res = trabajo.resultados[nombre_accion]
                 tipo = meta["tipo"]
 
                 if isinstance(res, str):
                     st.warning(res)
                     continue
 
-                if tipo == "tabla":
+                if meta.get("jerarquia") and not res.empty:
+                    mostrar_jerarquia(res, f"jerarquia_{trabajo.id}")
+                    resultados_para_exportar[nombre_accion] = res
+                elif tipo == "tabla":
                     # Agregar columnas adicionales si están configuradas
-                    if config_cols_adicionales["columnas"]:
-                        res = agregar_columnas_adicionales(res, config_cols_adicionales, df, schema)
+                    res = con_columnas_adicionales(res, nombre_accion)
                     st.dataframe(res)
                     resultados_para_exportar[nombre_accion] = res
                 elif tipo == "kpi":
-                    st.metric(label=nombre_accion, value=res)
+                    if isinstance(res, tuple):
+                        valor, error = res
+                        st.metric(label=nombre_accion, value=f"≈ {valor:,}",
+                                  help=f"Estimación HyperLogLog, error relativo típico ±{error:.2%}")
+                    else:
+                        st.metric(label=nombre_accion, value=res)
                 elif tipo == "mixto":
                     if nombre_accion.startswith("Productos únicos"):
                         n, tabla = res
                         st.metric("Cantidad de productos únicos", n)
-                        if config_cols_adicionales["columnas"]:
-                            tabla = agregar_columnas_adicionales(tabla, config_cols_adicionales, df, schema)
+                        tabla = con_columnas_adicionales(tabla, nombre_accion)
                         st.dataframe(tabla)
                         resultados_para_exportar[nombre_accion] = tabla
                     else:
                         top, bottom = res
                         st.write("Top N:")
-                        if config_cols_adicionales["columnas"]:
-                            top = agregar_columnas_adicionales(top, config_cols_adicionales, df, schema)
+                        top = con_columnas_adicionales(top, nombre_accion + "_TOP")
                         st.dataframe(top)
                         st.write("Bottom N:")
-                        if config_cols_adicionales["columnas"]:
-                            bottom = agregar_columnas_adicionales(bottom, config_cols_adicionales, df, schema)
+                        bottom = con_columnas_adicionales(bottom, nombre_accion + "_BOTTOM")
                         st.dataframe(bottom)
                         resultados_para_exportar[nombre_accion + "_TOP"] = top
                         resultados_para_exportar[nombre_accion + "_BOTTOM"] = bottom
@@ -823,18 +644,51 @@ if ejecutar and acciones_sel:
                 st.error(f"Error en '{nombre_accion}': {e}")
 
     # Exportación conjunta a Excel
-    if resultados_para_exportar:
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-            for nombre, df_res in resultados_para_exportar.items():
-                sheet = nombre[:31]  # límite Excel
-                df_res.to_excel(writer, sheet_name=sheet, index=False)
-        buffer.seek(0)
-
-        ts = datetime.now().strftime("%Y%m%d_%H%M")
+    if trabajo.terminado and resultados_para_exportar:
+        if "export_excel" not in st.session_state:
+            buffer = io.BytesIO()
+            hojas_usadas = set()
+            filas_exportadas = sum(len(t) for t in resultados_para_exportar.values())
+            with telemetria.medir("exportacion", f"Excel ({len(resultados_para_exportar)} hojas)",
+                                  filas_exportadas) as registro:
+                with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+                    for nombre, df_res in resultados_para_exportar.items():
+                        sheet = nombre_hoja_excel(nombre, hojas_usadas)  # límite y caracteres de Excel
+                        df_res.to_excel(writer, sheet_name=sheet, index=False)
+                registro["FilasSalida"] = filas_exportadas
+            ts = datetime.now().strftime("%Y%m%d_%H%M")
+            st.session_state["export_excel"] = (buffer.getvalue(), f"Resultados_Analisis_{ts}.xlsx")
+
+        contenido, nombre_archivo = st.session_state["export_excel"]
         st.download_button(
             "📥 Descargar resultados en Excel",
-            data=buffer,
-            file_name=f"Resultados_Analisis_{ts}.xlsx",
+            data=contenido,
+            file_name=nombre_archivo,
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         )
+
+
+# ===================== TELEMETRÍA =====================
+
+with st.expander("Telemetría de la sesión"):
+    st.checkbox("Medir memoria (tracemalloc)", value=False, key="telemetria_memoria",
+                help="Registra el pico de memoria de cada etapa. Hace más lenta la ejecución "
+                     "(y los tiempos medidos): desactivarlo para comparar solo tiempos.")
+    tabla_telemetria = telemetria.tabla()
+    if tabla_telemetria.empty:
+        st.caption("Todavía no hay mediciones.")
+    else:
+        st.dataframe(telemetria.resumen_por_etapa(), hide_index=True)
+        st.dataframe(tabla_telemetria.iloc[::-1], hide_index=True)
+        ts = datetime.now().strftime("%Y%m%d_%H%M")
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            st.download_button("Descargar CSV", telemetria.a_csv(), file_name=f"telemetria_{ts}.csv",
+                               mime="text/csv")
+        with c2:
+            st.download_button("Descargar JSON", telemetria.a_json(), file_name=f"telemetria_{ts}.json",
+                               mime="application/json")
+        with c3:
+            if st.button("Limpiar mediciones"):
+                telemetria.limpiar()
+                st.rerun()
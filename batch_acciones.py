@@ -0,0 +1,213 @@
+# batch_acciones.py
+"""Ejecuta acciones de análisis sin la UI, para jobs programados.
+
+Ejemplo:
+    python batch_acciones.py ventas_*.xlsx --esquema esquema.json \\
+        --acciones "Totales facturados por mes" "Unidades por producto" \\
+        --salida resultados.xlsx --procesos 4
+
+``--esquema`` es un JSON {"fecha": "Fecha", "total": "Total", ...}; los
+campos que falten usan el nombre por defecto si esa columna existe.
+``--parametros`` es un JSON {nombre_accion: {kwarg: valor}} y ``--filtros``
+un JSON con los filtros globales ("fecha_inicio", "fecha_fin", "sucursal", ...).
+``--hojas`` sin nombres lee todas las hojas de cada Excel y con nombres
+solo esas (por defecto, la primera); ``--procesos`` también reparte la
+lectura de los archivos.
+``--workspace`` abre un dataset ya preparado (ver core_workspace.py) en
+lugar de leer archivos, y ``--guardar-workspace`` guarda el preparado.
+``--motor sqlite|duckdb`` carga los archivos por lotes en una base SQL
+embebida (ver core_sql.py) y resuelve ahí las agregaciones, sin armar el
+DataFrame completo; ``--base`` indica el archivo de la base, que se puede
+reabrir después sin pasar archivos.
+Si ``--salida`` termina en .xlsx se escribe un libro con una hoja por
+resultado; si no, se toma como carpeta y se escribe un CSV por resultado.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from core_analisis import (
+    ACCIONES,
+    METODO_PROCESOS,
+    PROCESOS_CON_FORK,
+    aplicar_filtros_globales,
+    completar_esquema,
+    ejecutar_accion,
+    leer_excels_subidos,
+    nombre_hoja_excel,
+    optimizar_tipos,
+    ordenar_por_fecha,
+    resultado_a_tablas,
+)
+from core_sql import ACCIONES_SQL, MOTORES_SQL, abrir_base_sql, cargar_archivos, ejecutar_accion_sql
+from core_workspace import abrir_workspace, guardar_workspace
+
+# Estado de cada proceso worker (se carga una sola vez por proceso)
+_WORKER = {}
+
+
+def _iniciar_worker(df, schema, parametros, filtros, workspace=None):
+    if workspace:
+        # Cada worker mapea el mismo workspace: comparten la copia del page cache
+        df, schema = abrir_workspace(workspace)
+        df = aplicar_filtros_globales(df, schema, filtros or {})
+    _WORKER.update(df=df, schema=schema, parametros=parametros, filtros=filtros)
+
+
+def _correr_en_worker(nombre):
+    return _correr(nombre, _WORKER["df"], _WORKER["schema"], _WORKER["parametros"], _WORKER["filtros"])
+
+
+def _correr(nombre, df, schema, parametros, filtros):
+    inicio = time.perf_counter()
+    try:
+        res = ejecutar_accion(nombre, df, schema, parametros, filtros)
+    except Exception as e:
+        return nombre, f"Error: {e}", time.perf_counter() - inicio
+    return nombre, res, time.perf_counter() - inicio
+
+
+def preparar(archivos=None, mapeo=None, filtros=None, workspace=None, guardar_en=None, hojas=0, procesos=1):
+    """Lee, optimiza, ordena y filtra los datos. Devuelve (df_filtrado, schema).
+
+    Con ``workspace`` se abre un workspace guardado en lugar de leer archivos;
+    con ``guardar_en`` el dataset preparado se guarda como workspace.
+    ``hojas`` y ``procesos`` se pasan a ``leer_excels_subidos``; sin servidor
+    ni otros hilos, los workers de lectura arrancan con fork si existe.
+    """
+    if workspace:
+        df, schema = abrir_workspace(workspace)
+    else:
+        metodo = "fork" if PROCESOS_CON_FORK else METODO_PROCESOS
+        df = leer_excels_subidos(archivos, hojas=hojas, procesos=procesos, metodo=metodo)
+        schema = completar_esquema(df.columns, mapeo)
+        df, _ = optimizar_tipos(df, schema)
+        df = ordenar_por_fecha(df, schema)
+        if guardar_en:
+            guardar_workspace(df.reset_index(drop=True), schema, guardar_en)
+    return aplicar_filtros_globales(df, schema, filtros or {}), schema
+
+
+def ejecutar_lote(df, schema, acciones, parametros=None, filtros=None, procesos=1, workspace=None):
+    """Corre las acciones (en paralelo si procesos > 1) y devuelve [(nombre, resultado, segundos)].
+
+    Si los datos vienen de un ``workspace``, los workers lo abren por su
+    cuenta en lugar de recibir una copia serializada del DataFrame.
+    """
+    if procesos > 1 and len(acciones) > 1:
+        initargs = (None, None, parametros, filtros, workspace) if workspace else (df, schema, parametros, filtros)
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_worker, initargs=initargs) as ex:
+            return list(ex.map(_correr_en_worker, acciones))
+    return [_correr(nombre, df, schema, parametros, filtros) for nombre in acciones]
+
+
+def ejecutar_lote_sql(base, acciones, parametros=None, filtros=None):
+    """Corre las acciones sobre una base SQL; las que no tienen traducción quedan como error."""
+    resultados = []
+    for nombre in acciones:
+        inicio = time.perf_counter()
+        if nombre not in ACCIONES_SQL:
+            res = "Error: la acción no tiene traducción SQL, usar el motor pandas."
+        else:
+            try:
+                res = ejecutar_accion_sql(nombre, base, parametros, filtros)
+            except Exception as e:
+                res = f"Error: {e}"
+        resultados.append((nombre, res, time.perf_counter() - inicio))
+    return resultados
+
+
+def escribir_resultados(resultados, salida):
+    """Escribe las tablas en un .xlsx (una hoja por tabla) o en CSVs dentro de una carpeta."""
+    tablas = {}
+    for nombre, res, _ in resultados:
+        tablas.update(resultado_a_tablas(nombre, res))
+
+    if salida.lower().endswith(".xlsx"):
+        usados = set()
+        with pd.ExcelWriter(salida, engine="openpyxl") as writer:
+            for nombre, tabla in tablas.items():
+                tabla.to_excel(writer, sheet_name=nombre_hoja_excel(nombre, usados), index=False)
+    else:
+        os.makedirs(salida, exist_ok=True)
+        for nombre, tabla in tablas.items():
+            archivo = "".join(c if c.isalnum() or c in "-_ " else "_" for c in nombre).strip()
+            tabla.to_csv(os.path.join(salida, archivo + ".csv"), index=False)
+    return tablas
+
+
+def _leer_json(ruta):
+    if not ruta:
+        return None
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ejecuta acciones de análisis de ventas por lotes.")
+    parser.add_argument("archivos", nargs="*", help="Archivos de ventas (xlsx, xls, csv, parquet).")
+    parser.add_argument("--esquema", help="JSON con el mapeo de columnas.")
+    parser.add_argument("--hojas", nargs="*",
+                        help="Hojas de Excel a leer (sin nombres: todas; por defecto, la primera).")
+    parser.add_argument("--workspace", help="Abrir un workspace guardado en lugar de leer archivos.")
+    parser.add_argument("--guardar-workspace", help="Guardar el dataset preparado como workspace.")
+    parser.add_argument("--motor", choices=MOTORES_SQL, help="Resolver las acciones con un motor SQL embebido.")
+    parser.add_argument("--base", help="Archivo de la base SQL (se crea al cargar o se reabre sin archivos).")
+    parser.add_argument("--acciones", nargs="+", help="Acciones a ejecutar (por defecto, todas).")
+    parser.add_argument("--parametros", help="JSON {accion: {parametro: valor}}.")
+    parser.add_argument("--filtros", help="JSON con filtros globales.")
+    parser.add_argument("--salida", default="resultados.xlsx", help="Archivo .xlsx o carpeta para CSVs.")
+    parser.add_argument("--procesos", type=int, default=1, help="Procesos en paralelo.")
+    parser.add_argument("--listar", action="store_true", help="Lista las acciones disponibles y sale.")
+    args = parser.parse_args(argv)
+
+    if args.listar:
+        for nombre, meta in ACCIONES.items():
+            print(f"{nombre}: {meta['descripcion']}")
+        return 0
+    if args.motor:
+        if args.workspace or args.guardar_workspace:
+            parser.error("--motor no se combina con workspaces.")
+        if not args.archivos and not args.base:
+            parser.error("Con --motor hace falta al menos un archivo de entrada o --base.")
+    elif not args.archivos and not args.workspace:
+        parser.error("Falta al menos un archivo de entrada o --workspace.")
+
+    acciones = args.acciones or list(ACCIONES_SQL if args.motor else ACCIONES)
+    desconocidas = [a for a in acciones if a not in ACCIONES]
+    if desconocidas:
+        parser.error(f"Acciones desconocidas: {', '.join(desconocidas)}")
+
+    filtros = _leer_json(args.filtros)
+    if args.motor:
+        if args.archivos:
+            base = cargar_archivos(args.archivos, _leer_json(args.esquema), args.motor, args.base)
+        else:
+            base = abrir_base_sql(args.base, args.motor)
+        try:
+            resultados = ejecutar_lote_sql(base, acciones, _leer_json(args.parametros), filtros)
+        finally:
+            base.cerrar()
+    else:
+        hojas = 0 if args.hojas is None else (args.hojas or None)
+        df, schema = preparar(args.archivos, _leer_json(args.esquema), filtros,
+                              workspace=args.workspace, guardar_en=args.guardar_workspace,
+                              hojas=hojas, procesos=args.procesos)
+        resultados = ejecutar_lote(df, schema, acciones, _leer_json(args.parametros), filtros,
+                                   args.procesos, workspace=args.workspace)
+
+    for nombre, res, segundos in resultados:
+        estado = res if isinstance(res, str) else "ok"
+        print(f"{segundos:8.2f}s  {nombre}: {estado}")
+    escribir_resultados(resultados, args.salida)
+    print(f"Resultados en {args.salida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,356 @@
+# bench_acciones.py
+"""Benchmark de regresión de las acciones sobre ventas sintéticas.
+
+Ejemplo:
+    python bench_acciones.py --tamanos 10000 100000 --repeticiones 5
+
+Genera ventas a nivel línea (ticket, cliente, vendedor, sucursal,
+jerarquía de productos) con semilla fija, corre cada acción de
+``ACCIONES`` en cada tamaño y agrega los tiempos y el pico de memoria a
+``--historial`` (JSONL, una línea por acción y tamaño).
+
+Cada acción corre una vez sin cronometrar (con ``tracemalloc`` para la
+memoria, que además sirve de calentamiento) y ``--repeticiones`` veces
+cronometrada; se compara el mejor tiempo, el menos afectado por el ruido
+de la máquina. Una corrida se marca como REGRESION si supera a las
+corridas anteriores del mismo entorno (máquina y versiones de Python,
+pandas y numpy) por más de ``--umbral-z`` desvíos robustos (mediana y MAD
+del historial), por más de ``--tolerancia`` en proporción y por más de
+``--minimo-s`` segundos (1 MB para la memoria), así las acciones de pocos
+milisegundos no se marcan por ruido. Hacen falta al menos 3 corridas previas.
+
+``--actualizar-golden`` guarda un hash de las tablas de resultado de cada
+acción y tamaño en ``--golden``; las corridas siguientes se comparan contra
+esos hashes (DIFERENTE si cambian). El golden de la semilla por defecto está
+versionado junto al código. El hash incluye el orden de las filas, que es
+parte del resultado (rankings, fechas, drill-down), salvo en las acciones de
+``ORDEN_NO_ESPECIFICADO``; no depende de diferencias de redondeo por debajo
+de 1e-6.
+Antes de medir se corren los casos chicos de ``CASOS_REGRESION``, con
+resultado conocido. El código de salida es 1 si hubo regresiones, casos que
+fallan o resultados diferentes.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from core_analisis import (
+    ACCIONES,
+    completar_esquema,
+    ejecutar_accion,
+    optimizar_tipos,
+    ordenar_por_fecha,
+    resultado_a_tablas,
+)
+from core_telemetria import Telemetria, contar_filas
+
+HISTORIAL_POR_DEFECTO = "bench_historial.jsonl"
+GOLDEN_POR_DEFECTO = "bench_golden.json"
+TAMANOS_POR_DEFECTO = (10_000, 100_000)
+VENTANA_HISTORIAL = 10  # corridas previas que se comparan
+MINIMO_HISTORIAL = 3
+MINIMO_MEMORIA_MB = 1.0
+# Solo se comparan corridas con el mismo entorno: cambiar de pandas o de máquina arranca otra serie
+CAMPOS_ENTORNO = ("maquina", "python", "pandas", "numpy")
+# Acciones cuyas filas no tienen un orden definido (listas de valores o grupos sin
+# orden interno): su hash ordena las filas antes de calcularse
+ORDEN_NO_ESPECIFICADO = frozenset({"Maestro de productos", "Ventas duplicadas"})
+
+
+def generar_ventas(n, semilla=0):
+    """Ventas sintéticas a nivel línea, ~4 líneas por ticket y popularidad de productos tipo Zipf."""
+    rng = np.random.default_rng(semilla)
+    n_tickets = max(n // 4, 1)
+    n_productos = max(min(n // 20, 20_000), 10)
+    n_clientes = max(n_tickets // 5, 1)
+
+    # Atributos por ticket: fecha, cliente, sucursal y vendedor (el vendedor pertenece a la sucursal)
+    inicio = np.datetime64("2023-01-01T08:00:00")
+    segundos = np.sort(rng.integers(0, 730 * 86_400, n_tickets))
+    sucursales = np.array(["CENTRO", "NORTE", "SUR", "HIPER", "CORRIENTES"])
+    suc_ticket = rng.integers(0, len(sucursales), n_tickets)
+    vendedor_ticket = suc_ticket * 4 + rng.integers(0, 4, n_tickets)
+    cliente_ticket = rng.zipf(1.3, n_tickets) % n_clientes
+
+    # Productos: jerarquía departamento > familia > subfamilia y un precio de lista
+    subfamilia_prod = rng.integers(0, 60, n_productos)
+    familia_prod = subfamilia_prod // 4
+    departamento_prod = familia_prod // 3
+    precio_prod = np.round(np.exp(rng.normal(5.0, 1.0, n_productos)), 2)
+
+    ticket = np.sort(rng.integers(0, n_tickets, n))
+    producto = (rng.zipf(1.2, n) - 1) % n_productos
+    cantidad = rng.integers(1, 6, n)
+    precio = np.round(precio_prod[producto] * rng.choice([1.0, 1.0, 1.0, 0.9], n), 2)
+
+    return pd.DataFrame({
+        "Fecha": inicio + segundos[ticket].astype("timedelta64[s]"),
+        "Ticket": ticket + 1,
+        "IdCliente": cliente_ticket[ticket] + 1,
+        "IdArticulo": producto + 1,
+        "Descripcion": pd.Categorical.from_codes(producto, [f"PRODUCTO {i + 1}" for i in range(n_productos)]),
+        "Departamento": np.char.add("DEPTO ", departamento_prod[producto].astype(str)),
+        "Familia": np.char.add("FAM ", familia_prod[producto].astype(str)),
+        "SubFamilia": np.char.add("SUBFAM ", subfamilia_prod[producto].astype(str)),
+        "Cantidad": cantidad,
+        "PrecioUnitario": precio,
+        "Total": np.round(cantidad * precio, 2),
+        "Sucursal": sucursales[suc_ticket[ticket]],
+        "Vendedor": np.char.add("V", vendedor_ticket[ticket].astype(str)),
+        "_archivo_origen": np.where(ticket < n_tickets // 2, "ventas_1.xlsx", "ventas_2.xlsx"),
+    })
+
+
+def preparar_sinteticas(n, semilla=0):
+    """Ventas sintéticas preparadas como en la app: tipos optimizados y orden por fecha."""
+    df = generar_ventas(n, semilla)
+    schema = completar_esquema(df.columns)
+    df, _ = optimizar_tipos(df, schema)
+    return ordenar_por_fecha(df, schema), schema
+
+
+def hash_resultado(nombre, res):
+    """Hash de las tablas del resultado, independiente del redondeo fino.
+
+    El orden de las filas cuenta, salvo para las acciones de ``ORDEN_NO_ESPECIFICADO``.
+    """
+    h = hashlib.sha256()
+    if isinstance(res, str):
+        h.update(res.encode("utf-8"))
+    for hoja, tabla in sorted(resultado_a_tablas(nombre, res).items()):
+        t = tabla.reset_index(drop=True).copy()
+        for col in t.columns:
+            if pd.api.types.is_float_dtype(t[col]):
+                t[col] = t[col].round(6) + 0.0  # evita -0.0
+        # Como CSV: los nulos quedan vacíos sin importar el tipo (NaN, None, NA)
+        encabezado, *filas = t.to_csv(index=False, lineterminator="\n").rstrip("\n").split("\n")
+        h.update(hoja.encode("utf-8"))
+        if nombre in ORDEN_NO_ESPECIFICADO:
+            filas = sorted(filas)
+        h.update("\n".join([encabezado] + filas).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _caso_casi_duplicadas_otro_producto():
+    """Dos productos distintos con totales parecidos, mismo cliente y minutos de diferencia."""
+    df = pd.DataFrame({
+        "Fecha": pd.to_datetime(["2024-01-01 10:00", "2024-01-01 10:01", "2024-01-01 10:02"]),
+        "Ticket": [1, 2, 3],
+        "IdCliente": [7, 7, 7],
+        "IdArticulo": ["A", "C", "A"],
+        "Total": [100.0, 100.5, 100.2],
+    })
+    res = ejecutar_accion("Ventas casi duplicadas", df, completar_esquema(df.columns))
+    # Solo las dos líneas del producto A forman un grupo
+    return isinstance(res, pd.DataFrame) and sorted(res["Ticket"]) == [1, 3]
+
+
+def _caso_top_bottom_vendedores_por_vendedor():
+    """Rankear vendedores dentro de cada vendedor devuelve un mensaje, no una excepción."""
+    df, schema = preparar_sinteticas(200)
+    return isinstance(ejecutar_accion("Top/bottom vendedores", df, schema,
+                                      {"Top/bottom vendedores": {"por": "vendedor"}}), str)
+
+
+# Casos chicos con resultado conocido: nombre -> función que devuelve True si pasa
+CASOS_REGRESION = {
+    "Ventas casi duplicadas: productos distintos no se agrupan": _caso_casi_duplicadas_otro_producto,
+    "Top/bottom vendedores por vendedor: mensaje en lugar de error": _caso_top_bottom_vendedores_por_vendedor,
+}
+
+
+def verificar_casos():
+    """Corre ``CASOS_REGRESION`` y devuelve los nombres de los que fallan (o dan error)."""
+    fallas = []
+    for nombre, caso in CASOS_REGRESION.items():
+        try:
+            ok = caso()
+        except Exception:
+            ok = False
+        if not ok:
+            fallas.append(nombre)
+    return fallas
+
+
+def _commit_actual():
+    try:
+        salida = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return salida.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def medir_accion(nombre, df, schema, repeticiones=3, memoria=True):
+    """Una corrida de calentamiento (que mide memoria si ``memoria``) y ``repeticiones`` cronometradas.
+
+    tracemalloc hace más lenta la ejecución, por eso la memoria no se mide en
+    las corridas cronometradas. Devuelve (segundos por repetición, pico de
+    memoria en MB, resultado).
+    """
+    calentamiento = Telemetria(memoria=memoria)
+    with calentamiento.medir("accion", nombre, len(df)):
+        res = ejecutar_accion(nombre, df, schema)
+    calentamiento.detener_memoria()
+    memoria_mb = float(calentamiento.tabla()["MemoriaPico_MB"].iloc[0]) if memoria else None
+
+    telemetria = Telemetria(memoria=False)
+    for _ in range(repeticiones):
+        with telemetria.medir("accion", nombre, len(df)):
+            res = ejecutar_accion(nombre, df, schema)
+    return telemetria.tabla()["Segundos"].tolist(), memoria_mb, res
+
+
+def leer_historial(ruta):
+    if not os.path.exists(ruta):
+        return []
+    with open(ruta, encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+def es_regresion(actual, previos, umbral_z=3.0, tolerancia=0.25, minimo=0.0):
+    """(regresión?, z robusto) de ``actual`` contra la mediana y la MAD de ``previos``."""
+    if len(previos) < MINIMO_HISTORIAL:
+        return False, None
+    mediana = statistics.median(previos)
+    mad = statistics.median(abs(x - mediana) for x in previos) * 1.4826
+    escala = max(mad, mediana * 0.01, 1e-4)  # piso para historiales casi constantes
+    z = (actual - mediana) / escala
+    return bool(z > umbral_z and actual > mediana * (1 + tolerancia) and actual - mediana > minimo), round(z, 1)
+
+
+def comparar(corrida, historial, umbral_z=3.0, tolerancia=0.25, minimo_s=0.02):
+    """Marca regresiones contra las últimas corridas de la misma acción, tamaño y entorno."""
+    previas = [h for h in historial
+               if all(h.get(c) == corrida[c] for c in ("accion", "filas", "semilla") + CAMPOS_ENTORNO)
+               ][-VENTANA_HISTORIAL:]
+    tiempos = [h["mejor_s"] for h in previas]
+    tiempo, z_tiempo = es_regresion(corrida["mejor_s"], tiempos, umbral_z, tolerancia, minimo_s)
+    memorias = [h["memoria_mb"] for h in previas if h.get("memoria_mb") is not None]
+    memoria, z_memoria = (False, None)
+    if corrida["memoria_mb"] is not None:
+        memoria, z_memoria = es_regresion(corrida["memoria_mb"], memorias, umbral_z, tolerancia,
+                                          MINIMO_MEMORIA_MB)
+    referencia = statistics.median(tiempos) if tiempos else None
+    return {
+        "previas": len(previas),
+        "referencia_s": referencia,
+        "z_tiempo": z_tiempo,
+        "z_memoria": z_memoria,
+        "regresion_tiempo": tiempo,
+        "regresion_memoria": memoria,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de regresión de las acciones de análisis.")
+    parser.add_argument("--tamanos", nargs="+", type=int, default=list(TAMANOS_POR_DEFECTO),
+                        help="Cantidades de filas a generar.")
+    parser.add_argument("--acciones", nargs="+", help="Acciones a medir (por defecto, todas).")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Corridas cronometradas por acción.")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--historial", default=HISTORIAL_POR_DEFECTO, help="Archivo JSONL de historial.")
+    parser.add_argument("--golden", default=GOLDEN_POR_DEFECTO, help="JSON con hashes de resultados.")
+    parser.add_argument("--actualizar-golden", action="store_true",
+                        help="Guarda los hashes de esta corrida como referencia.")
+    parser.add_argument("--sin-memoria", action="store_true", help="No medir memoria (más rápido).")
+    parser.add_argument("--no-guardar", action="store_true", help="No agregar esta corrida al historial.")
+    parser.add_argument("--umbral-z", type=float, default=3.0, help="Desvíos robustos para marcar regresión.")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="Aumento mínimo (proporción) para marcar regresión.")
+    parser.add_argument("--minimo-s", type=float, default=0.02,
+                        help="Aumento mínimo (segundos) para marcar regresión de tiempo.")
+    args = parser.parse_args(argv)
+
+    acciones = args.acciones or list(ACCIONES)
+    desconocidas = [a for a in acciones if a not in ACCIONES]
+    if desconocidas:
+        parser.error(f"Acciones desconocidas: {', '.join(desconocidas)}")
+
+    historial = leer_historial(args.historial)
+    golden = {}
+    if os.path.exists(args.golden):
+        with open(args.golden, encoding="utf-8") as f:
+            golden = json.load(f)
+    contexto = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit_actual(),
+        "maquina": platform.node(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+    }
+
+    fallas = verificar_casos()
+    for nombre in fallas:
+        print(f"Caso de regresión FALLA: {nombre}")
+    corridas, problemas = [], len(fallas)
+    for n in args.tamanos:
+        df, schema = preparar_sinteticas(n, args.semilla)
+        print(f"--- {n:,} filas ---")
+        for nombre in acciones:
+            try:
+                segundos, memoria_mb, res = medir_accion(
+                    nombre, df, schema, args.repeticiones, not args.sin_memoria)
+            except Exception as e:
+                print(f"{'':>9}  {nombre}: ERROR {e}")
+                problemas += 1
+                continue
+            corrida = {
+                **contexto,
+                "accion": nombre,
+                "filas": n,
+                "semilla": args.semilla,
+                "segundos": segundos,
+                "mejor_s": min(segundos),
+                "mediana_s": statistics.median(segundos),
+                "memoria_mb": memoria_mb,
+                "filas_salida": contar_filas(res),
+                "hash": hash_resultado(nombre, res),
+            }
+            evaluacion = comparar(corrida, historial, args.umbral_z, args.tolerancia, args.minimo_s)
+
+            clave = f"{nombre}|{n}|{args.semilla}"
+            estados = []
+            if evaluacion["regresion_tiempo"]:
+                estados.append(f"REGRESION tiempo (z={evaluacion['z_tiempo']})")
+            if evaluacion["regresion_memoria"]:
+                estados.append(f"REGRESION memoria (z={evaluacion['z_memoria']})")
+            if args.actualizar_golden:
+                golden[clave] = corrida["hash"]
+            elif clave in golden and golden[clave] != corrida["hash"]:
+                estados.append("DIFERENTE al golden")
+            problemas += bool(estados)
+
+            referencia = evaluacion["referencia_s"]
+            comparacion = f"x{corrida['mejor_s'] / referencia:5.2f}" if referencia else "  nuevo"
+            memoria_txt = f"{memoria_mb:8.1f} MB" if memoria_mb is not None else ""
+            print(f"{corrida['mejor_s']:8.3f}s {comparacion} {memoria_txt}  {nombre}: "
+                  f"{'; '.join(estados) or 'ok'}")
+            corridas.append(corrida)
+
+    if not args.no_guardar and corridas:
+        with open(args.historial, "a", encoding="utf-8") as f:
+            for corrida in corridas:
+                f.write(json.dumps(corrida, ensure_ascii=False) + "\n")
+        print(f"Historial actualizado en {args.historial}")
+    if args.actualizar_golden:
+        with open(args.golden, "w", encoding="utf-8") as f:
+            json.dump(golden, f, ensure_ascii=False, indent=1, sort_keys=True)
+        print(f"Golden actualizado en {args.golden}")
+    if problemas:
+        print(f"{problemas} acción(es) con regresiones, errores o resultados diferentes.")
+    return 1 if problemas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
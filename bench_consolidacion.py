@@ -0,0 +1,149 @@
+# bench_consolidacion.py
+"""Micro-benchmark del redondeo y de los totales del Consolidado.
+
+Ejemplo:
+    python bench_consolidacion.py --tamanos 50000 200000 1000000
+
+Compara, sobre cantidades sintéticas con semilla fija, la forma anterior
+(``apply`` con ``int(x ± 0.5)``; ``astype(int)`` columna por columna y
+columnas de mes/sucursal buscadas con ``startswith``/``endswith``) contra
+los kernels de core_consolidacion.py, verifica que den exactamente lo mismo
+e informa el mejor tiempo de cada una y la mejora. El ``pivot_table`` en sí
+no cambió y queda fuera de la medición de los totales.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from core_consolidacion import (
+    COLUMNA_CANTIDAD,
+    MESES_ES,
+    _columnas_mes_sucursal,
+    _orden_mes_clave,
+    _totales_mes_sucursal,
+    redondear_mitad_lejos_de_cero,
+)
+
+TAMANOS_POR_DEFECTO = (50_000, 200_000, 1_000_000)
+IDX_COLS = ["IdArticulo", "Marca", "Descripcion", "Departamento", "SubFamilia", "Familia"]
+SUCURSALES = ["CENTRO", "HIPER", "NORTE", "SUR"]
+
+
+def generar_consolidado(n, semilla=0, articulos=None, meses=12):
+    """Filas como las que agrupa ``consolidar_datos``: producto x mes x sucursal, cantidad decimal.
+
+    Por defecto hay un artículo cada 10 filas (así el pivot crece con ``n``).
+    """
+    rng = np.random.default_rng(semilla)
+    articulos = articulos or max(n // 10, 1)
+    ids = rng.integers(1, articulos + 1, n)
+    nombres_mes = [f"{MESES_ES[i % 12]} {2024 + i // 12}" for i in range(meses)]
+    return pd.DataFrame({
+        "IdArticulo": ids,
+        "Marca": "MARCA " + (ids % 80).astype(str),
+        "Descripcion": "ARTICULO " + ids.astype(str),
+        "Departamento": "DEPTO " + (ids % 12).astype(str),
+        "SubFamilia": "SUBFAM " + (ids % 40).astype(str),
+        "Familia": "FAM " + (ids % 20).astype(str),
+        COLUMNA_CANTIDAD: np.round(rng.normal(20, 30, n), 1),
+        "MES": np.array(nombres_mes)[rng.integers(0, meses, n)],
+        "SUCURSAL": np.array(SUCURSALES)[rng.integers(0, len(SUCURSALES), n)],
+    })
+
+
+def redondear_anterior(serie):
+    return serie.apply(lambda x: int(x + 0.5) if x >= 0 else int(x - 0.5))
+
+
+def pivot_mes_sucursal(df):
+    tmp = df.copy()
+    tmp["MES_SUC"] = tmp["MES"] + "_" + tmp["SUCURSAL"]
+    return tmp.pivot_table(
+        index=IDX_COLS, columns="MES_SUC", values=COLUMNA_CANTIDAD, aggfunc="sum", fill_value=0
+    ).reset_index()
+
+
+def totales_anterior(piv, meses_ordenados, sucursales):
+    """Enteros y totales como se armaban antes en ``generar_reportes``."""
+    for col in piv.columns:
+        if col not in IDX_COLS:
+            piv[col] = piv[col].astype(int)
+    cols_def = IDX_COLS.copy()
+    for mes in meses_ordenados:
+        cols_mes = [c for c in piv.columns if c.startswith(mes + "_")]
+        if not cols_mes:
+            continue
+        piv[mes] = piv[cols_mes].sum(axis=1).astype(int)
+        cols_def.append(mes)
+    total_cols = []
+    for suc in sucursales:
+        cols_suc = [c for c in piv.columns if c.endswith("_" + suc)]
+        if not cols_suc:
+            continue
+        col_total = f"TOTAL {suc.upper()}"
+        piv[col_total] = piv[cols_suc].sum(axis=1).astype(int)
+        total_cols.append(col_total)
+    if total_cols:
+        piv["TOTAL CONSOLIDADO"] = piv[total_cols].sum(axis=1).astype(int)
+        cols_def.extend(total_cols + ["TOTAL CONSOLIDADO"])
+    return piv, cols_def
+
+
+def totales_nuevo(piv, meses_ordenados, sucursales):
+    columnas_mes_suc = _columnas_mes_sucursal(meses_ordenados, sucursales)
+    return _totales_mes_sucursal(piv, IDX_COLS, meses_ordenados, sucursales, columnas_mes_suc)
+
+
+def mejor_tiempo(fn, repeticiones):
+    mejor, res = float("inf"), None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        res = fn()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, res
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmark del redondeo y los totales del Consolidado.")
+    parser.add_argument("--tamanos", nargs="+", type=int, default=list(TAMANOS_POR_DEFECTO),
+                        help="Cantidad de filas consolidadas.")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Corridas por variante (se toma la mejor).")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    filas = []
+    distintos = False
+    for n in args.tamanos:
+        df = generar_consolidado(n, args.semilla)
+        meses_ordenados = sorted(df["MES"].unique(), key=_orden_mes_clave)
+        sucursales = sorted(df["SUCURSAL"].unique())
+
+        s_ant, r_ant = mejor_tiempo(lambda: redondear_anterior(df[COLUMNA_CANTIDAD]), args.repeticiones)
+        s_nue, r_nue = mejor_tiempo(lambda: redondear_mitad_lejos_de_cero(df[COLUMNA_CANTIDAD]), args.repeticiones)
+        iguales = bool(np.array_equal(r_ant.to_numpy(), r_nue))
+        filas.append({"Etapa": "redondeo", "Filas": n, "Productos": None, "Anterior_s": s_ant, "Nuevo_s": s_nue,
+                      "Iguales": iguales})
+
+        df[COLUMNA_CANTIDAD] = r_nue
+        piv = pivot_mes_sucursal(df)
+        s_ant, (p_ant, c_ant) = mejor_tiempo(lambda: totales_anterior(piv.copy(), meses_ordenados, sucursales),
+                                             args.repeticiones)
+        s_nue, (p_nue, c_nue) = mejor_tiempo(lambda: totales_nuevo(piv.copy(), meses_ordenados, sucursales),
+                                             args.repeticiones)
+        iguales = c_ant == c_nue and p_ant[c_ant].equals(p_nue[c_nue])
+        filas.append({"Etapa": "totales mes/sucursal", "Filas": n, "Productos": len(piv),
+                      "Anterior_s": s_ant, "Nuevo_s": s_nue, "Iguales": iguales})
+        distintos = distintos or not all(f["Iguales"] for f in filas[-2:])
+
+    tabla = pd.DataFrame(filas).astype({"Productos": "Int64"})
+    tabla["Mejora_x"] = tabla["Anterior_s"] / tabla["Nuevo_s"]
+    with pd.option_context("display.float_format", "{:.4f}".format, "display.width", 120):
+        print(tabla.to_string(index=False))
+    return 1 if distintos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2228 @@
+# core_analisis.py
+"""Acciones de análisis de ventas, sin dependencia de Streamlit.
+
+Lo usan la app web (app_streamlit.py) y el ejecutor por lotes
+(batch_acciones.py); se puede importar desde jobs o procesos worker.
+"""
+import codecs
+import csv
+import importlib.util
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+
+# ===================== UTILIDADES =====================
+
+# Nombre de columna que se propone por defecto para cada campo del esquema
+ESQUEMA_POR_DEFECTO = {
+    "fecha": "Fecha",
+    "ticket": "Ticket",
+    "cliente": "IdCliente",
+    "producto": "IdArticulo",
+    "descripcion": "Descripcion",
+    "departamento": "Departamento",
+    "familia": "Familia",
+    "subfamilia": "SubFamilia",
+    "cantidad": "Cantidad",
+    "precio": "PrecioUnitario",
+    "total": "Total",
+    "sucursal": "Sucursal",
+    "vendedor": "Vendedor",
+}
+
+
+def completar_esquema(columnas, mapeo=None):
+    """Arma un esquema completo: usa ``mapeo`` y, para lo que falte, el nombre por defecto si existe."""
+    mapeo = mapeo or {}
+    schema = {}
+    for clave, defecto in ESQUEMA_POR_DEFECTO.items():
+        col = mapeo.get(clave, defecto if defecto in columnas else None)
+        schema[clave] = col if col in columnas else None
+    return schema
+
+EXTENSIONES_SOPORTADAS = ["xls", "xlsx", "xlsm", "csv", "txt", "parquet"]
+
+
+def _motor_excel_rapido():
+    """Devuelve "calamine" si python-calamine está instalado, si no None."""
+    return "calamine" if importlib.util.find_spec("python_calamine") else None
+
+
+def _detectar_csv(contenido):
+    """Detecta (encoding, separador) de un CSV a partir de una muestra."""
+    muestra = contenido[:64 * 1024]
+    for encoding in ("utf-8-sig", "cp1252", "latin-1"):
+        try:
+            # decodificador incremental: no falla si la muestra corta un carácter
+            texto = codecs.getincrementaldecoder(encoding)().decode(muestra, final=False)
+            break
+        except UnicodeDecodeError:
+            continue
+    try:
+        separador = csv.Sniffer().sniff(texto, delimiters=";,\t|").delimiter
+    except csv.Error:
+        separador = ","
+    return encoding, separador
+
+
+def _nombre_y_contenido(archivo):
+    """Acepta un archivo subido (con .name y .getvalue()), una ruta en disco o (nombre, bytes)."""
+    if isinstance(archivo, (str, os.PathLike)):
+        with open(archivo, "rb") as f:
+            return os.path.basename(archivo), f.read()
+    if isinstance(archivo, tuple):
+        return archivo
+    return archivo.name, archivo.getvalue()
+
+
+def _leer_excel(contenido, hojas, motor):
+    """Lee una hoja, o varias apiladas con la columna ``_hoja_origen``.
+
+    Con ``hojas`` None (todas) o una lista de nombres se leen esas hojas;
+    las que el libro no tiene se ignoran, igual que las hojas vacías.
+    Devuelve (DataFrame, detalle para el informe de lectura).
+    """
+    if hojas is not None and not isinstance(hojas, (list, tuple, set)):
+        return pd.read_excel(io.BytesIO(contenido), sheet_name=hojas, engine=motor), ""
+    with pd.ExcelFile(io.BytesIO(contenido), engine=motor) as libro:
+        nombres = [h for h in libro.sheet_names if hojas is None or h in hojas]
+        partes = [libro.parse(h).assign(_hoja_origen=h) for h in nombres]
+    partes = [p for p in partes if len(p)]
+    if not partes:
+        return pd.DataFrame(columns=["_hoja_origen"]), ", 0 hojas"
+    return pd.concat(partes, ignore_index=True), f", {len(partes)} hojas"
+
+
+def listar_hojas(archivo):
+    """Nombres de las hojas de un Excel (lista vacía para CSV y Parquet)."""
+    nombre, contenido = _nombre_y_contenido(archivo)
+    if os.path.splitext(nombre)[1].lower().lstrip(".") not in ("xls", "xlsx", "xlsm"):
+        return []
+    motor = _motor_excel_rapido()
+    if motor:
+        try:
+            with pd.ExcelFile(io.BytesIO(contenido), engine=motor) as libro:
+                return list(libro.sheet_names)
+        except Exception:
+            pass
+    with pd.ExcelFile(io.BytesIO(contenido)) as libro:
+        return list(libro.sheet_names)
+
+
+def leer_archivo_subido(up, hojas=0):
+    """Lee un archivo subido o una ruta (Excel, CSV o Parquet) según su extensión.
+
+    En los Excel ``hojas`` es la hoja a leer (por defecto la primera), None
+    para todas o una lista de nombres; con varias hojas las filas quedan
+    marcadas con ``_hoja_origen``. Devuelve (DataFrame, descripción de la
+    ruta de lectura usada).
+    """
+    nombre, contenido = _nombre_y_contenido(up)
+    extension = os.path.splitext(nombre)[1].lower().lstrip(".")
+
+    if extension in ("csv", "txt"):
+        encoding, separador = _detectar_csv(contenido)
+        df = pd.read_csv(io.BytesIO(contenido), sep=separador, encoding=encoding, low_memory=False)
+        return df, f"csv (sep={separador!r}, {encoding})"
+
+    if extension == "parquet":
+        return pd.read_parquet(io.BytesIO(contenido)), "parquet"
+
+    motor = _motor_excel_rapido()
+    if motor:
+        try:
+            df, detalle = _leer_excel(contenido, hojas, motor)
+            return df, f"{extension} ({motor}{detalle})"
+        except Exception:
+            pass  # versión de pandas sin soporte o archivo que calamine no abre
+    motor = "openpyxl" if extension in ("xlsx", "xlsm") else None
+    df, detalle = _leer_excel(contenido, hojas, motor)
+    return df, f"{extension} ({motor or 'motor por defecto'}{detalle})"
+
+
+# forkserver (o spawn) arranca workers limpios, sin heredar hilos ni locks del
+# proceso que los crea: es lo que usa el servidor de Streamlit, que siempre tiene
+# hilos vivos. Cada worker vuelve a importar el script principal salvo que su
+# ``__spec__`` se llame "__main__" (la app lo declara para no re-ejecutarse).
+# fork queda para el lote sin servidor (batch_acciones.py), donde no hay hilos.
+PROCESOS_CON_FORK = "fork" in multiprocessing.get_all_start_methods()
+METODO_PROCESOS = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _leer_con_tiempo(archivo, hojas):
+    """(nombre, DataFrame, lectura, segundos) de una ruta o (nombre, bytes); corre también en procesos worker."""
+    inicio = time.perf_counter()
+    nombre = os.path.basename(archivo) if isinstance(archivo, (str, os.PathLike)) else archivo[0]
+    df, lectura = leer_archivo_subido(archivo, hojas)
+    return nombre, df, lectura, time.perf_counter() - inicio
+
+
+def _leer_en_procesos(archivos, hojas, procesos, progreso, metodo):
+    """Lee cada archivo en un proceso worker; None si el pool no pudo arrancar o se rompió."""
+    leidos = [None] * len(archivos)
+    try:
+        contexto = multiprocessing.get_context(metodo)
+        with ProcessPoolExecutor(max_workers=min(procesos, len(archivos)), mp_context=contexto) as ex:
+            futuros = {ex.submit(_leer_con_tiempo, archivo, hojas): i for i, archivo in enumerate(archivos)}
+            for hechos, futuro in enumerate(as_completed(futuros), start=1):
+                leidos[futuros[futuro]] = futuro.result()
+                if progreso is not None:
+                    progreso(hechos, len(archivos), leidos[futuros[futuro]][0])
+    except (BrokenProcessPool, OSError, ValueError):
+        return None
+    return leidos
+
+
+def leer_excels_subidos(uploaded_files, informe=None, hojas=0, procesos=1, progreso=None,
+                        metodo=METODO_PROCESOS):
+    """Combina todos los archivos subidos en un único DataFrame.
+
+    ``hojas`` se aplica a cada Excel (ver ``leer_archivo_subido``). Con
+    ``procesos`` > 1 y varios archivos, cada archivo se lee en un proceso
+    aparte y el tiempo total se acerca al del archivo más lento. ``metodo``
+    es el método de arranque de los procesos (ver ``METODO_PROCESOS``); si
+    el pool falla, los archivos se leen en serie.
+    ``progreso(hechos, total, nombre)`` se llama a medida que termina cada
+    archivo. Si se pasa ``informe`` (lista), se agrega un dict por archivo
+    con la ruta de lectura usada, filas y segundos. Las filas quedan en el
+    orden de los archivos recibidos.
+    """
+    # Los archivos subidos no se pueden serializar: a los workers van (nombre, bytes)
+    archivos = [up if isinstance(up, (str, os.PathLike)) else (up.name, up.getvalue()) for up in uploaded_files]
+    leidos = None
+    if procesos > 1 and len(archivos) > 1:
+        leidos = _leer_en_procesos(archivos, hojas, procesos, progreso, metodo)
+    if leidos is None:
+        leidos = []
+        for hechos, archivo in enumerate(archivos, start=1):
+            leidos.append(_leer_con_tiempo(archivo, hojas))
+            if progreso is not None:
+                progreso(hechos, len(archivos), leidos[-1][0])
+
+    frames = []
+    for nombre, df, lectura, segundos in leidos:
+        df["_archivo_origen"] = nombre
+        frames.append(df)
+        if informe is not None:
+            informe.append({
+                "Archivo": nombre,
+                "Lectura": lectura,
+                "Filas": len(df),
+                "Segundos": round(segundos, 3),
+            })
+    if not frames:
+        raise ValueError("No se pudo leer ningún archivo.")
+    return pd.concat(frames, ignore_index=True)
+
+
+def _entero_minimo(serie, minimo=np.int8):
+    """Convierte a entero con el tipo más chico (>= minimo) que contiene el rango."""
+    vmin, vmax = serie.min(), serie.max()
+    for tipo in (np.int8, np.int16, np.int32, np.int64):
+        if np.dtype(tipo).itemsize < np.dtype(minimo).itemsize:
+            continue
+        info = np.iinfo(tipo)
+        if info.min <= vmin and vmax <= info.max:
+            return serie.astype(tipo)
+    return serie
+
+
+def optimizar_tipos(df, schema, umbral_categoria=0.5):
+    """Reduce la memoria del DataFrame combinado sin cambiar los resultados.
+
+    - Texto con pocos valores distintos (<= umbral_categoria de las filas),
+      incluidos ``_archivo_origen`` y ``_hoja_origen``, pasa a categórico.
+    - Enteros (y floats sin decimales ni nulos) se achican al menor entero
+      que los contiene; las medidas (cantidad, precio, total) nunca bajan de
+      int32 para que los cálculos no desborden. Los floats con decimales se
+      dejan en float64.
+    - La columna de fecha mapeada se convierte a datetime nativo.
+
+    Devuelve (DataFrame optimizado, reporte de memoria por columna).
+    """
+    medidas = {schema.get(k) for k in ("cantidad", "precio", "total")} - {None}
+    antes = df.memory_usage(deep=True, index=False)
+    columnas = {}
+    for col in df.columns:
+        serie = df[col]
+        if col == schema.get("fecha"):
+            serie = pd.to_datetime(serie, errors="coerce")
+        elif pd.api.types.is_object_dtype(serie) or pd.api.types.is_string_dtype(serie):
+            if serie.nunique(dropna=False) <= umbral_categoria * len(serie):
+                serie = serie.astype("category")
+        elif pd.api.types.is_bool_dtype(serie):
+            pass
+        elif pd.api.types.is_integer_dtype(serie) or (
+            pd.api.types.is_float_dtype(serie)
+            and serie.notna().all()
+            and np.array_equal(serie.to_numpy(), np.trunc(serie.to_numpy()))
+        ):
+            if len(serie):
+                serie = _entero_minimo(serie, np.int32 if col in medidas else np.int8)
+        columnas[col] = serie
+
+    optimizado = pd.DataFrame(columnas, index=df.index)
+    despues = optimizado.memory_usage(deep=True, index=False)
+    reporte = pd.DataFrame({
+        "Columna": df.columns,
+        "TipoAntes": df.dtypes.astype(str).to_numpy(),
+        "TipoDespues": optimizado.dtypes.astype(str).to_numpy(),
+        "MB_Antes": (antes / 2**20).round(2).to_numpy(),
+        "MB_Despues": (despues / 2**20).round(2).to_numpy(),
+    })
+    return optimizado, reporte
+
+
+def ordenar_por_fecha(df, schema):
+    """Ordena (de forma estable) por la fecha mapeada, con fechas vacías al final.
+
+    Con el DataFrame ordenado, ``filtrar_rango_fechas`` recorta un rango con
+    búsqueda binaria en lugar de recorrer todas las filas.
+    """
+    if not schema.get("fecha") or not pd.api.types.is_datetime64_any_dtype(df[schema["fecha"]]):
+        return df
+    fechas = df[schema["fecha"]]
+    n_validas = int(fechas.notna().sum())
+    if fechas.iloc[:n_validas].is_monotonic_increasing and fechas.iloc[n_validas:].isna().all():
+        return df  # ya ordenado (p. ej. un workspace guardado)
+    return df.sort_values(schema["fecha"], kind="mergesort", na_position="last")
+
+
+def filtrar_rango_fechas(df, columna, inicio=None, fin=None):
+    """Recorta un DataFrame ya ordenado por ``columna`` (O(log n) + el tramo).
+
+    ``fin`` es inclusivo: si es una fecha sin hora se incluye el día completo.
+    """
+    valores = df[columna].to_numpy()
+    desde = 0
+    hasta = valores.searchsorted(np.datetime64("NaT"))  # las fechas vacías quedan fuera
+    if inicio is not None:
+        desde = valores.searchsorted(pd.Timestamp(inicio).to_datetime64(), side="left")
+    if fin is not None:
+        fin = pd.Timestamp(fin)
+        if fin == fin.normalize():
+            hasta = min(hasta, valores.searchsorted((fin + pd.Timedelta(days=1)).to_datetime64(), side="left"))
+        else:
+            hasta = min(hasta, valores.searchsorted(fin.to_datetime64(), side="right"))
+    return df.iloc[desde:max(desde, hasta)]
+
+
+FILTROS_GLOBALES = ["sucursal", "departamento", "vendedor"]
+
+
+def aplicar_filtros_globales(df, schema, filtros):
+    """Aplica una sola vez los filtros globales antes de correr las acciones.
+
+    ``filtros`` puede tener "fecha_inicio", "fecha_fin" y, para cada clave de
+    FILTROS_GLOBALES, la lista de valores a conservar. Se espera ``df``
+    ordenado con ``ordenar_por_fecha``.
+    """
+    d = df
+    if schema.get("fecha") and (filtros.get("fecha_inicio") or filtros.get("fecha_fin")):
+        d = filtrar_rango_fechas(d, schema["fecha"], filtros.get("fecha_inicio"), filtros.get("fecha_fin"))
+
+    mascara = None
+    for clave in FILTROS_GLOBALES:
+        valores = filtros.get(clave)
+        if not valores or not schema.get(clave):
+            continue
+        m = d[schema[clave]].isin(valores).to_numpy()
+        mascara = m if mascara is None else mascara & m
+    if mascara is not None:
+        d = d[mascara]
+    return d
+
+
+def agregar_columnas_adicionales(df_resultado, config_cols, df_original, schema):
+    """Agrega las columnas adicionales seleccionadas al DataFrame de resultados."""
+    if not config_cols["columnas"]:
+        return df_resultado
+    
+    df = df_resultado.copy()
+    anio = config_cols["anio"]
+    
+    # Verificar si el df original tiene datos de fecha
+    if schema.get("fecha") and schema.get("total"):
+        df_orig = df_original.copy()
+        df_orig[schema["fecha"]] = pd.to_datetime(df_orig[schema["fecha"]], errors="coerce")
+        df_orig = df_orig.dropna(subset=[schema["fecha"]])
+        
+        # Agregar columnas mensuales
+        for mes_col in config_cols["meses"]:
+            # Extraer número de mes del nombre
+            mes_nombre = mes_col.split()[0]
+            mes_map = {
+                "ENERO": 1, "FEBRERO": 2, "MARZO": 3, "ABRIL": 4,
+                "MAYO": 5, "JUNIO": 6, "JULIO": 7, "AGOSTO": 8, "SEPTIEMBRE": 9
+            }
+            mes_num = mes_map.get(mes_nombre)
+            
+            if mes_num:
+                # Filtrar datos del mes y año específico
+                mask = (df_orig[schema["fecha"]].dt.year == anio) & \
+                       (df_orig[schema["fecha"]].dt.month == mes_num)
+                total_mes = df_orig.loc[mask, schema["total"]].sum()
+                df[mes_col] = total_mes
+        
+        # Agregar columnas de totales (si hay información de sucursal)
+        if schema.get("sucursal"):
+            for total_col in config_cols["totales"]:
+                if total_col == "TOTAL HIPER":
+                    # Filtrar por sucursales tipo "HIPER" (ajustar según tu lógica)
+                    mask = df_orig[schema["sucursal"]].str.contains("HIPER", case=False, na=False)
+                    df[total_col] = df_orig.loc[mask, schema["total"]].sum()
+                elif total_col == "TOTAL CORRIENTES":
+                    # Filtrar por sucursales en Corrientes (ajustar según tu lógica)
+                    mask = df_orig[schema["sucursal"]].str.contains("CORRIENTES", case=False, na=False)
+                    df[total_col] = df_orig.loc[mask, schema["total"]].sum()
+                elif total_col == "TOTAL CONSOLIDADO":
+                    df[total_col] = df_orig[schema["total"]].sum()
+        else:
+            # Si no hay sucursal, poner totales generales
+            for total_col in config_cols["totales"]:
+                if total_col == "TOTAL CONSOLIDADO":
+                    df[total_col] = df_orig[schema["total"]].sum()
+                else:
+                    df[total_col] = 0  # No se puede calcular sin info de sucursal
+    
+    return df
+
+
+# ===================== CALIDAD DE DATOS =====================
+
+CAMPOS_NUMERICOS = ("cantidad", "precio", "total")
+FACTOR_IQR_ATIPICO = 3.0  # log fuera de [Q1 - 3·IQR, Q3 + 3·IQR]
+FACTOR_PRECIO_ATIPICO = 5.0  # precio 5 veces mayor o menor que la mediana del producto
+MAX_VALORES_VARIANTES = 20_000  # con más valores distintos no se buscan variantes de escritura
+TOP_VALORES = 3
+TODOS_LOS_ARCHIVOS = "(todos)"
+
+
+def _variantes_escritura(unicos, conteos):
+    """Marca los valores que son una escritura minoritaria de otro ("Bebidas " vs "BEBIDAS").
+
+    Se comparan sin espacios extra, mayúsculas ni acentos; en cada grupo la
+    escritura más frecuente se toma como la correcta.
+    """
+    clave = (pd.Series(unicos, dtype="string").str.strip().str.replace(r"\s+", " ", regex=True)
+             .str.casefold().str.normalize("NFKD").str.encode("ascii", errors="ignore").str.decode("ascii"))
+    grupo = pd.factorize(clave)[0]
+    orden = np.lexsort((-conteos, grupo))
+    principal = np.zeros(len(unicos), dtype=bool)
+    principal[orden[np.r_[True, grupo[orden][1:] != grupo[orden][:-1]]]] = True
+    return ~principal
+
+
+def _contar_pares(codigos, archivo, k):
+    """Pares (código de valor, archivo) presentes y sus filas, ordenados por valor y archivo."""
+    combinado = codigos * k + archivo
+    if len(combinado) and combinado.max() < 4 * len(combinado):
+        cuenta = np.bincount(combinado)
+        pares = np.flatnonzero(cuenta)
+        return pares, cuenta[pares]
+    return np.unique(combinado, return_counts=True)
+
+
+def _texto_valor(valor):
+    return str(pd.Timestamp(valor)) if isinstance(valor, (pd.Timestamp, np.datetime64)) else str(valor)
+
+
+def perfil_calidad(df, schema):
+    """Perfil de calidad por columna y por ``_archivo_origen`` en una sola pasada.
+
+    Cada columna se factoriza una vez y nulos, distintos, mínimo, máximo y
+    valores más frecuentes salen de contar pares (valor, archivo) con numpy.
+    Conviene correrlo sobre los datos leídos, antes de ``optimizar_tipos``:
+    así cuenta las fechas y números que no se pueden convertir (los que las
+    acciones descartan con ``errors="coerce"``). Anomalías: medidas
+    negativas o atípicas (el precio contra la mediana del producto, el resto
+    por rango intercuartil), fechas futuras y variantes de escritura.
+
+    Devuelve una fila por columna y archivo más una fila "(todos)".
+    """
+    if "_archivo_origen" in df.columns:
+        archivo, nombres = pd.factorize(df["_archivo_origen"], sort=True)
+        nombres = [str(n) for n in nombres]
+        if (archivo < 0).any():
+            archivo = np.where(archivo < 0, len(nombres), archivo)
+            nombres.append(SIN_DATO)
+    else:
+        archivo, nombres = np.zeros(len(df), dtype=np.int64), [TODOS_LOS_ARCHIVOS]
+    k = len(nombres)
+    # Posición k = total; sin _archivo_origen el único "archivo" ya es el total
+    filas_salida = list(range(k + 1)) if "_archivo_origen" in df.columns else [k]
+    etiquetas = nombres + [TODOS_LOS_ARCHIVOS]
+    filas = np.r_[np.bincount(archivo, minlength=k), len(df)]
+    campo_de = {col: campo for campo, col in schema.items() if col}
+    ahora = pd.Timestamp.now()
+
+    def por_archivo(marcas):
+        cuenta = np.bincount(archivo[marcas], minlength=k) if marcas.any() else np.zeros(k, dtype=np.int64)
+        return np.r_[cuenta, cuenta.sum()]
+
+    partes = []
+    for col in df.columns:
+        if col in ("_archivo_origen", "_hoja_origen"):
+            continue
+        campo = campo_de.get(col)
+        crudo = df[col]
+
+        # La fecha y las medidas del esquema se interpretan igual que en las acciones
+        serie = crudo
+        if campo == "fecha" and not pd.api.types.is_datetime64_any_dtype(crudo):
+            serie = pd.to_datetime(crudo, errors="coerce")
+        elif campo in CAMPOS_NUMERICOS and not pd.api.types.is_numeric_dtype(crudo):
+            serie = pd.to_numeric(crudo, errors="coerce")
+        nulos_crudo = crudo.isna().to_numpy()
+        no_convertibles = serie.isna().to_numpy() & ~nulos_crudo
+
+        codigos, unicos = pd.factorize(serie, sort=True)
+        validos = codigos >= 0
+        pares, cuenta = _contar_pares(codigos[validos], archivo[validos], k)
+        valor_par, archivo_par = pares // k, pares % k
+        conteo_valor = np.bincount(codigos[validos], minlength=len(unicos))
+        distintos = np.r_[np.bincount(archivo_par, minlength=k), len(unicos)]
+
+        # Pares reordenados por (archivo, -filas, valor): los primeros de cada archivo son los más frecuentes
+        o = np.lexsort((valor_par, -cuenta, archivo_par))
+        a_ord, v_ord, c_ord = archivo_par[o], valor_par[o], cuenta[o]
+        puesto = np.arange(len(o)) - np.searchsorted(a_ord, a_ord)
+        frecuentes = [[] for _ in range(k + 1)]
+        for a, v, c in zip(a_ord[puesto < TOP_VALORES], v_ord[puesto < TOP_VALORES], c_ord[puesto < TOP_VALORES]):
+            frecuentes[a].append(f"{_texto_valor(unicos[v])} ({c})")
+        for v in np.argsort(-conteo_valor, kind="stable")[:TOP_VALORES]:
+            frecuentes[k].append(f"{_texto_valor(unicos[v])} ({conteo_valor[v]})")
+
+        # Con los códigos ordenados por valor, el mínimo y el máximo son el menor y mayor código de cada archivo
+        minimo, maximo = [None] * (k + 1), [None] * (k + 1)
+        if len(pares) and (pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_datetime64_any_dtype(serie)):
+            menor = np.full(k, len(unicos))
+            mayor = np.full(k, -1)
+            np.minimum.at(menor, archivo_par, valor_par)
+            np.maximum.at(mayor, archivo_par, valor_par)
+            for a in np.flatnonzero(mayor >= 0):
+                minimo[a], maximo[a] = _texto_valor(unicos[menor[a]]), _texto_valor(unicos[mayor[a]])
+            minimo[k], maximo[k] = _texto_valor(unicos[0]), _texto_valor(unicos[-1])
+
+        anomalias = {}
+        if campo in CAMPOS_NUMERICOS and pd.api.types.is_numeric_dtype(serie):
+            x = serie.to_numpy(dtype=float, na_value=np.nan)
+            anomalias["Negativos"] = x < 0
+            if campo == "precio" and schema.get("producto") in df.columns:
+                mediana = pd.Series(x).groupby(df[schema["producto"]].to_numpy(), dropna=False).transform("median")
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    razon = x / mediana.to_numpy()
+                anomalias["Atipicos"] = (razon > FACTOR_PRECIO_ATIPICO) | (razon < 1 / FACTOR_PRECIO_ATIPICO)
+            elif (x > 0).any():
+                # Rango intercuartil en escala logarítmica: las ventas tienen cola larga a la derecha
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    logx = np.log(np.where(x > 0, x, np.nan))
+                q1, q3 = np.nanquantile(logx, [0.25, 0.75])
+                margen = (q3 - q1) * FACTOR_IQR_ATIPICO
+                anomalias["Atipicos"] = (logx < q1 - margen) | (logx > q3 + margen)
+        elif pd.api.types.is_datetime64_any_dtype(serie):
+            anomalias["FechasFuturas"] = (serie > ahora).to_numpy()
+        elif 0 < len(unicos) <= MAX_VALORES_VARIANTES and not pd.api.types.is_numeric_dtype(serie):
+            variante = _variantes_escritura(np.asarray(unicos, dtype=object), conteo_valor)
+            anomalias["Variantes"] = np.r_[variante, False][codigos]  # código -1 (nulo) -> False
+
+        conteos = {nombre: por_archivo(marcas) for nombre, marcas in anomalias.items()}
+        no_conv = por_archivo(no_convertibles)
+        nulos = por_archivo(nulos_crudo)
+        tabla = pd.DataFrame({
+            "Columna": col,
+            "Campo": campo or "",
+            "Tipo": str(crudo.dtype),
+            "Archivo": etiquetas,
+            "Filas": filas,
+            "Nulos": nulos,
+            "Nulos_pct": np.round(nulos / np.maximum(filas, 1) * 100, 2),
+            "NoConvertibles": no_conv,
+            "Distintos": distintos,
+            "Minimo": minimo,
+            "Maximo": maximo,
+            "ValoresFrecuentes": ["; ".join(f) for f in frecuentes],
+            **conteos,
+            "Anomalias": no_conv + sum(conteos.values(), np.zeros(k + 1, dtype=np.int64)),
+        })
+        partes.append(tabla.iloc[filas_salida])
+
+    if not partes:
+        return "No hay columnas para perfilar."
+    perfil = pd.concat(partes, ignore_index=True)
+    anomalias = [c for c in ("Negativos", "Atipicos", "FechasFuturas", "Variantes") if c in perfil.columns]
+    perfil[anomalias] = perfil[anomalias].fillna(0).astype(np.int64)
+    return perfil[[c for c in perfil.columns if c not in anomalias and c != "Anomalias"] + anomalias + ["Anomalias"]]
+
+
+# ===================== CONTEO APROXIMADO (HyperLogLog) =====================
+
+HLL_PRECISION_DEFAULT = 12
+
+
+def hll_error_relativo(precision=HLL_PRECISION_DEFAULT):
+    """Error estándar relativo teórico de un sketch HLL con 2**precision registros."""
+    return 1.04 / np.sqrt(2 ** precision)
+
+
+def _ceros_iniciales(x):
+    """Cuenta los ceros a la izquierda de cada uint64 (búsqueda binaria vectorizada)."""
+    x = x.copy()
+    n = np.zeros(len(x), dtype=np.int64)
+    for desplazamiento in (32, 16, 8, 4, 2, 1):
+        arriba_en_cero = x < (np.uint64(1) << np.uint64(64 - desplazamiento))
+        n[arriba_en_cero] += desplazamiento
+        x[arriba_en_cero] <<= np.uint64(desplazamiento)
+    n[x == 0] += 1
+    return n
+
+
+def _hll_indices(valores, precision):
+    """Hashea los valores y devuelve (índice de registro, rango) de cada uno."""
+    valores = pd.Series(valores)
+    validos = valores.notna().to_numpy()
+    h = pd.util.hash_pandas_object(valores[validos], index=False).to_numpy(dtype=np.uint64)
+    p = np.uint64(precision)
+    idx = (h >> (np.uint64(64) - p)).astype(np.int64)
+    rango = np.minimum(_ceros_iniciales(h << p) + 1, 64 - precision + 1)
+    return idx, rango, validos
+
+
+def _hll_formula(suma_inversa, ceros, m):
+    """Estimador HLL con corrección de rango bajo (linear counting)."""
+    alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+    crudo = alpha * m * m / suma_inversa
+    lineal = m * np.log(m / np.maximum(ceros, 1))
+    return np.where((crudo <= 2.5 * m) & (ceros > 0), lineal, crudo)
+
+
+def hll_registros(valores, grupos=None, n_grupos=1, precision=HLL_PRECISION_DEFAULT):
+    """Sketches HLL densos (n_grupos x 2**precision, uint8), uno por grupo.
+
+    Los sketches se combinan con ``hll_combinar`` sin volver a leer los datos.
+    """
+    m = 2 ** precision
+    idx, rango, validos = _hll_indices(valores, precision)
+    grupos = np.zeros(len(validos), dtype=np.int64) if grupos is None else np.asarray(grupos)
+    grupos = grupos[validos]
+    usar = grupos >= 0
+    registros = np.zeros(n_grupos * m, dtype=np.uint8)
+    np.maximum.at(registros, grupos[usar] * m + idx[usar], rango[usar].astype(np.uint8))
+    return registros.reshape(n_grupos, m)
+
+
+def hll_combinar(registros, filas=None):
+    """Une varios sketches (filas de la matriz) en uno solo: máximo por registro."""
+    registros = np.atleast_2d(registros)
+    if filas is not None:
+        registros = registros[filas]
+    return registros.max(axis=0)
+
+
+def hll_estimar(registros):
+    """Cantidad estimada de distintos para cada sketch (fila) de la matriz."""
+    registros = np.atleast_2d(registros)
+    m = registros.shape[1]
+    suma_inversa = np.ldexp(1.0, -registros.astype(np.int64)).sum(axis=1)
+    ceros = (registros == 0).sum(axis=1)
+    return _hll_formula(suma_inversa, ceros, m)
+
+
+def hll_contar_por_grupo(valores, grupos, n_grupos, precision=HLL_PRECISION_DEFAULT):
+    """Distintos estimados por grupo usando registros dispersos.
+
+    Solo guarda los registros no nulos de cada grupo, así que sirve para
+    muchos grupos (p. ej. un sketch por producto) sin reservar 2**precision
+    bytes por grupo.
+    """
+    m = 2 ** precision
+    idx, rango, validos = _hll_indices(valores, precision)
+    grupos = np.asarray(grupos)[validos]
+    usar = grupos >= 0
+    clave = grupos[usar].astype(np.int64) * m + idx[usar]
+    maximos = pd.Series(rango[usar]).groupby(clave).max()
+    grupo_reg = maximos.index.to_numpy() // m
+    suma_inversa = np.ones(n_grupos) * m
+    no_nulos = np.bincount(grupo_reg, minlength=n_grupos)
+    # Registros nulos aportan 2**0 = 1; se descuenta uno por cada registro ocupado
+    suma_inversa += np.bincount(grupo_reg, weights=np.ldexp(1.0, -maximos.to_numpy()) - 1,
+                                minlength=n_grupos)
+    return _hll_formula(suma_inversa, m - no_nulos, m)
+
+
+def _agregar_error_hll(tabla, columna, precision):
+    """Agrega error relativo e intervalo aproximado del 95% a una columna estimada."""
+    err = hll_error_relativo(precision)
+    estimado = tabla[columna].astype(float)
+    tabla[columna] = estimado.round().astype(int)
+    tabla["ErrorRelativo_%"] = round(err * 100, 2)
+    tabla["IC95_Min"] = (estimado * (1 - 2 * err)).round().astype(int)
+    tabla["IC95_Max"] = (estimado * (1 + 2 * err)).round().astype(int)
+    return tabla
+
+
+def _distintos_por_mes(d, schema, columna, nombre):
+    """Distintos exactos por mes; la fila TOTAL cuenta sobre todo el período (como en modo aproximado)."""
+    d = d.assign(Mes=d[schema["fecha"]].dt.to_period("M").astype(str))
+    tabla = d.groupby("Mes")[columna].nunique().reset_index(name=nombre).sort_values("Mes")
+    total = pd.DataFrame({"Mes": ["TOTAL"], nombre: [d[columna].nunique()]})
+    return pd.concat([tabla, total], ignore_index=True)
+
+
+def _distintos_por_mes_aprox(d, schema, columna, nombre, precision):
+    """Distintos por mes con un sketch HLL por mes; la fila TOTAL une los sketches."""
+    meses, etiquetas = pd.factorize(d[schema["fecha"]].dt.to_period("M"), sort=True)
+    registros = hll_registros(d[columna], meses, len(etiquetas), precision)
+    estimados = list(hll_estimar(registros)) + list(hll_estimar(hll_combinar(registros)))
+    tabla = pd.DataFrame({
+        "Mes": list(etiquetas.astype(str)) + ["TOTAL"],
+        nombre: estimados,
+    })
+    return _agregar_error_hll(tabla, nombre, precision)
+
+
+# ===================== ACCIONES =====================
+
+def accion_totales_por_periodo(df, schema, periodo="mes", fecha_inicio=None, fecha_fin=None):
+    if not schema["fecha"] or not schema["total"]:
+        return "Requiere columna de fecha y total."
+
+    d = df.copy()
+    d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
+    d = d.dropna(subset=[schema["fecha"]])
+
+    if fecha_inicio:
+        d = d[d[schema["fecha"]] >= pd.to_datetime(fecha_inicio)]
+    if fecha_fin:
+        fin = pd.to_datetime(fecha_fin)
+        if fin == fin.normalize():
+            d = d[d[schema["fecha"]] < fin + pd.Timedelta(days=1)]  # día completo
+        else:
+            d = d[d[schema["fecha"]] <= fin]
+
+    if d.empty:
+        return pd.DataFrame(columns=["Periodo", "TotalFacturado"])
+
+    if periodo == "dia":
+        d["Periodo"] = d[schema["fecha"]].dt.date
+    elif periodo == "mes":
+        d["Periodo"] = d[schema["fecha"]].dt.to_period("M").astype(str)
+    elif periodo == "rango":
+        total = d[schema["total"]].sum()
+        return pd.DataFrame([{"Periodo": f"{fecha_inicio}–{fecha_fin}", "TotalFacturado": total}])
+    else:
+        d["Periodo"] = d[schema["fecha"]]
+
+    tabla = (
+        d.groupby("Periodo", as_index=False)[schema["total"]]
+        .sum()
+        .rename(columns={schema["total"]: "TotalFacturado"})
+        .sort_values("Periodo")
+    )
+    return tabla
+
+
+def accion_unidades_totales(df, schema, por="producto"):
+    if not schema["cantidad"]:
+        return "Requiere columna de cantidad."
+
+    if por == "producto" and schema["producto"]:
+        grupo = schema["producto"]
+        nombre = "IdArticulo"
+    elif por == "categoria" and schema["departamento"]:
+        grupo = schema["departamento"]
+        nombre = "Categoria"
+    elif por == "vendedor" and schema["vendedor"]:
+        grupo = schema["vendedor"]
+        nombre = "Vendedor"
+    else:
+        return "No se ha mapeado la columna necesaria para esta agregación."
+
+    tabla = (
+        df.groupby(grupo, as_index=False, observed=True)[schema["cantidad"]]
+        .sum()
+        .rename(columns={grupo: nombre, schema["cantidad"]: "UnidadesVendidas"})
+        .sort_values("UnidadesVendidas", ascending=False)
+    )
+    return tabla
+
+
+def accion_conteo_tickets(df, schema, por="producto", aproximado=False,
+                          precision=HLL_PRECISION_DEFAULT):
+    if not schema["ticket"]:
+        return "Requiere columna de ticket."
+
+    d = df.copy()
+
+    if por == "producto" and schema["producto"]:
+        grupo = [schema["producto"]]
+        nombre = "IdArticulo"
+    elif por == "dia" and schema["fecha"]:
+        d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
+        d = d.dropna(subset=[schema["fecha"]])
+        d["Dia"] = d[schema["fecha"]].dt.date
+        grupo = ["Dia"]
+        nombre = "Dia"
+    elif por == "vendedor" and schema["vendedor"]:
+        grupo = [schema["vendedor"]]
+        nombre = "Vendedor"
+    else:
+        return "No se ha mapeado la columna necesaria para esta agregación."
+
+    if aproximado:
+        agrupado = d.groupby(grupo, observed=True)
+        codigos = agrupado.ngroup().to_numpy()
+        claves = agrupado.size().index
+        tabla = pd.DataFrame({
+            nombre: claves.get_level_values(0),
+            "CantidadTickets": hll_contar_por_grupo(d[schema["ticket"]], codigos, len(claves), precision),
+        })
+        tabla = _agregar_error_hll(tabla, "CantidadTickets", precision)
+        return tabla.sort_values("CantidadTickets", ascending=False)
+
+    tabla = (
+        d.groupby(grupo, observed=True)[schema["ticket"]]
+        .nunique()
+        .reset_index(name="CantidadTickets")
+        .rename(columns={grupo[0]: nombre})
+        .sort_values("CantidadTickets", ascending=False)
+    )
+    return tabla
+
+
+def accion_productos_unicos(df, schema):
+    if not schema["producto"]:
+        return "Requiere columna de IdArticulo."
+    n = df[schema["producto"]].nunique()
+    lista = (
+        df[[schema["producto"], schema.get("descripcion", schema["producto"])]]
+        .drop_duplicates()
+        .reset_index(drop=True)
+    )
+    return n, lista
+
+
+def accion_productos_unicos_mes(df, schema, aproximado=False, precision=HLL_PRECISION_DEFAULT):
+    if not schema["producto"] or not schema["fecha"]:
+        return "Requiere IdArticulo y fecha."
+    d = df.copy()
+    d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
+    d = d.dropna(subset=[schema["fecha"]])
+    if aproximado:
+        return _distintos_por_mes_aprox(d, schema, schema["producto"], "ProductosUnicos", precision)
+    return _distintos_por_mes(d, schema, schema["producto"], "ProductosUnicos")
+
+
+def accion_clientes_unicos(df, schema, aproximado=False, precision=HLL_PRECISION_DEFAULT):
+    """Clientes distintos; en modo aproximado devuelve (estimación, error relativo)."""
+    if not schema["cliente"]:
+        return "Requiere columna de cliente."
+    if aproximado:
+        estimado = hll_estimar(hll_registros(df[schema["cliente"]], precision=precision))[0]
+        return int(round(estimado)), float(hll_error_relativo(precision))
+    return df[schema["cliente"]].nunique()
+
+
+def accion_clientes_unicos_mes(df, schema, aproximado=False, precision=HLL_PRECISION_DEFAULT):
+    if not schema["cliente"] or not schema["fecha"]:
+        return "Requiere cliente y fecha."
+    d = df.copy()
+    d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
+    d = d.dropna(subset=[schema["fecha"]])
+    if aproximado:
+        return _distintos_por_mes_aprox(d, schema, schema["cliente"], "ClientesUnicos", precision)
+    return _distintos_por_mes(d, schema, schema["cliente"], "ClientesUnicos")
+
+
+def accion_clientes_recurrentes(df, schema, min_veces=2):
+    if not schema["cliente"] or not schema["ticket"]:
+        return "Requiere cliente y ticket."
+    tickets_por_cliente = (
+        df.groupby(schema["cliente"], observed=True)[schema["ticket"]]
+        .nunique()
+        .reset_index(name="Compras")
+    )
+    recurrentes = tickets_por_cliente[tickets_por_cliente["Compras"] >= min_veces]
+    return recurrentes
+
+
+def _puntaje_cuantil(serie, cuantiles, ascendente=True):
+    """Puntaje 1..cuantiles según la posición percentil (empates promediados)."""
+    pct = serie.rank(method="average", pct=True, ascending=ascendente)
+    return np.ceil(pct * cuantiles).clip(1, cuantiles).astype(int)
+
+
+def accion_rfm(df, schema, cuantiles=5, fecha_referencia=None):
+    """Segmentación RFM: recencia, frecuencia y monto por cliente en un solo groupby.
+
+    La frecuencia cuenta tickets distintos (o días con compra si no hay
+    ticket mapeado). La recencia se mide contra ``fecha_referencia`` o el día
+    siguiente a la última venta del archivo.
+    """
+    if not schema["cliente"] or not schema["fecha"] or not schema["total"]:
+        return "Requiere cliente, fecha y total."
+
+    d = pd.DataFrame({
+        "Cliente": df[schema["cliente"]],
+        "Fecha": pd.to_datetime(df[schema["fecha"]], errors="coerce"),
+        "Total": pd.to_numeric(df[schema["total"]], errors="coerce"),
+    })
+    d["Compra"] = df[schema["ticket"]] if schema["ticket"] else d["Fecha"].dt.normalize()
+    d = d.dropna(subset=["Cliente", "Fecha"])
+    if d.empty:
+        return "No hay ventas con cliente y fecha válidos."
+
+    rfm = d.groupby("Cliente", observed=True).agg(
+        PrimeraCompra=("Fecha", "min"),
+        UltimaCompra=("Fecha", "max"),
+        Frecuencia=("Compra", "nunique"),
+        Monetario=("Total", "sum"),
+    ).reset_index()
+
+    referencia = (pd.to_datetime(fecha_referencia) if fecha_referencia
+                  else d["Fecha"].max().normalize() + pd.Timedelta(days=1))
+    rfm["Recencia_dias"] = (referencia - rfm["UltimaCompra"]).dt.days
+
+    rfm["R"] = _puntaje_cuantil(rfm["Recencia_dias"], cuantiles, ascendente=False)
+    rfm["F"] = _puntaje_cuantil(rfm["Frecuencia"], cuantiles)
+    rfm["M"] = _puntaje_cuantil(rfm["Monetario"], cuantiles)
+    rfm["RFM"] = rfm["R"].astype(str) + rfm["F"].astype(str) + rfm["M"].astype(str)
+
+    r = rfm["R"] / cuantiles
+    f = rfm["F"] / cuantiles
+    rfm["Segmento"] = np.select(
+        [
+            (r >= 0.8) & (f >= 0.8),
+            (r >= 0.8) & (f <= 0.2),
+            (r >= 0.4) & (f >= 0.6),
+            r >= 0.6,
+            (r <= 0.4) & (f >= 0.6),
+            r <= 0.2,
+        ],
+        ["Campeones", "Nuevos", "Leales", "Potenciales", "En riesgo", "Perdidos"],
+        default="Necesitan atención",
+    )
+    return rfm.sort_values("Monetario", ascending=False, kind="mergesort").reset_index(drop=True)
+
+
+def accion_cohortes(df, schema, porcentaje=True):
+    """Retención mensual por cohorte de adquisición (mes de primera compra).
+
+    Cada fila es una cohorte; la columna Mk indica qué parte de sus clientes
+    volvió a comprar k meses después de la primera compra.
+    """
+    if not schema["cliente"] or not schema["fecha"]:
+        return "Requiere cliente y fecha."
+
+    fechas = pd.to_datetime(df[schema["fecha"]], errors="coerce")
+    d = pd.DataFrame({
+        "Cliente": df[schema["cliente"]],
+        "Mes": fechas.dt.year * 12 + fechas.dt.month - 1,
+    }).dropna().drop_duplicates()
+    if d.empty:
+        return "No hay ventas con cliente y fecha válidos."
+
+    d["Mes"] = d["Mes"].astype(int)
+    d["Cohorte"] = d.groupby("Cliente", observed=True)["Mes"].transform("min")
+    d["Offset"] = d["Mes"] - d["Cohorte"]
+
+    matriz = d.groupby(["Cohorte", "Offset"]).size().unstack(fill_value=0)
+    iniciales = matriz[0].to_numpy()
+    valores = matriz.to_numpy(dtype=float, copy=True)
+    if porcentaje:
+        valores = (valores / iniciales[:, None] * 100).round(2)
+    # Los meses que todavía no ocurrieron para una cohorte quedan vacíos
+    cohortes = matriz.index.to_numpy()
+    valores[cohortes[:, None] + matriz.columns.to_numpy()[None, :] > d["Mes"].max()] = np.nan
+
+    tabla = pd.DataFrame(valores, columns=[f"M{k}" for k in matriz.columns])
+    tabla.insert(0, "Cohorte", [f"{c // 12}-{c % 12 + 1:02d}" for c in cohortes])
+    tabla.insert(1, "ClientesIniciales", iniciales)
+    return tabla
+
+
+def accion_precio_promedio_producto(df, schema):
+    if not schema["producto"] or not schema["precio"]:
+        return "Requiere IdArticulo y precio unitario."
+    tabla = (
+        df.groupby(schema["producto"], as_index=False, observed=True)[schema["precio"]]
+        .mean()
+        .rename(columns={schema["producto"]: "IdArticulo",
+                         schema["precio"]: "PrecioPromedio"})
+        .sort_values("PrecioPromedio", ascending=False)
+    )
+    return tabla
+
+
+def accion_ticket_promedio_por(df, schema, por="dia"):
+    if not schema["ticket"] or not schema["total"]:
+        return "Requiere ticket y total."
+
+    d = df.copy()
+    totales_por_ticket = (
+        d.groupby(schema["ticket"], as_index=False, observed=True)[schema["total"]]
+        .sum()
+        .rename(columns={schema["total"]: "TotalTicket"})
+    )
+
+    if por == "dia" and schema["fecha"]:
+        d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
+        d = d.dropna(subset=[schema["fecha"]])
+        mapa_ticket_dia = d.groupby(schema["ticket"], observed=True)[schema["fecha"]].min().dt.date
+        totales_por_ticket["Dia"] = totales_por_ticket[schema["ticket"]].map(mapa_ticket_dia)
+        tabla = (
+            totales_por_ticket.groupby("Dia")["TotalTicket"]
+            .mean()
+            .reset_index(name="TicketPromedio")
+        )
+    elif por == "vendedor" and schema["vendedor"]:
+        mapa_ticket_vend = d.groupby(schema["ticket"], observed=True)[schema["vendedor"]].first()
+        totales_por_ticket["Vendedor"] = totales_por_ticket[schema["ticket"]].map(mapa_ticket_vend)
+        tabla = (
+            totales_por_ticket.groupby("Vendedor", observed=True)["TotalTicket"]
+            .mean()
+            .reset_index(name="TicketPromedio")
+        )
+    else:
+        return "Falta mapear fecha o vendedor."
+
+    return tabla
+
+
+def accion_participacion(df, schema, nivel="producto"):
+    if not schema["total"]:
+        return "Requiere columna total."
+
+    if nivel == "producto" and schema["producto"]:
+        grupo = schema["producto"]
+        nombre = "IdArticulo"
+    elif nivel == "familia" and schema["departamento"]:
+        grupo = schema["departamento"]
+        nombre = "Familia"
+    else:
+        return "No se ha mapeado la columna necesaria."
+
+    d = df.copy()
+    tabla = (
+        d.groupby(grupo, observed=True)[schema["total"]]
+        .sum()
+        .reset_index(name="Total")
+        .rename(columns={grupo: nombre})
+    )
+    total_general = tabla["Total"].sum()
+    tabla["Participacion_%"] = (tabla["Total"] / total_general * 100).round(2)
+    tabla = tabla.sort_values("Total", ascending=False)
+    return tabla
+
+
+def accion_segmentacion_sucursal(df, schema):
+    if not schema["sucursal"] or not schema["total"]:
+        return "Requiere sucursal y total."
+    tabla = (
+        df.groupby(schema["sucursal"], as_index=False, observed=True)[schema["total"]]
+        .sum()
+        .rename(columns={schema["sucursal"]: "Sucursal",
+                         schema["total"]: "TotalFacturado"})
+        .sort_values("TotalFacturado", ascending=False)
+    )
+    return tabla
+
+
+# Jerarquía de producto, de lo general a lo particular: (clave del esquema, nombre en resultados)
+NIVELES_JERARQUIA = [
+    ("departamento", "Departamento"),
+    ("familia", "Familia"),
+    ("subfamilia", "SubFamilia"),
+    ("producto", "IdArticulo"),
+]
+SIN_DATO = "(sin dato)"
+
+
+def rollup_jerarquia(fino, cruce, niveles):
+    """Subtotales de todos los niveles a partir de la tabla agregada al nivel más fino.
+
+    ``fino`` tiene las columnas ``cruce`` (p. ej. ["Sucursal"] o []), las de
+    ``niveles`` (de lo general a lo particular) y las medidas Total, Lineas y
+    opcionalmente Unidades. Cada nivel se obtiene sumando esa tabla chica,
+    sin volver a recorrer las ventas. Devuelve el árbol en orden de
+    recorrido: cada nodo seguido de sus hijos, hermanos por Total descendente.
+    """
+    medidas = [m for m in ("Total", "Unidades", "Lineas") if m in fino.columns]
+    partes = []
+    for k in range(len(niveles) + 1):
+        claves = cruce + niveles[:k]
+        if claves:
+            parte = fino.groupby(claves, sort=False)[medidas].sum().reset_index()
+            parte[claves] = parte[claves].astype(object)  # que el concat no pase claves enteras a float
+        else:
+            parte = fino[medidas].sum().to_frame().T
+        parte["Nivel"] = k
+        if k == 0:
+            parte["Participacion_padre_%"] = 100.0
+        else:
+            padre = parte.groupby(claves[:-1], sort=False)["Total"].transform("sum") if claves[:-1] else parte["Total"].sum()
+            parte["Participacion_padre_%"] = (parte["Total"] / padre * 100).round(2)
+            # Orden entre hermanos: el que más factura primero y, a igual total, por clave
+            # (así el árbol no depende del orden en que llegaron las filas)
+            parte = parte.sort_values(claves[-1], key=lambda s: s.astype(str), kind="mergesort")
+            parte[f"_orden{k}"] = parte.groupby(claves[:-1], sort=False)["Total"].rank(method="first", ascending=False) \
+                if claves[:-1] else parte["Total"].rank(method="first", ascending=False)
+        partes.append(parte)
+
+    # Cada fila hereda el orden de sus ancestros para quedar debajo de su padre
+    for k in range(2, len(partes)):
+        for j in range(1, k):
+            orden = partes[j][cruce + niveles[:j] + [f"_orden{j}"]]
+            partes[k] = partes[k].merge(orden, on=cruce + niveles[:j], how="left")
+    arbol = pd.concat(partes, ignore_index=True)
+    columnas_orden = cruce + [f"_orden{k}" for k in range(1, len(partes))]
+    arbol = arbol.sort_values(columnas_orden, na_position="first", kind="mergesort").reset_index(drop=True)
+
+    # Denominador: el Total de la raíz (Nivel 0) de cada cruce, no el nodo más grande
+    # (con notas de crédito o devoluciones un subtotal puede superar a la raíz)
+    total_raiz = arbol["Total"].where(arbol["Nivel"] == 0)
+    raiz = total_raiz.groupby([arbol[c] for c in cruce], sort=False).transform("first") if cruce \
+        else total_raiz.iloc[0]
+    arbol["Participacion_total_%"] = (arbol["Total"] / raiz * 100).round(2)
+    nodo = pd.Series("TOTAL", index=arbol.index, dtype=object)
+    for k, nivel in enumerate(niveles, start=1):
+        es_nivel = arbol["Nivel"] == k
+        nodo[es_nivel] = "    " * (k - 1) + arbol.loc[es_nivel, nivel].astype(str)
+    arbol.insert(0, "Nodo", nodo)
+    return arbol[cruce + ["Nivel", "Nodo"] + niveles + medidas + ["Participacion_padre_%", "Participacion_total_%"]]
+
+
+def accion_jerarquia(df, schema, cruce=None):
+    """Drill-down Departamento → Familia → SubFamilia → IdArticulo en un solo groupby.
+
+    Agrupa una vez al nivel más fino (cruzado opcionalmente por "sucursal"
+    o "mes") y arma los subtotales de los niveles superiores con
+    ``rollup_jerarquia``. Los niveles sin columna mapeada se omiten y los
+    valores vacíos quedan como "(sin dato)" para que los subtotales cierren.
+    """
+    if not schema.get("total"):
+        return "Requiere columna total."
+    niveles = [(clave, nombre) for clave, nombre in NIVELES_JERARQUIA if schema.get(clave)]
+    if not niveles:
+        return "Requiere al menos una columna de la jerarquía (departamento, familia, subfamilia o IdArticulo)."
+
+    columnas = {}
+    d = df
+    if cruce == "mes":
+        if not schema.get("fecha"):
+            return "Requiere columna de fecha para cruzar por mes."
+        fechas = pd.to_datetime(df[schema["fecha"]], errors="coerce")
+        d = df[fechas.notna().to_numpy()]
+        columnas["Mes"] = fechas[fechas.notna()].dt.to_period("M").astype(str)
+    elif cruce:
+        if not schema.get(cruce):
+            return f"Requiere columna de {cruce} para cruzar."
+        columnas[cruce.capitalize()] = d[schema[cruce]]
+    for clave, nombre in niveles:
+        columnas[nombre] = d[schema[clave]]
+    columnas["Total"] = d[schema["total"]]
+    if schema.get("cantidad"):
+        columnas["Unidades"] = d[schema["cantidad"]]
+    plano = pd.DataFrame(columnas)
+
+    claves = list(columnas)[:len(columnas) - (2 if schema.get("cantidad") else 1)]
+    agregaciones = {"Total": ("Total", "sum"), "Lineas": ("Total", "size")}
+    if schema.get("cantidad"):
+        agregaciones["Unidades"] = ("Unidades", "sum")
+    fino = plano.groupby(claves, observed=True, dropna=False, sort=False).agg(**agregaciones).reset_index()
+    if fino.empty:
+        return pd.DataFrame(columns=["Nivel", "Nodo", "Total"])
+    for col in claves:
+        fino[col] = fino[col].astype(object).where(fino[col].notna(), SIN_DATO)
+
+    cruce_cols = claves[:len(claves) - len(niveles)]
+    return rollup_jerarquia(fino, cruce_cols, [nombre for _, nombre in niveles])
+
+
+def _codigos_combinados(columnas, n):
+    """Un código entero por combinación de valores, creciente en el orden de los valores."""
+    codigo = np.zeros(n, dtype=np.int64)
+    for col in columnas:
+        c, valores = pd.factorize(col, sort=True)
+        codigo = codigo * len(valores) + c
+    return codigo
+
+
+def _meses_a_texto(meses):
+    """Meses como enteros (meses desde 1970, como datetime64[M]) a "AAAA-MM", categórico."""
+    unicos, posiciones = np.unique(meses, return_inverse=True)
+    return pd.Categorical.from_codes(posiciones, np.datetime_as_string(unicos.astype("datetime64[M]")))
+
+
+def clasificar_abc(g, grupos, corte_a=80.0, corte_b=95.0):
+    """Clases ABC de una tabla agregada ``grupos`` + IdArticulo + Total.
+
+    Un solo ordenamiento (grupo, Total descendente, IdArticulo) y sumas
+    acumuladas de numpy para todos los grupos a la vez. Un producto es A
+    mientras lo acumulado por los que venden más que él no llega a
+    ``corte_a`` %, B hasta ``corte_b`` % y C el resto (el primero de cada
+    grupo siempre es A). Si "Mes" (entero, meses desde 1970) está en
+    ``grupos`` se agrega ClaseAnterior: la clase del mes calendario
+    anterior, "-" si no vendió y vacía en el primer mes.
+    """
+    n = len(g)
+    if n == 0:
+        return g.assign(Ranking=[], Participacion_pct=[], Acumulado_pct=[], Clase=[])
+    codigos = _codigos_combinados([g[c] for c in grupos], n)
+    productos = pd.factorize(g["IdArticulo"], sort=True)[0]
+    totales = g["Total"].to_numpy(dtype=float)
+    # Equivale a np.lexsort((productos, -totales, codigos)) pero con argsorts estables, más rápido
+    orden = np.argsort(productos, kind="stable")
+    orden = orden[np.argsort(-totales[orden], kind="stable")]
+    orden = orden[np.argsort(codigos[orden], kind="stable")]
+    g = g.iloc[orden].reset_index(drop=True)
+    codigos, productos, valores = codigos[orden], productos[orden], totales[orden]
+
+    inicio = np.r_[0, np.flatnonzero(np.diff(codigos)) + 1]
+    tamanos = np.diff(np.r_[inicio, n])
+    acumulado = np.cumsum(valores)
+    acumulado -= np.repeat(acumulado[inicio] - valores[inicio], tamanos)
+    total_grupo = np.repeat(acumulado[np.r_[inicio[1:] - 1, n - 1]], tamanos)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        previo_pct = (acumulado - valores) / total_grupo * 100
+        g["Participacion_pct"] = np.round(valores / total_grupo * 100, 2)
+        g["Acumulado_pct"] = np.round(acumulado / total_grupo * 100, 2)
+    g.insert(len(grupos), "Ranking", np.arange(n) - np.repeat(inicio, tamanos) + 1)
+    # 0 = A, 1 = B, 2 = C (sin total de grupo, C)
+    clase = np.where(np.isnan(previo_pct), 2, (previo_pct >= corte_a).astype(int) + (previo_pct >= corte_b))
+    clases = np.array(["A", "B", "C"], dtype=object)
+    g["Clase"] = clases[clase]
+
+    if "Mes" in grupos:
+        # Ordenado por (grupo sin mes, producto, mes): la fila anterior es el mes previo si es contigua
+        serie = _codigos_combinados([g[c] for c in grupos if c != "Mes"] + [productos], n)
+        meses = g["Mes"].to_numpy()
+        desde = meses.min()
+        o = np.argsort(serie * (meses.max() - desde + 1) + (meses - desde))
+        contiguo = np.r_[False, (serie[o][1:] == serie[o][:-1]) & (meses[o][1:] == meses[o][:-1] + 1)]
+        anterior = np.full(n, "-", dtype=object)
+        anterior[contiguo] = clases[clase[o][np.flatnonzero(contiguo) - 1]]
+        clase_anterior = np.empty(n, dtype=object)
+        clase_anterior[o] = anterior
+        clase_anterior[meses == meses.min()] = None
+        g["ClaseAnterior"] = clase_anterior
+    return g
+
+
+def _agregado_abc(df, schema, por=None, periodo=None):
+    """Total por (``por``, mes, producto) en un solo groupby; devuelve (tabla, grupos) o un mensaje."""
+    if not schema["producto"] or not schema["total"]:
+        return "Requiere IdArticulo y total."
+    if por and not schema.get(por):
+        return f"Requiere columna de {por} para agrupar."
+    d = df
+    meses = None
+    if periodo == "mes":
+        if not schema["fecha"]:
+            return "Requiere fecha para clasificar por mes."
+        fechas = pd.to_datetime(df[schema["fecha"]], errors="coerce").to_numpy()
+        validas = ~np.isnat(fechas)
+        d = df[validas]
+        meses = fechas[validas].astype("datetime64[M]").astype(np.int64)
+
+    claves = {}
+    if por:
+        claves[por.capitalize()] = d[schema[por]].to_numpy()
+    if meses is not None:
+        claves["Mes"] = meses
+    claves["IdArticulo"] = d[schema["producto"]].to_numpy()
+    g = (
+        pd.DataFrame({**claves, "Total": d[schema["total"]].to_numpy()})
+        .groupby(list(claves), observed=True, sort=False)["Total"]
+        .sum()
+        .reset_index()
+    )
+    return g, list(claves)[:-1]
+
+
+def accion_abc(df, schema, por=None, periodo=None, corte_a=80.0, corte_b=95.0):
+    """Clasificación ABC (Pareto) de productos por participación acumulada.
+
+    Se clasifica dentro de cada sucursal/departamento/vendedor (``por``) y/o
+    mes (``periodo="mes"``); ver ``clasificar_abc``.
+    """
+    agregado = _agregado_abc(df, schema, por, periodo)
+    if isinstance(agregado, str):
+        return agregado
+    tabla = clasificar_abc(*agregado, corte_a=corte_a, corte_b=corte_b)
+    if "Mes" in tabla.columns and len(tabla):
+        tabla["Mes"] = _meses_a_texto(tabla["Mes"].to_numpy())
+    return tabla
+
+
+def transiciones_abc(tabla, grupos):
+    """Matriz de pasajes entre clases de meses consecutivos a partir de ``clasificar_abc``.
+
+    Una fila por (grupo, Mes, clase de origen) y una columna por clase de
+    destino. "-" como origen son productos que no vendieron el mes anterior
+    y como destino los que dejaron de vender.
+    """
+    claves = [c for c in grupos if c != "Mes"]
+    altas = tabla[tabla["ClaseAnterior"].notna()][claves + ["Mes", "ClaseAnterior", "Clase"]]
+    # Bajas: vendieron un mes (que no es el último) y no aparecen en el siguiente
+    siguiente = tabla[claves + ["IdArticulo", "Mes", "Clase"]].assign(Mes=tabla["Mes"] + 1)
+    siguiente = siguiente[siguiente["Mes"] <= tabla["Mes"].max()]
+    cruce = siguiente.merge(tabla[claves + ["IdArticulo", "Mes"]], on=claves + ["IdArticulo", "Mes"],
+                            how="left", indicator=True)
+    bajas = cruce[cruce["_merge"] == "left_only"]
+    bajas = pd.DataFrame({**{c: bajas[c] for c in claves + ["Mes"]},
+                          "ClaseAnterior": bajas["Clase"], "Clase": "-"})
+
+    pasajes = pd.concat([altas, bajas], ignore_index=True)
+    matriz = (
+        pasajes.groupby(claves + ["Mes", "ClaseAnterior", "Clase"], observed=True)
+        .size()
+        .unstack("Clase", fill_value=0)
+        .reindex(columns=["A", "B", "C", "-"], fill_value=0)
+        .reset_index()
+        .rename(columns={"ClaseAnterior": "De"})
+    )
+    matriz.columns.name = None
+    if len(matriz):
+        matriz["Mes"] = _meses_a_texto(matriz["Mes"].to_numpy())
+    return matriz
+
+
+def accion_transiciones_abc(df, schema, por=None, corte_a=80.0, corte_b=95.0):
+    agregado = _agregado_abc(df, schema, por, "mes")
+    if isinstance(agregado, str):
+        return agregado
+    g, grupos = agregado
+    return transiciones_abc(clasificar_abc(g, grupos, corte_a, corte_b), grupos)
+
+
+def accion_maestro_productos(df, schema):
+    cols = []
+    for key in ["producto", "descripcion", "departamento"]:
+        col = schema.get(key)
+        if col:
+            cols.append(col)
+    if not cols:
+        return "No hay columnas de producto / descripción / departamento."
+
+    maestro = df[cols].drop_duplicates().reset_index(drop=True)
+    return maestro
+
+
+def accion_ventas_duplicadas(df, schema):
+    subset = []
+    for key in ["ticket", "fecha", "cliente", "total"]:
+        col = schema.get(key)
+        if col:
+            subset.append(col)
+    if len(subset) < 2:
+        return "Se necesitan al menos dos columnas (ej. ticket y fecha) para detectar duplicados."
+
+    d = df.copy()
+    if schema.get("fecha"):
+        d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
+
+    duplicados_mask = d.duplicated(subset=subset, keep=False)
+    dup = d[duplicados_mask].sort_values(subset)
+    return dup
+
+
+def _componentes_conexas(n, origen, destino):
+    """Etiqueta cada nodo 0..n-1 con el menor índice de su componente conexa."""
+    etiquetas = np.arange(n)
+    if len(origen) == 0:
+        return etiquetas
+    while True:
+        minimo = np.minimum(etiquetas[origen], etiquetas[destino])
+        nuevas = etiquetas.copy()
+        np.minimum.at(nuevas, origen, minimo)
+        np.minimum.at(nuevas, destino, minimo)
+        nuevas = nuevas[nuevas]  # salto de punteros: acorta cadenas largas
+        if np.array_equal(nuevas, etiquetas):
+            return etiquetas
+        etiquetas = nuevas
+
+
+def accion_ventas_casi_duplicadas(df, schema, ventana_segundos=300, tolerancia_abs=0.0,
+                                  tolerancia_rel=0.01, misma="cliente"):
+    """Agrupa ventas casi duplicadas: misma clave, fecha y total cercanos.
+
+    Compara líneas de venta. Ordena por clave (cliente y/o sucursal) y fecha y
+    compara cada fila con las siguientes mientras caigan dentro de la ventana
+    de tiempo (sort-and-sweep), en lugar de comparar todos los pares. Sin
+    fecha mapeada se ordena por total y el barrido avanza mientras el total
+    esté dentro de la tolerancia.
+
+    Con producto mapeado solo se comparan líneas del mismo producto (el
+    producto es parte de la clave de bloqueo). Con ticket mapeado, una línea
+    repetida dentro del mismo ticket (doble carga del comprobante) también es
+    un duplicado y se marca en ``MismoTicket``; sin producto, en cambio, no se
+    comparan líneas del mismo ticket, porque dos artículos distintos del mismo
+    comprobante pueden tener el mismo total.
+    """
+    if not schema["total"]:
+        return "Requiere columna total."
+
+    claves_schema = ["cliente", "sucursal"] if misma == "cliente y sucursal" else [misma]
+    claves = [schema.get(k) for k in claves_schema]
+    if not all(claves):
+        return f"Requiere columna de {misma}."
+
+    bloque = claves + [schema["producto"]] if schema.get("producto") else claves
+    codigo = df.groupby(bloque, sort=False, observed=True).ngroup().to_numpy()
+    valor = pd.to_numeric(df[schema["total"]], errors="coerce").to_numpy(dtype=float)
+    validas = (codigo >= 0) & ~np.isnan(valor)
+
+    if schema.get("fecha"):
+        fechas = pd.to_datetime(df[schema["fecha"]], errors="coerce")
+        validas &= fechas.notna().to_numpy()
+        tiempo = fechas.to_numpy(dtype="datetime64[ns]").astype("int64")
+        ventana = int(ventana_segundos * 1_000_000_000)
+    else:
+        tiempo = np.zeros(len(df), dtype="int64")
+        ventana = 0
+
+    posiciones = np.flatnonzero(validas)
+    orden = posiciones[np.lexsort((valor[posiciones], tiempo[posiciones], codigo[posiciones]))]
+    c, t, v = codigo[orden], tiempo[orden], valor[orden]
+    n = len(orden)
+    ticket = df[schema["ticket"]].factorize()[0][orden] if schema.get("ticket") else None
+    excluir_mismo_ticket = ticket is not None and not schema.get("producto")
+
+    # Barrido: en la vuelta k, cada fila activa a se compara con a + k. Una
+    # fila deja de estar activa cuando a + k sale de su clave o de la ventana
+    # (de tiempo, o de importe sin fecha), porque las siguientes están más lejos.
+    origen, destino, scores = [], [], []
+    activas = np.arange(n)
+    k = 0
+    while True:
+        k += 1
+        a = activas[activas + k < n]
+        if not len(a):
+            break
+        b = a + k
+        dt = t[b] - t[a]
+        dv = np.abs(v[b] - v[a])
+        tol = np.maximum(tolerancia_abs, tolerancia_rel * np.maximum(np.abs(v[a]), np.abs(v[b])))
+        cerca = (c[a] == c[b]) & (dt <= ventana)
+        if not schema.get("fecha"):
+            cerca &= dv <= tol
+        activas = a[cerca]
+        par = cerca & (dv <= tol)
+        if excluir_mismo_ticket:
+            par &= ticket[a] != ticket[b]
+        frac_t = np.divide(dt, ventana, out=np.zeros(len(a)), where=ventana > 0)
+        frac_v = np.divide(dv, tol, out=np.zeros(len(a)), where=tol > 0)
+        origen.append(a[par])
+        destino.append(b[par])
+        scores.append(1 - 0.5 * frac_t[par] - 0.5 * frac_v[par])
+
+    columnas = list(df.columns) + ["GrupoDuplicado", "ScoreGrupo", "ScoreFila"]
+    if ticket is not None:
+        columnas.append("MismoTicket")
+    if not any(len(o) for o in origen):
+        return pd.DataFrame(columns=columnas)
+
+    origen = np.concatenate(origen)
+    destino = np.concatenate(destino)
+    scores = np.concatenate(scores)
+
+    grupo = _componentes_conexas(n, origen, destino)
+    score_fila = np.full(n, -np.inf)
+    np.maximum.at(score_fila, origen, scores)
+    np.maximum.at(score_fila, destino, scores)
+    score_grupo = pd.Series(scores).groupby(grupo[origen]).mean()
+
+    en_grupo = np.isfinite(score_fila)
+    res = df.iloc[orden[en_grupo]].copy()
+    res["_grupo"] = grupo[en_grupo]
+    res["ScoreGrupo"] = res["_grupo"].map(score_grupo).round(3)
+    res["ScoreFila"] = score_fila[en_grupo].round(3)
+    ranking = score_grupo.rank(ascending=False, method="first").astype(int)
+    res["GrupoDuplicado"] = res["_grupo"].map(ranking)
+    if ticket is not None:
+        # La fila comparte ticket con otra del mismo grupo: el comprobante se cargó más de una vez
+        res["MismoTicket"] = (
+            pd.DataFrame({"g": grupo[en_grupo], "t": ticket[en_grupo]}).duplicated(keep=False).to_numpy()
+        )
+    res = res.drop(columns="_grupo").sort_values("GrupoDuplicado", kind="mergesort")
+    return res[columnas]
+
+
+def _pares_por_ticket(ticket, producto, max_pares_lote=5_000_000):
+    """Cuenta co-ocurrencias de pares (a < b) sobre la incidencia ticket x producto.
+
+    ``ticket`` y ``producto`` son códigos enteros ordenados por ticket (formato
+    CSR, sin repetidos por ticket). Los pares se generan por lotes de tickets
+    para acotar la memoria y nunca se arma una matriz densa.
+    Devuelve una Series indexada por (producto_a, producto_b).
+    """
+    n_productos = int(producto.max()) + 1 if len(producto) else 0
+    tamanos = np.bincount(ticket)
+    fin = np.cumsum(tamanos)
+    pares_ticket = tamanos * (tamanos - 1) // 2
+    cortes = np.searchsorted(np.cumsum(pares_ticket),
+                             np.arange(max_pares_lote, pares_ticket.sum() + max_pares_lote, max_pares_lote))
+    cortes = np.unique(np.concatenate([[0], np.minimum(cortes + 1, len(tamanos))]))
+
+    parciales = []
+    for t0, t1 in zip(cortes[:-1], cortes[1:]):
+        desde = fin[t0] - tamanos[t0]
+        hasta = fin[t1 - 1]
+        if hasta - desde < 2:
+            continue
+        posiciones = np.arange(desde, hasta)
+        # cuántos productos quedan a la derecha de cada uno dentro de su ticket
+        restantes = np.repeat(fin[t0:t1], tamanos[t0:t1]) - posiciones - 1
+        a = np.repeat(posiciones, restantes)
+        salto = np.arange(len(a)) - np.repeat(np.cumsum(restantes) - restantes, restantes)
+        b = a + 1 + salto
+        claves, cuentas = np.unique(producto[a].astype(np.int64) * n_productos + producto[b],
+                                    return_counts=True)
+        parciales.append(pd.Series(cuentas, index=claves))
+
+    if not parciales:
+        return pd.Series(dtype="int64")
+    total = pd.concat(parciales).groupby(level=0).sum()
+    return total.set_axis(pd.MultiIndex.from_arrays(
+        [total.index.to_numpy() // n_productos, total.index.to_numpy() % n_productos]))
+
+
+def accion_canasta(df, schema, soporte_min=0.001):
+    """Pares de productos que se venden juntos: soporte, confianza y lift.
+
+    Se descartan primero los productos por debajo del soporte mínimo (ningún
+    par que los incluya puede superarlo) y luego los pares poco frecuentes.
+    """
+    if not schema["ticket"] or not schema["producto"]:
+        return "Requiere ticket e IdArticulo."
+
+    incidencia = df[[schema["ticket"], schema["producto"]]].dropna().drop_duplicates()
+    ticket, tickets = pd.factorize(incidencia[schema["ticket"]])
+    producto, productos = pd.factorize(incidencia[schema["producto"]])
+    n_tickets = len(tickets)
+    min_tickets = max(1, int(np.ceil(soporte_min * n_tickets)))
+
+    tickets_producto = np.bincount(producto, minlength=len(productos))
+    frecuente = tickets_producto[producto] >= min_tickets
+    ticket, producto = ticket[frecuente], producto[frecuente]
+    orden = np.lexsort((producto, ticket))
+
+    pares = _pares_por_ticket(ticket[orden], producto[orden])
+    pares = pares[pares >= min_tickets]
+    columnas = ["ProductoA", "ProductoB", "TicketsJuntos", "Soporte",
+                "Confianza_A_B", "Confianza_B_A", "Lift"]
+    if pares.empty:
+        return pd.DataFrame(columns=columnas)
+
+    a = pares.index.get_level_values(0).to_numpy()
+    b = pares.index.get_level_values(1).to_numpy()
+    juntos = pares.to_numpy()
+    tabla = pd.DataFrame({
+        "ProductoA": productos[a],
+        "ProductoB": productos[b],
+        "TicketsJuntos": juntos,
+        "Soporte": juntos / n_tickets,
+        "Confianza_A_B": juntos / tickets_producto[a],
+        "Confianza_B_A": juntos / tickets_producto[b],
+        "Lift": juntos * n_tickets / (tickets_producto[a] * tickets_producto[b]),
+    })
+    if schema.get("descripcion"):
+        descripciones = df.groupby(schema["producto"], observed=True)[schema["descripcion"]].first()
+        tabla.insert(1, "DescripcionA", tabla["ProductoA"].map(descripciones))
+        tabla.insert(3, "DescripcionB", tabla["ProductoB"].map(descripciones))
+
+    return tabla.sort_values(["Lift", "TicketsJuntos"], ascending=False, kind="mergesort").reset_index(drop=True)
+
+
+def accion_normalizar_fechas(df, schema):
+    if not schema["fecha"]:
+        return "Requiere columna de fecha."
+    d = df.copy()
+    d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
+    d["Fecha_normalizada"] = d[schema["fecha"]].dt.date
+    d["Mes"] = d[schema["fecha"]].dt.to_period("M").astype(str)
+    d["Anio"] = d[schema["fecha"]].dt.year
+    return d
+
+
+def accion_tabla_mensual(df, schema):
+    if not schema["fecha"] or not schema["total"]:
+        return "Requiere fecha y total."
+    d = df.copy()
+    d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
+    d = d.dropna(subset=[schema["fecha"]])
+    d["Anio"] = d[schema["fecha"]].dt.year
+    d["Mes"] = d[schema["fecha"]].dt.month
+
+    tabla = (
+        d.groupby(["Anio", "Mes"], as_index=False)[schema["total"]]
+        .sum()
+        .rename(columns={schema["total"]: "TotalFacturado"})
+        .sort_values(["Anio", "Mes"])
+    )
+    return tabla
+
+
+def accion_comparacion_mensual(df, schema):
+    base = accion_tabla_mensual(df, schema)
+    if isinstance(base, str):
+        return base
+    return comparar_tabla_mensual(base)
+
+
+def comparar_tabla_mensual(base):
+    """Agrega las comparaciones vs mes anterior y año anterior a una tabla Anio/Mes/TotalFacturado."""
+    if base.empty:
+        return base
+
+    # Reindexar sobre el calendario completo: los meses sin ventas quedan en 0
+    # y shift(1) / shift(12) caen siempre en el mes correcto.
+    periodos = pd.to_datetime(base[["Anio", "Mes"]].rename(columns={"Anio": "year", "Mes": "month"})
+                              .assign(day=1)).dt.to_period("M")
+    serie = base["TotalFacturado"].set_axis(periodos)
+    calendario = pd.period_range(periodos.min(), periodos.max(), freq="M")
+    serie = serie.reindex(calendario, fill_value=0)
+
+    base = pd.DataFrame({
+        "Anio": calendario.year,
+        "Mes": calendario.month,
+        "TotalFacturado": serie.to_numpy(),
+        "Periodo": calendario.strftime("%Y-%m"),
+    })
+    base["TotalMesAnterior"] = base["TotalFacturado"].shift(1)
+    base["Delta_vs_MesAnterior"] = (base["TotalFacturado"] - base["TotalMesAnterior"]).fillna(0)
+    base["TotalMismoMes_AñoAnterior"] = base["TotalFacturado"].shift(12)
+    base["Delta_vs_AñoAnterior"] = (base["TotalFacturado"] - base["TotalMismoMes_AñoAnterior"]).fillna(0)
+
+    return base
+
+
+# frecuencia -> (código de pandas, períodos que separan del año anterior)
+FRECUENCIAS_PERIODO = {
+    "dia": ("D", 364),  # mismo día de la semana del año anterior
+    "semana": ("W", 52),
+    "mes": ("M", 12),
+}
+
+NIVELES_PERIODO = {
+    "producto": "IdArticulo",
+    "departamento": "Departamento",
+    "sucursal": "Sucursal",
+    "vendedor": "Vendedor",
+}
+
+
+def _variacion_pct(actual, anterior):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(anterior != 0, (actual - anterior) / np.abs(anterior) * 100, np.nan)
+
+
+def accion_comparacion_periodos(df, schema, frecuencia="mes", nivel=None, ventana=3):
+    """Variaciones período anterior, año anterior y ventana móvil por grupo.
+
+    Agrupa una sola vez por (nivel, período) y trabaja en formato largo: cada
+    grupo solo tiene sus períodos con ventas, ordenados por la clave
+    (grupo, período). Los valores de un período desplazado se buscan con
+    ``searchsorted`` sobre esa clave (los períodos sin ventas cuentan como 0)
+    y las ventanas móviles salen de la suma acumulada de cada grupo, sin armar
+    una matriz grupos x períodos.
+    """
+    if not schema["fecha"] or not schema["total"]:
+        return "Requiere fecha y total."
+    if frecuencia not in FRECUENCIAS_PERIODO:
+        return f"Frecuencia no soportada: {frecuencia}."
+    if nivel and not schema.get(nivel):
+        return f"Requiere columna de {nivel}."
+
+    codigo, lag_anual = FRECUENCIAS_PERIODO[frecuencia]
+    fechas = pd.to_datetime(df[schema["fecha"]], errors="coerce")
+    validas = fechas.notna()
+    if not validas.any():
+        return pd.DataFrame(columns=["Periodo", "Total"])
+
+    periodo = fechas[validas].dt.to_period(codigo).rename("Periodo")
+    claves = [df.loc[validas, schema[nivel]], periodo] if nivel else [periodo]
+    serie = df.loc[validas, schema["total"]].groupby(claves, observed=True).sum()
+
+    calendario = pd.period_range(periodo.min(), periodo.max(), freq=codigo)
+    n_periodos = len(calendario)
+    periodos = serie.index.get_level_values(-1)
+    posicion = (periodos.asi8 - calendario[0].ordinal).astype("int64")
+    if nivel:
+        grupo, grupos = pd.factorize(serie.index.get_level_values(0))
+    else:
+        grupo, grupos = np.zeros(len(serie), dtype="int64"), [None]
+    clave = grupo * n_periodos + posicion  # creciente: la serie viene ordenada por (grupo, período)
+    total = serie.to_numpy(dtype=float)
+    acumulado = pd.Series(total).groupby(grupo).cumsum().to_numpy()
+
+    # Filas de salida: sin nivel, todo el calendario; con nivel, los períodos con
+    # ventas y los que las tienen en el período anterior o en el año anterior.
+    if nivel:
+        filas = np.concatenate([clave, clave + 1, clave + lag_anual])
+        filas = filas[np.concatenate([posicion, posicion + 1, posicion + lag_anual]) < n_periodos]
+        filas = np.unique(filas)
+    else:
+        filas = np.arange(n_periodos, dtype="int64")
+    g, q = np.divmod(filas, n_periodos)
+
+    def valor(k):
+        """Total del período q - k de cada fila (0 si no vendió, NaN antes del calendario)."""
+        buscada = filas - k
+        idx = np.minimum(np.searchsorted(clave, buscada), len(clave) - 1)
+        salida = np.where(clave[idx] == buscada, total[idx], 0.0)
+        return np.where(q - k >= 0, salida, np.nan)
+
+    def acumulado_hasta(k):
+        """Suma acumulada del grupo hasta el período q - k (0 antes del calendario)."""
+        idx = np.searchsorted(clave, filas - k, side="right") - 1
+        dentro = (idx >= 0) & (q - k >= 0)
+        idx = np.maximum(idx, 0)
+        return np.where(dentro & (grupo[idx] == g), acumulado[idx], 0.0)
+
+    def movil(k):
+        """Suma de la ventana que termina en q - k (NaN si la ventana está incompleta)."""
+        suma = acumulado_hasta(k) - acumulado_hasta(k + ventana)
+        return np.where(q - k >= ventana - 1, suma, np.nan)
+
+    actual = valor(0)
+    anterior = valor(1)
+    anio_anterior = valor(lag_anual)
+    movil_actual = movil(0)
+    movil_anterior = movil(ventana)
+
+    tabla = pd.DataFrame({
+        "Periodo": np.asarray(calendario.astype(str))[q],
+        "Total": actual,
+        "Total_PeriodoAnterior": anterior,
+        "Delta_PeriodoAnterior": actual - anterior,
+        "Var%_PeriodoAnterior": _variacion_pct(actual, anterior),
+        "Total_AñoAnterior": anio_anterior,
+        "Delta_AñoAnterior": actual - anio_anterior,
+        "Var%_AñoAnterior": _variacion_pct(actual, anio_anterior),
+        f"Movil_{ventana}": movil_actual,
+        f"Movil_{ventana}_Anterior": movil_anterior,
+        f"Delta_Movil_{ventana}": movil_actual - movil_anterior,
+        f"Var%_Movil_{ventana}": _variacion_pct(movil_actual, movil_anterior),
+    })
+    if nivel:
+        tabla.insert(0, NIVELES_PERIODO[nivel], np.asarray(grupos)[g])
+        # Se descartan filas sin actividad en el período, el anterior ni el año anterior
+        activas = (
+            (tabla["Total"] != 0)
+            | (tabla["Total_PeriodoAnterior"].fillna(0) != 0)
+            | (tabla["Total_AñoAnterior"].fillna(0) != 0)
+        )
+        tabla = tabla[activas].reset_index(drop=True)
+    return tabla
+
+
+VENTANAS_DEMANDA = (28, 91)  # 4 semanas y ~3 meses, en días
+
+
+def accion_demanda_movil(df, schema, ventanas=VENTANAS_DEMANDA, diario=False):
+    """Unidades, promedio diario y días con venta en ventanas móviles por producto y sucursal.
+
+    Agrupa una sola vez por (producto, sucursal, día) y resuelve todas las
+    ventanas de todos los grupos juntas con sumas acumuladas: la suma de la
+    ventana que termina el día d es acumulado(d) - acumulado(d - w), buscando
+    cada día con ``searchsorted`` sobre la clave (grupo, día). Los días sin
+    ventas cuentan como 0 sin materializarlos en el agregado. Las ventanas
+    que empiezan antes del primer día de los datos quedan en NaN.
+
+    Con ``diario=False`` devuelve una fila por grupo al último día de los
+    datos (lo que se usa para reponer); con ``diario=True``, una fila por
+    grupo y día desde su primera venta hasta el último día.
+    """
+    if not schema["producto"] or not schema["fecha"] or not schema["cantidad"]:
+        return "Requiere IdArticulo, fecha y cantidad."
+    ventanas = sorted({int(w) for w in ventanas})
+    if not ventanas or ventanas[0] < 1:
+        return "Las ventanas deben ser de al menos 1 día."
+
+    fechas = pd.to_datetime(df[schema["fecha"]], errors="coerce")
+    validas = fechas.notna()
+    columnas = [schema["producto"]] + ([schema["sucursal"]] if schema["sucursal"] else [])
+    nombres = ["IdArticulo"] + (["Sucursal"] if schema["sucursal"] else [])
+    if not validas.any():
+        return pd.DataFrame(columns=nombres + ["Dia", "Unidades"])
+
+    d = df.loc[validas, columnas].set_axis(nombres, axis=1)
+    d["_dia"] = fechas[validas].to_numpy().astype("datetime64[D]").astype(np.int64)
+    d["Unidades"] = pd.to_numeric(df.loc[validas, schema["cantidad"]], errors="coerce")
+    # Ordenado por (grupo, día): cada grupo queda contiguo y con días crecientes
+    g = d.groupby(nombres + ["_dia"], observed=True, sort=True)["Unidades"].sum().reset_index()
+
+    dias = g["_dia"].to_numpy()
+    codigo = _codigos_combinados([g[c] for c in nombres], len(g))
+    nuevo = np.ones(len(g), dtype=bool)
+    nuevo[1:] = codigo[1:] != codigo[:-1]
+    grupo = np.cumsum(nuevo) - 1
+    inicio_grupo = np.flatnonzero(nuevo)
+
+    primer_dia, ultimo_dia = dias.min(), dias.max()
+    w_max = ventanas[-1]
+    paso = ultimo_dia - primer_dia + w_max + 2
+    clave = grupo * paso + (dias - primer_dia + w_max + 1)
+    unidades = g["Unidades"].to_numpy(dtype=float)
+    acum_unidades = np.concatenate([[0.0], np.cumsum(unidades)])
+    acum_dias = np.concatenate([[0], np.cumsum(unidades > 0)])
+
+    n_grupos = len(inicio_grupo)
+    if diario:
+        largo = ultimo_dia - dias[inicio_grupo] + 1
+        grupo_q = np.repeat(np.arange(n_grupos), largo)
+        inicio_q = np.repeat(np.cumsum(largo) - largo, largo)
+        dia_q = np.repeat(dias[inicio_grupo], largo) + np.arange(largo.sum()) - inicio_q
+    else:
+        grupo_q = np.arange(n_grupos)
+        dia_q = np.full(n_grupos, ultimo_dia)
+    base_q = grupo_q * paso + (dia_q - primer_dia + w_max + 1)
+
+    def hasta(desplazamiento):
+        """Posición en los acumulados del último día <= dia_q - desplazamiento de cada grupo."""
+        return np.searchsorted(clave, base_q - desplazamiento, side="right")
+
+    fin = hasta(0)
+    tabla = g[nombres].iloc[inicio_grupo[grupo_q]].reset_index(drop=True)
+    tabla["Dia"] = dia_q.astype("datetime64[D]")
+    tabla["Unidades"] = acum_unidades[fin] - acum_unidades[hasta(1)]
+    for w in ventanas:
+        ini = hasta(w)
+        incompleta = dia_q - w + 1 < primer_dia
+        suma = np.where(incompleta, np.nan, acum_unidades[fin] - acum_unidades[ini])
+        tabla[f"Unidades_{w}d"] = suma
+        tabla[f"Promedio_{w}d"] = suma / w
+        tabla[f"DiasConVenta_{w}d"] = np.where(incompleta, np.nan, acum_dias[fin] - acum_dias[ini])
+    return tabla
+
+
+def accion_top_bottom(df, schema, nivel="producto", n=10, por=None):
+    """Top y bottom N por total facturado, global o dentro de cada grupo.
+
+    ``por`` puede ser None, "sucursal", "departamento", "vendedor" o "mes"
+    (distinto de ``nivel``). La selección la hace ``seleccionar_top_bottom``;
+    los empates se resuelven por la clave del nivel, en orden ascendente, así
+    que el resultado es determinístico.
+    """
+    if not schema["total"]:
+        return "Requiere total."
+    if por and por == nivel:
+        return f"No se puede agrupar el ranking de {nivel} por {por}."
+
+    d = df
+    if nivel == "dia" or por == "mes":
+        if not schema["fecha"]:
+            return "Faltan columnas para este análisis."
+        d = df.copy()
+        d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
+        d = d.dropna(subset=[schema["fecha"]])
+
+    if nivel == "producto" and schema["producto"]:
+        grupo, nombre = schema["producto"], "IdArticulo"
+    elif nivel == "dia":
+        d["Dia"] = d[schema["fecha"]].dt.date
+        grupo, nombre = "Dia", "Dia"
+    elif nivel == "vendedor" and schema["vendedor"]:
+        grupo, nombre = schema["vendedor"], "Vendedor"
+    else:
+        return "Faltan columnas para este análisis."
+
+    claves, renombres = [grupo], {grupo: nombre}
+    nombre_por = None
+    if por == "mes":
+        d["Mes"] = d[schema["fecha"]].dt.to_period("M").astype(str)
+        claves, nombre_por = ["Mes", grupo], "Mes"
+    elif por:
+        if not schema.get(por):
+            return f"Requiere columna de {por} para agrupar."
+        nombre_por = por.capitalize()
+        claves = [schema[por], grupo]
+        renombres[schema[por]] = nombre_por
+
+    # Agrupado ordenado por clave: keep="first" desempata por la menor clave
+    g = (
+        d.groupby(claves, observed=True)[schema["total"]]
+        .sum()
+        .reset_index(name="Total")
+        .rename(columns=renombres)
+    )
+    return seleccionar_top_bottom(g, nombre, nombre_por, n)
+
+
+def seleccionar_top_bottom(g, nombre, nombre_por=None, n=10):
+    """Top y bottom N de una tabla agregada (ordenada por clave) con columna "Total".
+
+    Sin grupo usa nlargest/nsmallest. Por grupo ordena una sola vez por
+    (grupo, Total), estable, así que a igual total queda primero la menor
+    clave; el bottom son las primeras n filas de cada grupo y el top sale de
+    la posición de cada fila contando desde el final de su grupo (las de
+    mayor total y, entre empatadas, las de menor clave).
+    """
+    if nombre_por is None:
+        top = g.nlargest(n, "Total", keep="first")
+        bottom = g.nsmallest(n, "Total", keep="first")
+        # Solo se ordenan las filas seleccionadas (a lo sumo n)
+        top = top.sort_values(["Total", nombre], ascending=[False, True], kind="mergesort")
+        bottom = bottom.sort_values(["Total", nombre], kind="mergesort")
+        return top.reset_index(drop=True), bottom.reset_index(drop=True)
+
+    g = g[g["Total"].notna()]
+    grupo = pd.factorize(g[nombre_por], sort=True)[0]
+    total = g["Total"].to_numpy(dtype=float)
+    orden = np.lexsort((total, grupo))
+    grupo, total = grupo[orden], total[orden]
+
+    # Inicio y fin (exclusivo) del grupo y del tramo de totales empatados de cada fila
+    posicion = np.arange(len(orden))
+    nuevo_grupo = np.r_[True, grupo[1:] != grupo[:-1]]
+    nuevo_tramo = nuevo_grupo | np.r_[True, total[1:] != total[:-1]]
+    inicio_grupo = np.maximum.accumulate(np.where(nuevo_grupo, posicion, 0))
+    inicio_tramo = np.maximum.accumulate(np.where(nuevo_tramo, posicion, 0))
+    fin_grupo = np.minimum.accumulate(np.where(np.r_[nuevo_grupo[1:], True], posicion + 1, len(orden))[::-1])[::-1]
+    fin_tramo = np.minimum.accumulate(np.where(np.r_[nuevo_tramo[1:], True], posicion + 1, len(orden))[::-1])[::-1]
+
+    puesto_bottom = posicion - inicio_grupo
+    puesto_top = (fin_grupo - fin_tramo) + (posicion - inicio_tramo)
+    en_top = np.flatnonzero(puesto_top < n)
+    en_top = en_top[np.lexsort((puesto_top[en_top], grupo[en_top]))]
+    top = g.iloc[orden[en_top]]
+    bottom = g.iloc[orden[puesto_bottom < n]]
+    return top.reset_index(drop=True), bottom.reset_index(drop=True)
+
+
+def accion_sumatoria_ventas_mensuales_por_idarticulo(df, schema):
+    """Sumatoria de ventas mensuales por IdArticulo.
+    Mapea cada mes como columna, filtrando por la fecha del Excel fuente.
+    """
+    if not schema["producto"] or not schema["fecha"] or not schema["total"]:
+        return "Requiere IdArticulo, fecha y total."
+    
+    d = df.copy()
+    d[schema["fecha"]] = pd.to_datetime(d[schema["fecha"]], errors="coerce")
+    d = d.dropna(subset=[schema["fecha"]])
+    
+    # Crear columnas de año y mes
+    d["Anio"] = d[schema["fecha"]].dt.year
+    d["Mes"] = d[schema["fecha"]].dt.month
+    d["Mes_Nombre"] = d[schema["fecha"]].dt.strftime("%B").map({
+        "January": "ENERO", "February": "FEBRERO", "March": "MARZO",
+        "April": "ABRIL", "May": "MAYO", "June": "JUNIO",
+        "July": "JULIO", "August": "AGOSTO", "September": "SEPTIEMBRE",
+        "October": "OCTUBRE", "November": "NOVIEMBRE", "December": "DICIEMBRE"
+    })
+    
+    # Crear etiqueta Mes-Año
+    d["Mes_Anio"] = d["Mes_Nombre"] + " " + d["Anio"].astype(str)
+    
+    # Agrupar por IdArticulo y Mes_Anio, sumando el total
+    resultado = d.groupby([schema["producto"], "Mes_Anio"], as_index=False, observed=True)[schema["total"]].sum()
+    resultado = resultado.rename(columns={schema["producto"]: "IdArticulo", schema["total"]: "Venta"})
+    
+    # Pivotar para que cada mes sea una columna
+    tabla_pivot = resultado.pivot_table(
+        index="IdArticulo",
+        columns="Mes_Anio",
+        values="Venta",
+        aggfunc="sum",
+        fill_value=0,
+        observed=True,
+    ).reset_index()
+    
+    # Reordenar columnas de meses en orden cronológico
+    meses_orden = ["ENERO", "FEBRERO", "MARZO", "ABRIL", "MAYO", "JUNIO",
+                   "JULIO", "AGOSTO", "SEPTIEMBRE", "OCTUBRE", "NOVIEMBRE", "DICIEMBRE"]
+    
+    columnas_ordenadas = ["IdArticulo"]
+    for col in tabla_pivot.columns[1:]:
+        # Extraer mes y año de la columna
+        parts = col.split(" ")
+        if len(parts) == 2:
+            mes_nombre, anio = parts
+            if mes_nombre in meses_orden:
+                columnas_ordenadas.append(col)
+    
+    tabla_pivot = tabla_pivot[[c for c in columnas_ordenadas if c in tabla_pivot.columns]]
+    
+    # Agregar columna de TOTAL
+    tabla_pivot["TOTAL"] = tabla_pivot.iloc[:, 1:].sum(axis=1)
+    
+    return tabla_pivot
+
+# ===================== REGISTRO DE ACCIONES =====================
+
+# "aditiva": el resultado solo suma unidades/total por fecha, producto, departamento,
+# sucursal o vendedor, así que se puede calcular sobre el cubo diario (core_cubo.py)
+ACCIONES = {
+    "Totales facturados por mes": {
+        "fn": lambda df, schema, **kw: accion_totales_por_periodo(df, schema, "mes", **kw),
+        "tipo": "tabla",
+        "aditiva": True,
+        "descripcion": "Suma de ventas por mes calendario.",
+    },
+    "Totales facturados por día": {
+        "fn": lambda df, schema, **kw: accion_totales_por_periodo(df, schema, "dia", **kw),
+        "tipo": "tabla",
+        "aditiva": True,
+        "descripcion": "Suma de ventas por día.",
+    },
+    "Totales facturados en rango": {
+        "fn": lambda df, schema, **kw: accion_totales_por_periodo(df, schema, "rango", **kw),
+        "tipo": "tabla",
+        "aditiva": True,
+        "descripcion": "Total de ventas en el rango de fechas.",
+    },
+    "Unidades por producto": {
+        "fn": lambda df, schema, **kw: accion_unidades_totales(df, schema, "producto"),
+        "tipo": "tabla",
+        "aditiva": True,
+        "descripcion": "Unidades totales vendidas por IdArticulo.",
+    },
+    "Unidades por categoría": {
+        "fn": lambda df, schema, **kw: accion_unidades_totales(df, schema, "categoria"),
+        "tipo": "tabla",
+        "aditiva": True,
+        "descripcion": "Unidades totales por familia/departamento.",
+    },
+    "Unidades por vendedor": {
+        "fn": lambda df, schema, **kw: accion_unidades_totales(df, schema, "vendedor"),
+        "tipo": "tabla",
+        "aditiva": True,
+        "descripcion": "Unidades totales vendidas por vendedor.",
+    },
+    "Tickets por producto": {
+        "fn": lambda df, schema, **kw: accion_conteo_tickets(df, schema, "producto", **kw),
+        "tipo": "tabla",
+        "descripcion": "Número de tickets en los que aparece cada producto.",
+    },
+    "Tickets por día": {
+        "fn": lambda df, schema, **kw: accion_conteo_tickets(df, schema, "dia", **kw),
+        "tipo": "tabla",
+        "descripcion": "Número de tickets por día.",
+    },
+    "Tickets por vendedor": {
+        "fn": lambda df, schema, **kw: accion_conteo_tickets(df, schema, "vendedor", **kw),
+        "tipo": "tabla",
+        "descripcion": "Número de tickets atendidos por cada vendedor.",
+    },
+    "Productos únicos vendidos": {
+        "fn": lambda df, schema, **kw: accion_productos_unicos(df, schema),
+        "tipo": "mixto",
+        "descripcion": "Cantidad y lista de productos distintos vendidos en el periodo.",
+    },
+    "Productos únicos por mes": {
+        "fn": lambda df, schema, **kw: accion_productos_unicos_mes(df, schema, **kw),
+        "tipo": "tabla",
+        "descripcion": "Cantidad de productos distintos vendidos por mes.",
+    },
+    "Clientes únicos (KPI)": {
+        "fn": lambda df, schema, **kw: accion_clientes_unicos(df, schema, **kw),
+        "tipo": "kpi",
+        "descripcion": "Número de clientes distintos en el periodo.",
+    },
+    "Clientes únicos por mes": {
+        "fn": lambda df, schema, **kw: accion_clientes_unicos_mes(df, schema, **kw),
+        "tipo": "tabla",
+        "descripcion": "Cantidad de clientes distintos por mes.",
+    },
+    "Clientes recurrentes (>=2 compras)": {
+        "fn": lambda df, schema, **kw: accion_clientes_recurrentes(df, schema, min_veces=2),
+        "tipo": "tabla",
+        "descripcion": "Clientes con dos o más compras.",
+    },
+    "Segmentación RFM de clientes": {
+        "fn": lambda df, schema, **kw: accion_rfm(df, schema, **kw),
+        "tipo": "tabla",
+        "descripcion": "Recencia, frecuencia y monto por cliente con puntajes por quintil y segmento.",
+    },
+    "Retención por cohorte mensual": {
+        "fn": lambda df, schema, **kw: accion_cohortes(df, schema, **kw),
+        "tipo": "tabla",
+        "descripcion": "Porcentaje de clientes de cada cohorte (mes de primera compra) que vuelve a comprar k meses después.",
+    },
+    "Precio promedio por producto": {
+        "fn": lambda df, schema, **kw: accion_precio_promedio_producto(df, schema),
+        "tipo": "tabla",
+        "descripcion": "Precio promedio de venta por IdArticulo.",
+    },
+    "Ticket promedio por día": {
+        "fn": lambda df, schema, **kw: accion_ticket_promedio_por(df, schema, "dia"),
+        "tipo": "tabla",
+        "descripcion": "Ticket promedio por día.",
+    },
+    "Ticket promedio por vendedor": {
+        "fn": lambda df, schema, **kw: accion_ticket_promedio_por(df, schema, "vendedor"),
+        "tipo": "tabla",
+        "descripcion": "Ticket promedio por vendedor.",
+    },
+    "Participación por producto": {
+        "fn": lambda df, schema, **kw: accion_participacion(df, schema, "producto"),
+        "tipo": "tabla",
+        "aditiva": True,
+        "descripcion": "Participación porcentual de cada producto en el total facturado.",
+    },
+    "Participación por familia": {
+        "fn": lambda df, schema, **kw: accion_participacion(df, schema, "familia"),
+        "tipo": "tabla",
+        "aditiva": True,
+        "descripcion": "Participación de cada familia/departamento en el total.",
+    },
+    "Segmentación por sucursal": {
+        "fn": lambda df, schema, **kw: accion_segmentacion_sucursal(df, schema),
+        "tipo": "tabla",
+        "aditiva": True,
+        "descripcion": "Total facturado por sucursal o unidad de negocio.",
+    },
+    "Jerarquía de productos (drill-down)": {
+        "fn": lambda df, schema, **kw: accion_jerarquia(df, schema, **kw),
+        "tipo": "tabla",
+        "jerarquia": True,
+        "descripcion": "Subtotales Departamento → Familia → SubFamilia → IdArticulo con participación sobre el nivel padre.",
+    },
+    "Clasificación ABC (Pareto)": {
+        "fn": lambda df, schema, **kw: accion_abc(df, schema, **kw),
+        "tipo": "tabla",
+        "aditiva": True,
+        "descripcion": "Clase A/B/C de cada producto por participación acumulada, por sucursal y/o mes.",
+    },
+    "Transiciones de clase ABC": {
+        "fn": lambda df, schema, **kw: accion_transiciones_abc(df, schema, **kw),
+        "tipo": "tabla",
+        "aditiva": True,
+        "descripcion": "Cantidad de productos que pasan de una clase ABC a otra entre meses consecutivos.",
+    },
+    "Maestro de productos": {
+        "fn": lambda df, schema, **kw: accion_maestro_productos(df, schema),
+        "tipo": "tabla",
+        "descripcion": "Lista única de productos con sus datos maestros.",
+    },
+    "Perfil de calidad de datos": {
+        "fn": lambda df, schema, **kw: perfil_calidad(df, schema),
+        "tipo": "tabla",
+        "descripcion": "Nulos, valores no convertibles, rangos, distintos, valores frecuentes y anomalías "
+                       "por columna y por archivo de origen.",
+    },
+    "Ventas duplicadas": {
+        "fn": lambda df, schema, **kw: accion_ventas_duplicadas(df, schema),
+        "tipo": "tabla",
+        "descripcion": "Filas potencialmente duplicadas según ticket/fecha/cliente/total.",
+    },
+    "Ventas casi duplicadas": {
+        "fn": lambda df, schema, **kw: accion_ventas_casi_duplicadas(df, schema, **kw),
+        "tipo": "tabla",
+        "descripcion": "Grupos de ventas con fecha y total cercanos para el mismo cliente/sucursal, con score.",
+    },
+    "Productos que se venden juntos": {
+        "fn": lambda df, schema, **kw: accion_canasta(df, schema, **kw),
+        "tipo": "tabla",
+        "descripcion": "Pares de productos en el mismo ticket con soporte, confianza y lift.",
+    },
+    "Normalizar fechas": {
+        "fn": lambda df, schema, **kw: accion_normalizar_fechas(df, schema),
+        "tipo": "tabla",
+        "descripcion": "Añade columnas Fecha_normalizada, Mes y Anio.",
+    },
+    "Tabla mensual": {
+        "fn": lambda df, schema, **kw: accion_tabla_mensual(df, schema),
+        "tipo": "tabla",
+        "aditiva": True,
+        "descripcion": "Total facturado por año y mes.",
+    },
+    "Comparación vs mes anterior y año anterior": {
+        "fn": lambda df, schema, **kw: accion_comparacion_mensual(df, schema),
+        "tipo": "tabla",
+        "aditiva": True,
+        "descripcion": "Agrega columnas con diferencias vs mes anterior y mismo mes del año anterior.",
+    },
+    "Comparación de períodos (MoM/YoY/móvil)": {
+        "fn": lambda df, schema, **kw: accion_comparacion_periodos(df, schema, **kw),
+        "tipo": "tabla",
+        "aditiva": True,
+        "descripcion": "Variación vs período anterior, año anterior y ventana móvil, por grupo y sobre calendario completo.",
+    },
+    "Demanda móvil por producto y sucursal": {
+        "fn": lambda df, schema, **kw: accion_demanda_movil(df, schema, **kw),
+        "tipo": "tabla",
+        "aditiva": True,
+        "descripcion": "Unidades, promedio diario y días con venta en ventanas móviles (4 semanas y 3 meses) "
+                       "por IdArticulo y sucursal, con días sin ventas en 0.",
+    },
+    "Top/bottom productos": {
+        "fn": lambda df, schema, **kw: accion_top_bottom(df, schema, "producto", **kw),
+        "tipo": "mixto",
+        "aditiva": True,
+        "descripcion": "Top y bottom N productos por total facturado (global o por grupo).",
+    },
+    "Top/bottom días": {
+        "fn": lambda df, schema, **kw: accion_top_bottom(df, schema, "dia", **kw),
+        "tipo": "mixto",
+        "aditiva": True,
+        "descripcion": "Top y bottom N días por total facturado (global o por grupo).",
+    },
+    "Top/bottom vendedores": {
+        "fn": lambda df, schema, **kw: accion_top_bottom(df, schema, "vendedor", **kw),
+        "tipo": "mixto",
+        "aditiva": True,
+        "descripcion": "Top y bottom N vendedores por total facturado (global o por grupo).",
+    },
+        "Sumatoria Ventas mensuales por IdArticulo": {
+        "fn": lambda df, schema, **kw: accion_sumatoria_ventas_mensuales_por_idarticulo(df, schema),
+        "tipo": "tabla",
+        "aditiva": True,
+        "descripcion": "Ventas mensuales agregadas por IdArticulo, con cada mes como columna.",
+    },
+}
+
+
+def nombre_hoja_excel(nombre, usados=None):
+    """Nombre de hoja válido para Excel: sin []:*?/\\, hasta 31 caracteres y único en ``usados``."""
+    base = "".join("_" if c in '[]:*?/\\' else c for c in nombre)[:31]
+    hoja, i = base, 2
+    while usados is not None and hoja in usados:
+        sufijo = f"~{i}"
+        hoja, i = base[:31 - len(sufijo)] + sufijo, i + 1
+    if usados is not None:
+        usados.add(hoja)
+    return hoja
+
+
+def ejecutar_accion(nombre, df, schema, parametros=None, filtros=None):
+    """Corre la acción registrada ``nombre`` con sus parámetros.
+
+    ``parametros`` es {nombre_accion: kwargs}; si ``filtros`` trae rango de
+    fechas se pasa también a las acciones "en rango".
+    """
+    kwargs = dict((parametros or {}).get(nombre, {}))
+    filtros = filtros or {}
+    if "rango" in nombre and (filtros.get("fecha_inicio") or filtros.get("fecha_fin")):
+        kwargs["fecha_inicio"] = filtros.get("fecha_inicio")
+        kwargs["fecha_fin"] = filtros.get("fecha_fin")
+    return ACCIONES[nombre]["fn"](df, schema, **kwargs)
+
+
+def resultado_a_tablas(nombre, res):
+    """Convierte el resultado de una acción en {nombre_hoja: DataFrame} para exportar.
+
+    Los mensajes (str) no generan tablas; los KPI quedan como tabla de una fila.
+    """
+    if isinstance(res, str):
+        return {}
+    if isinstance(res, pd.DataFrame):
+        return {nombre: res}
+    if isinstance(res, tuple):
+        if not isinstance(res[0], pd.DataFrame):
+            # (valor, tabla) como en "Productos únicos" o (estimación, error) en KPIs aproximados
+            if isinstance(res[1], pd.DataFrame):
+                return {nombre: res[1]}
+            return {nombre: pd.DataFrame([{"Accion": nombre, "Valor": res[0], "ErrorRelativo": res[1]}])}
+        top, bottom = res
+        return {nombre + "_TOP": top, nombre + "_BOTTOM": bottom}
+    return {nombre: pd.DataFrame([{"Accion": nombre, "Valor": res}])}
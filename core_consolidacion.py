@@ -2,6 +2,7 @@
 import os
 import re
 
+import numpy as np
 import pandas as pd
 
 COLUMNA_CANTIDAD = "Cantidad"
@@ -70,6 +71,15 @@ def parsear_nombre_archivo(nombre: str):
     return mes_norm, anio, sucursal
 
 
+def redondear_mitad_lejos_de_cero(valores):
+    """Redondeo a entero con .5 lejos de cero (2.5 -> 3, -2.5 -> -3), vectorizado.
+
+    Da lo mismo que ``int(x + 0.5) if x >= 0 else int(x - 0.5)`` valor por valor.
+    """
+    x = np.asarray(valores, dtype=float)
+    return np.where(x >= 0, np.floor(x + 0.5), np.ceil(x - 0.5)).astype(np.int64)
+
+
 def consolidar_datos(archivos_info, prioridades_depto=None):
     """
     archivos_info: lista de diccionarios:
@@ -155,9 +165,7 @@ def consolidar_datos(archivos_info, prioridades_depto=None):
     )[COLUMNA_CANTIDAD].sum()
 
     # Redondeo
-    df[COLUMNA_CANTIDAD] = df[COLUMNA_CANTIDAD].apply(
-        lambda x: int(x + 0.5) if x >= 0 else int(x - 0.5)
-    )
+    df[COLUMNA_CANTIDAD] = redondear_mitad_lejos_de_cero(df[COLUMNA_CANTIDAD])
 
     return df
 
@@ -173,6 +181,63 @@ def _orden_mes_clave(mes_ano: str):
     return (anio, mes_num)
 
 
+def _columnas_mes_sucursal(meses_ordenados, sucursales):
+    """Para cada columna "MES_SUCURSAL" posible, (índice del mes, índice de la sucursal)."""
+    return {
+        f"{mes}_{suc}": (i, j)
+        for i, mes in enumerate(meses_ordenados)
+        for j, suc in enumerate(sucursales)
+    }
+
+
+def _totales_mes_sucursal(piv, idx_cols, meses_ordenados, sucursales, columnas_mes_suc):
+    """Pasa a entero las columnas "MES_SUCURSAL" y agrega totales por mes, por sucursal y consolidado.
+
+    Los totales suman grupos de columnas armados con ``columnas_mes_suc``
+    (columna -> índice de mes y de sucursal) en lugar de buscar columnas
+    por prefijo y sufijo. Devuelve (pivot, columnas por defecto en orden).
+    """
+    cols_valor = [c for c in piv.columns if c not in idx_cols]
+    cantidades = piv[cols_valor].to_numpy().astype(int)
+    posiciones = np.array([columnas_mes_suc[c] for c in cols_valor], dtype=np.int64).reshape(-1, 2)
+
+    # Una columna de salida por mes y por sucursal presentes, en el orden de meses_ordenados / sucursales
+    meses_presentes = np.unique(posiciones[:, 0])
+    sucursales_presentes = np.unique(posiciones[:, 1])
+    grupos = [np.flatnonzero(posiciones[:, 0] == i) for i in meses_presentes]
+    grupos += [np.flatnonzero(posiciones[:, 1] == j) for j in sucursales_presentes]
+    totales = np.empty((len(piv), len(grupos)), dtype=cantidades.dtype)
+    for k, cols in enumerate(grupos):
+        totales[:, k] = cantidades[:, cols].sum(axis=1)
+
+    nombres_mes = [meses_ordenados[i] for i in meses_presentes]
+    nombres_total = [f"TOTAL {sucursales[j].upper()}" for j in sucursales_presentes]
+    totales = pd.DataFrame(totales, columns=nombres_mes + nombres_total, index=piv.index)
+    if nombres_total:
+        totales["TOTAL CONSOLIDADO"] = totales[nombres_total].sum(axis=1)
+    valores = pd.DataFrame(cantidades, columns=cols_valor, index=piv.index)
+    piv = pd.concat([piv[idx_cols], valores, totales], axis=1)
+
+    cols_def = idx_cols + nombres_mes
+    if nombres_total:
+        cols_def += nombres_total + ["TOTAL CONSOLIDADO"]
+    return piv, cols_def
+
+
+def _pivot_mes_sucursal(df, idx_cols, meses_ordenados, sucursales, columnas_mes_suc):
+    """Pivot producto x "MES_SUCURSAL" con sus totales (ver ``_totales_mes_sucursal``)."""
+    tmp = df[idx_cols + [COLUMNA_CANTIDAD]].copy()
+    tmp["MES_SUC"] = df["MES"] + "_" + df["SUCURSAL"]
+    piv = tmp.pivot_table(
+        index=idx_cols,
+        columns="MES_SUC",
+        values=COLUMNA_CANTIDAD,
+        aggfunc="sum",
+        fill_value=0
+    ).reset_index()
+    return _totales_mes_sucursal(piv, idx_cols, meses_ordenados, sucursales, columnas_mes_suc)
+
+
 def generar_reportes(
     df,
     ruta_salida,
@@ -194,46 +259,13 @@ def generar_reportes(
     """
     meses_ordenados = sorted(df["MES"].unique(), key=_orden_mes_clave)
     sucursales = sorted(df["SUCURSAL"].dropna().unique())
+    # Grupos de columnas por mes y sucursal: se calculan una vez para todas las hojas
+    columnas_mes_suc = _columnas_mes_sucursal(meses_ordenados, sucursales)
+    idx_cols = ["IdArticulo", "Marca", "Descripcion", "Departamento", "SubFamilia", "Familia"]
 
     with pd.ExcelWriter(ruta_salida, engine="openpyxl") as writer:
-        # 1) Consolidado (siempre se genera)
-        df_temp = df.copy()
-        df_temp["MES_SUC"] = df_temp["MES"] + "_" + df_temp["SUCURSAL"]
-        idx_cols = ["IdArticulo", "Marca", "Descripcion", "Departamento", "SubFamilia", "Familia"]
-
-        df_pivot = df_temp.pivot_table(
-            index=idx_cols,
-            columns="MES_SUC",
-            values=COLUMNA_CANTIDAD,
-            aggfunc="sum",
-            fill_value=0
-        ).reset_index()
-
-        for col in df_pivot.columns:
-            if col not in idx_cols:
-                df_pivot[col] = df_pivot[col].astype(int)
-
-        # Construir columnas por defecto (antes de aplicar orden de usuario)
-        cols_def = idx_cols.copy()
-        for mes in meses_ordenados:
-            cols_mes = [c for c in df_pivot.columns if c.startswith(mes + "_")]
-            if not cols_mes:
-                continue
-            df_pivot[mes] = df_pivot[cols_mes].sum(axis=1).astype(int)
-            cols_def.append(mes)
-
-        total_cols = []
-        for suc in sucursales:
-            cols_suc = [c for c in df_pivot.columns if c.endswith("_" + suc)]
-            if not cols_suc:
-                continue
-            col_total = f"TOTAL {suc.upper()}"
-            df_pivot[col_total] = df_pivot[cols_suc].sum(axis=1).astype(int)
-            total_cols.append(col_total)
-
-        if total_cols:
-            df_pivot["TOTAL CONSOLIDADO"] = df_pivot[total_cols].sum(axis=1).astype(int)
-            cols_def.extend(total_cols + ["TOTAL CONSOLIDADO"])
+        # 1) Consolidado (siempre se genera); cols_def son las columnas por defecto
+        df_pivot, cols_def = _pivot_mes_sucursal(df, idx_cols, meses_ordenados, sucursales, columnas_mes_suc)
 
         # Aplicar orden personalizado de columnas si se pasó desde la GUI
         if columnas_consolidado:
@@ -314,41 +346,8 @@ def generar_reportes(
                 df_espec = df_espec[df_espec["Departamento"].str.upper().isin(CATEGORIAS_ESPECIALES)]
 
             if not df_espec.empty:
-                tmp = df_espec.copy()
-                tmp["MES_SUC"] = tmp["MES"] + "_" + tmp["SUCURSAL"]
-                idx_cols_espec = ["IdArticulo", "Marca", "Descripcion", "Departamento", "SubFamilia", "Familia"]
-                piv = tmp.pivot_table(
-                    index=idx_cols_espec,
-                    columns="MES_SUC",
-                    values=COLUMNA_CANTIDAD,
-                    aggfunc="sum",
-                    fill_value=0
-                ).reset_index()
-
-                for col in piv.columns:
-                    if col not in idx_cols_espec:
-                        piv[col] = piv[col].astype(int)
-
-                cols_espec_final = idx_cols_espec.copy()
-                for mes in meses_ordenados:
-                    cols_mes = [c for c in piv.columns if c.startswith(mes + "_")]
-                    if not cols_mes:
-                        continue
-                    piv[mes] = piv[cols_mes].sum(axis=1).astype(int)
-                    cols_espec_final.append(mes)
-
-                total_cols_espec = []
-                for suc in sucursales:
-                    cols_suc = [c for c in piv.columns if c.endswith("_" + suc)]
-                    if not cols_suc:
-                        continue
-                    col_total = f"TOTAL {suc.upper()}"
-                    piv[col_total] = piv[cols_suc].sum(axis=1).astype(int)
-                    total_cols_espec.append(col_total)
-
-                if total_cols_espec:
-                    piv["TOTAL CONSOLIDADO"] = piv[total_cols_espec].sum(axis=1).astype(int)
-                    cols_espec_final.extend(total_cols_espec + ["TOTAL CONSOLIDADO"])
-
+                piv, cols_espec_final = _pivot_mes_sucursal(
+                    df_espec, idx_cols, meses_ordenados, sucursales, columnas_mes_suc
+                )
                 piv_final = piv[cols_espec_final].sort_values("IdArticulo").reset_index(drop=True)
                 piv_final.to_excel(writer, sheet_name="Categorias Especiales", index=False)
@@ -0,0 +1,82 @@
+# core_cubo.py
+"""Cubo diario precalculado para las acciones aditivas.
+
+Se arma una vez por dataset agregando las líneas de venta a nivel (día,
+producto, departamento, sucursal, vendedor) con la suma de unidades, la suma
+del total y la cantidad de líneas. El cubo conserva los nombres de columna
+del esquema (la fecha queda truncada al día), así que las acciones marcadas
+``"aditiva": True`` en ``core_analisis.ACCIONES`` corren sin cambios sobre
+él y devuelven las mismas tablas que sobre las líneas, leyendo muchas menos
+filas. Las claves vacías (sin fecha, sucursal, ...) se conservan como un
+grupo más para que los totales no cambien.
+
+Los filtros globales usan solo columnas del cubo (fecha, sucursal,
+departamento y vendedor) y se aplican sobre él; un rango de fechas con hora
+no se puede resolver a nivel día (ver ``CuboDiario.admite``).
+"""
+import pandas as pd
+
+from core_analisis import ACCIONES, aplicar_filtros_globales, ejecutar_accion
+
+DIMENSIONES_CUBO = ("producto", "departamento", "sucursal", "vendedor")
+MEDIDAS_CUBO = ("cantidad", "total")
+COLUMNA_LINEAS = "Lineas"
+ACCIONES_CUBO = [nombre for nombre, meta in ACCIONES.items() if meta.get("aditiva")]
+
+
+def construir_cubo_diario(df, schema):
+    """Agrega ``df`` por (día, dimensiones) con unidades, total y líneas.
+
+    Devuelve (cubo ordenado por día con los días vacíos al final, esquema del
+    cubo). El esquema del cubo deja en None los campos que no están en él.
+    """
+    claves = [schema[k] for k in ("fecha",) + DIMENSIONES_CUBO if schema.get(k)]
+    medidas = [schema[k] for k in MEDIDAS_CUBO
+               if schema.get(k) and pd.api.types.is_numeric_dtype(df[schema[k]])]
+    d = df[claves + medidas]
+    if schema.get("fecha"):
+        d = d.assign(**{schema["fecha"]: pd.to_datetime(df[schema["fecha"]], errors="coerce").dt.normalize()})
+
+    agrupado = d.groupby(claves, observed=True, dropna=False, sort=True)
+    cubo = agrupado[medidas].sum() if medidas else pd.DataFrame(index=agrupado.size().index)
+    cubo[COLUMNA_LINEAS] = agrupado.size()
+    cubo = cubo.reset_index()
+    if schema.get("fecha"):
+        # Orden que espera filtrar_rango_fechas: por fecha, con las vacías al final
+        cubo = cubo.sort_values(schema["fecha"], kind="mergesort", na_position="last", ignore_index=True)
+    schema_cubo = {campo: (col if col in cubo.columns else None) for campo, col in schema.items()}
+    return cubo, schema_cubo
+
+
+class CuboDiario:
+    """Cubo diario de un dataset más la última vista filtrada (se reusa si los filtros no cambian)."""
+
+    def __init__(self, df, schema):
+        self.filas_origen = len(df)
+        self.datos, self.schema = construir_cubo_diario(df, schema)
+        self._vista = (None, self.datos)
+
+    @property
+    def filas(self):
+        return len(self.datos)
+
+    def admite(self, filtros):
+        """True si los filtros se pueden aplicar a nivel día (rango de fechas sin hora)."""
+        for clave in ("fecha_inicio", "fecha_fin"):
+            valor = (filtros or {}).get(clave)
+            if valor and pd.Timestamp(valor) != pd.Timestamp(valor).normalize():
+                return False
+        return True
+
+    def filtrar(self, filtros=None):
+        firma = repr(sorted((filtros or {}).items()))
+        anterior, vista = self._vista
+        if anterior != firma:
+            vista = aplicar_filtros_globales(self.datos, self.schema, filtros or {})
+            self._vista = (firma, vista)
+        return vista
+
+
+def ejecutar_accion_cubo(nombre, cubo, parametros=None, filtros=None):
+    """Como ``core_analisis.ejecutar_accion`` pero sobre el cubo (los filtros se aplican al cubo)."""
+    return ejecutar_accion(nombre, cubo.filtrar(filtros), cubo.schema, parametros, filtros)
@@ -0,0 +1,682 @@
+# core_sql.py
+"""Motor SQL embebido para correr acciones sin tener todo el dataset en RAM.
+
+Los datos se cargan por lotes en una tabla ``ventas`` de sqlite (stdlib) o de
+DuckDB (si está instalado). La tabla tiene una columna por campo del esquema
+("fecha", "producto", ...) más ``_fila`` (orden original). La fecha se guarda
+como texto ISO ("AAAA-MM-DD HH:MM:SS"), que se ordena y se recorta con
+``substr`` igual en los dos motores. Se crean índices sobre fecha, producto y
+ticket. El tipo de cada columna sale de todos los lotes: si uno trae valores
+más anchos que los anteriores (decimales después de enteros, texto después
+de números) la columna se ensancha.
+
+Las acciones de agregación registradas en ``ACCIONES_SQL`` (mismos nombres
+que ``core_analisis.ACCIONES``) se traducen a SQL y devuelven las mismas
+tablas que su versión pandas; las demás siguen necesitando el DataFrame.
+"""
+import importlib.util
+import itertools
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from core_analisis import (
+    ESQUEMA_POR_DEFECTO,
+    FILTROS_GLOBALES,
+    NIVELES_JERARQUIA,
+    SIN_DATO,
+    _detectar_csv,
+    _meses_a_texto,
+    accion_sumatoria_ventas_mensuales_por_idarticulo,
+    comparar_tabla_mensual,
+    clasificar_abc,
+    completar_esquema,
+    leer_archivo_subido,
+    rollup_jerarquia,
+    seleccionar_top_bottom,
+    transiciones_abc,
+)
+
+MOTORES_SQL = ("sqlite", "duckdb")
+TABLA = "ventas"
+CAMPOS_INDEXADOS = ("fecha", "producto", "ticket")
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+TAMANO_LOTE = 100_000
+
+
+def motores_sql_disponibles():
+    """Motores SQL que se pueden usar en este entorno (sqlite siempre está)."""
+    return [m for m in MOTORES_SQL if m == "sqlite" or importlib.util.find_spec(m)]
+
+
+# Tipos de columna de menor a mayor: un lote con un tipo más ancho ensancha la columna
+TIPOS_SQL = ("BIGINT", "DOUBLE", "TEXT")
+
+
+def _tipo_sql(serie):
+    """Tipo de columna SQL para una serie ya normalizada (None si está toda vacía)."""
+    if not serie.notna().any():
+        return None
+    tipo = pd.api.types.infer_dtype(serie, skipna=True)
+    if tipo in ("integer", "boolean"):
+        return "BIGINT"
+    if tipo in ("floating", "mixed-integer-float", "decimal"):
+        return "DOUBLE"
+    return "TEXT"
+
+
+def _tipo_mas_ancho(*tipos):
+    tipos = [t for t in tipos if t]
+    return max(tipos, key=TIPOS_SQL.index) if tipos else None
+
+
+def _convertir_serie(serie, tipo):
+    """Convierte una serie normalizada al tipo de su columna SQL."""
+    if tipo == "BIGINT":
+        return serie.astype("Int64")
+    if tipo == "DOUBLE":
+        return serie.astype(float)
+    serie = serie.astype(object).where(serie.notna(), None)
+    return serie.map(lambda v: v if v is None or isinstance(v, str) else str(v))
+
+
+def _valor_sql(valor):
+    """Convierte escalares numpy/pandas a tipos de Python para usarlos como parámetro."""
+    if isinstance(valor, np.generic):
+        return valor.item()
+    if isinstance(valor, pd.Timestamp):
+        return valor.strftime(FORMATO_FECHA)
+    return valor
+
+
+def _normalizar_lote(lote, schema, campos, inicio):
+    """Columnas del esquema renombradas por campo, fecha como texto ISO y ``_fila``.
+
+    Los tipos se fijan después, al insertar (ver ``BaseVentasSQL.cargar``).
+    """
+    d = pd.DataFrame({"_fila": np.arange(inicio, inicio + len(lote), dtype=np.int64)})
+    for campo in campos:
+        serie = lote[schema[campo]].reset_index(drop=True)
+        if campo == "fecha":
+            serie = pd.to_datetime(serie, errors="coerce").dt.strftime(FORMATO_FECHA)
+        elif isinstance(serie.dtype, pd.CategoricalDtype):
+            serie = serie.astype(object)
+        d[campo] = serie
+    return d
+
+
+def _condiciones_fecha(inicio=None, fin=None):
+    """Condiciones SQL del rango de fechas; ``fin`` sin hora incluye el día completo."""
+    partes, params = [], []
+    if inicio:
+        partes.append("fecha >= ?")
+        params.append(pd.Timestamp(inicio).strftime(FORMATO_FECHA))
+    if fin:
+        fin = pd.Timestamp(fin)
+        if fin == fin.normalize():
+            partes.append("fecha < ?")
+            params.append((fin + pd.Timedelta(days=1)).strftime(FORMATO_FECHA))
+        else:
+            partes.append("fecha <= ?")
+            params.append(fin.strftime(FORMATO_FECHA))
+    return partes, params
+
+
+class BaseVentasSQL:
+    """Conexión a una base local con la tabla ``ventas``.
+
+    Sin ``ruta`` se crea un archivo temporal (en disco, no en memoria) que se
+    borra al cerrar. ``schema`` es el esquema original (nombres de columnas
+    del archivo) y se guarda en la propia base.
+    """
+
+    def __init__(self, motor="sqlite", ruta=None):
+        if motor not in motores_sql_disponibles():
+            raise ValueError(f"Motor SQL no disponible: {motor}")
+        self.motor = motor
+        self._temporal = None
+        if ruta is None:
+            self._temporal = tempfile.mkdtemp(prefix="ventas_sql_")
+            ruta = os.path.join(self._temporal, f"ventas.{motor}")
+        self.ruta = ruta
+        self.schema = {}
+        self.filas = 0
+        self.tipos = {}
+        self._lock = threading.Lock()
+        if motor == "duckdb":
+            import duckdb
+            self.con = duckdb.connect(ruta)
+        else:
+            # El trabajo en segundo plano consulta desde otro hilo; el lock serializa el acceso
+            self.con = sqlite3.connect(ruta, check_same_thread=False)
+
+    @property
+    def campos(self):
+        return [c for c in ESQUEMA_POR_DEFECTO if self.schema.get(c)]
+
+    def tiene(self, *campos):
+        return all(self.schema.get(c) for c in campos)
+
+    def _ejecutar(self, sql, params=()):
+        with self._lock:
+            self.con.execute(sql, list(params))
+
+    def consulta(self, sql, params=()):
+        """Corre una consulta y devuelve el resultado como DataFrame."""
+        with self._lock:
+            if self.motor == "duckdb":
+                return self.con.execute(sql, list(params)).df()
+            return pd.read_sql_query(sql, self.con, params=list(params))
+
+    def cargar(self, lotes, schema, progreso=None):
+        """Carga los DataFrames de ``lotes`` (reemplaza lo que hubiera) y crea los índices.
+
+        ``progreso``, si se pasa, se llama con la cantidad de filas cargadas
+        después de cada lote.
+        """
+        self.schema = dict(schema)
+        self.filas = 0
+        self.tipos = {}
+        campos = self.campos
+        self._ejecutar(f"DROP TABLE IF EXISTS {TABLA}")
+        creada = False
+        for lote in lotes:
+            lote = _normalizar_lote(lote, schema, campos, self.filas)
+            tipos = {c: _tipo_mas_ancho(self.tipos.get(c), _tipo_sql(lote[c])) or TIPOS_SQL[0]
+                     for c in lote.columns}
+            if not creada:
+                columnas = ", ".join(f"{c} {t}" for c, t in tipos.items())
+                self._ejecutar(f"CREATE TABLE {TABLA} ({columnas})")
+                creada = True
+            elif tipos != self.tipos:
+                self._ensanchar(tipos)
+            self.tipos = tipos
+            lote = lote.assign(**{c: _convertir_serie(lote[c], t) for c, t in tipos.items()})
+            with self._lock:
+                if self.motor == "duckdb":
+                    self.con.register("_lote", lote)
+                    self.con.execute(f"INSERT INTO {TABLA} SELECT {', '.join(lote.columns)} FROM _lote")
+                    self.con.unregister("_lote")
+                else:
+                    lote.to_sql(TABLA, self.con, if_exists="append", index=False)
+            self.filas += len(lote)
+            if progreso:
+                progreso(self.filas)
+        if not creada:
+            raise ValueError("No hay datos para cargar.")
+
+        for campo in CAMPOS_INDEXADOS:
+            if campo in campos:
+                self._ejecutar(f"CREATE INDEX idx_{TABLA}_{campo} ON {TABLA} ({campo})")
+        self._ejecutar("DROP TABLE IF EXISTS _meta")
+        self._ejecutar("CREATE TABLE _meta (clave TEXT, valor TEXT)")
+        self._ejecutar("INSERT INTO _meta VALUES (?, ?), (?, ?), (?, ?)",
+                       ["schema", json.dumps(self.schema), "filas", str(self.filas),
+                        "tipos", json.dumps(self.tipos)])
+        if self.motor == "sqlite":
+            self.con.commit()
+        return self
+
+    def _ensanchar(self, tipos):
+        """Rehace la tabla con los tipos más anchos que trajo un lote, convirtiendo lo ya cargado.
+
+        Cada columna se ensancha a lo sumo dos veces (BIGINT -> DOUBLE -> TEXT).
+        """
+        columnas = ", ".join(f"{c} {t}" for c, t in tipos.items())
+        valores = ", ".join(f"CAST({c} AS {t})" for c, t in tipos.items())
+        self._ejecutar(f"CREATE TABLE _{TABLA}_nueva ({columnas})")
+        self._ejecutar(f"INSERT INTO _{TABLA}_nueva SELECT {valores} FROM {TABLA}")
+        self._ejecutar(f"DROP TABLE {TABLA}")
+        self._ejecutar(f"ALTER TABLE _{TABLA}_nueva RENAME TO {TABLA}")
+
+    def suma(self, campo):
+        """Expresión SUM del campo con el tipo de su columna (DuckDB suma enteros como HUGEINT)."""
+        expresion = f"COALESCE(SUM({campo}), 0)"
+        if self.tipos.get(campo) == "BIGINT":
+            return f"CAST({expresion} AS BIGINT)"
+        return expresion
+
+    def leer_meta(self):
+        meta = dict(self.consulta("SELECT clave, valor FROM _meta").itertuples(index=False, name=None))
+        self.schema = json.loads(meta["schema"])
+        self.filas = int(meta["filas"])
+        self.tipos = json.loads(meta.get("tipos", "{}"))
+        return self
+
+    def donde(self, filtros=None, condiciones=(), params=()):
+        """Cláusula WHERE con ``condiciones`` y los filtros globales; devuelve (sql, params)."""
+        filtros = filtros or {}
+        partes, params = list(condiciones), list(params)
+        if "fecha" in self.campos:
+            rango, valores = _condiciones_fecha(filtros.get("fecha_inicio"), filtros.get("fecha_fin"))
+            partes += rango
+            params += valores
+        for clave in FILTROS_GLOBALES:
+            valores = filtros.get(clave)
+            if not valores or clave not in self.campos:
+                continue
+            partes.append(f"{clave} IN ({', '.join('?' * len(valores))})")
+            params += [_valor_sql(v) for v in valores]
+        return (" WHERE " + " AND ".join(partes) if partes else ""), params
+
+    def cerrar(self):
+        with self._lock:
+            self.con.close()
+        if self._temporal:
+            shutil.rmtree(self._temporal, ignore_errors=True)
+
+
+# ===================== CARGA =====================
+
+def lotes_de_dataframe(df, tamano_lote=TAMANO_LOTE):
+    for inicio in range(0, len(df), tamano_lote):
+        yield df.iloc[inicio:inicio + tamano_lote]
+
+
+def lotes_de_archivo(ruta, tamano_lote=TAMANO_LOTE):
+    """Lee un archivo por partes: CSV y Parquet sin cargarlo entero; Excel de una sola vez."""
+    nombre = os.path.basename(ruta)
+    extension = os.path.splitext(nombre)[1].lower().lstrip(".")
+    if extension in ("csv", "txt"):
+        with open(ruta, "rb") as f:
+            encoding, separador = _detectar_csv(f.read(64 * 1024))
+        lector = pd.read_csv(ruta, sep=separador, encoding=encoding, chunksize=tamano_lote, low_memory=False)
+    elif extension == "parquet" and importlib.util.find_spec("pyarrow"):
+        import pyarrow.parquet as pq
+        lector = (b.to_pandas() for b in pq.ParquetFile(ruta).iter_batches(batch_size=tamano_lote))
+    else:
+        lector = [leer_archivo_subido(ruta)[0]]
+    for lote in lector:
+        lote["_archivo_origen"] = nombre
+        yield lote
+
+
+def cargar_dataframe(df, schema, motor="sqlite", ruta=None, tamano_lote=TAMANO_LOTE):
+    """Carga un DataFrame ya preparado (idealmente ordenado por fecha) en una base SQL."""
+    return BaseVentasSQL(motor, ruta).cargar(lotes_de_dataframe(df, tamano_lote), schema)
+
+
+def cargar_archivos(archivos, mapeo=None, motor="sqlite", ruta=None, tamano_lote=TAMANO_LOTE, progreso=None):
+    """Carga archivos en una base SQL por lotes, sin armar el DataFrame completo.
+
+    El esquema se completa con las columnas del primer lote (ver
+    ``completar_esquema``).
+    """
+    lotes = (lote for archivo in archivos for lote in lotes_de_archivo(archivo, tamano_lote))
+    primero = next(lotes, None)
+    if primero is None:
+        raise ValueError("No se pudo leer ningún archivo.")
+    schema = completar_esquema(primero.columns, mapeo)
+    return BaseVentasSQL(motor, ruta).cargar(itertools.chain([primero], lotes), schema, progreso)
+
+
+def abrir_base_sql(ruta, motor="sqlite"):
+    """Abre una base ya cargada con ``cargar_archivos`` o ``cargar_dataframe``."""
+    if not os.path.exists(ruta):
+        raise FileNotFoundError(ruta)
+    return BaseVentasSQL(motor, ruta).leer_meta()
+
+
+# ===================== ACCIONES EN SQL =====================
+
+def sql_totales_por_periodo(base, filtros, periodo="mes", fecha_inicio=None, fecha_fin=None):
+    if not base.tiene("fecha", "total"):
+        return "Requiere columna de fecha y total."
+    rango, valores = _condiciones_fecha(fecha_inicio, fecha_fin)
+    where, params = base.donde(filtros, ["fecha IS NOT NULL"] + rango, valores)
+
+    if periodo == "rango":
+        fila = base.consulta(f"SELECT COUNT(*) AS n, {base.suma('total')} AS t FROM {TABLA}{where}", params)
+        if fila["n"].iloc[0] == 0:
+            return pd.DataFrame(columns=["Periodo", "TotalFacturado"])
+        return pd.DataFrame([{"Periodo": f"{fecha_inicio}–{fecha_fin}", "TotalFacturado": fila["t"].iloc[0]}])
+
+    largo = {"mes": 7, "dia": 10}.get(periodo, 19)
+    tabla = base.consulta(
+        f"SELECT substr(fecha, 1, {largo}) AS Periodo, {base.suma('total')} AS TotalFacturado "
+        f"FROM {TABLA}{where} GROUP BY 1 ORDER BY 1", params)
+    if periodo == "dia":
+        tabla["Periodo"] = pd.to_datetime(tabla["Periodo"]).dt.date
+    elif periodo != "mes":
+        tabla["Periodo"] = pd.to_datetime(tabla["Periodo"])
+    return tabla
+
+
+_NIVELES_UNIDADES = {"producto": ("producto", "IdArticulo"), "categoria": ("departamento", "Categoria"),
+                     "vendedor": ("vendedor", "Vendedor")}
+
+
+def sql_unidades_totales(base, filtros, por="producto"):
+    if not base.tiene("cantidad"):
+        return "Requiere columna de cantidad."
+    campo, nombre = _NIVELES_UNIDADES.get(por, (None, None))
+    if not campo or not base.tiene(campo):
+        return "No se ha mapeado la columna necesaria para esta agregación."
+    where, params = base.donde(filtros, [f"{campo} IS NOT NULL"])
+    return base.consulta(
+        f"SELECT {campo} AS {nombre}, {base.suma('cantidad')} AS UnidadesVendidas "
+        f"FROM {TABLA}{where} GROUP BY {campo} ORDER BY UnidadesVendidas DESC, {campo}", params)
+
+
+def sql_conteo_tickets(base, filtros, por="producto", **_):
+    """Tickets distintos por grupo; en SQL el conteo es siempre exacto (COUNT DISTINCT)."""
+    if not base.tiene("ticket"):
+        return "Requiere columna de ticket."
+    if por == "producto" and base.tiene("producto"):
+        clave, nombre = "producto", "IdArticulo"
+    elif por == "dia" and base.tiene("fecha"):
+        clave, nombre = "substr(fecha, 1, 10)", "Dia"
+    elif por == "vendedor" and base.tiene("vendedor"):
+        clave, nombre = "vendedor", "Vendedor"
+    else:
+        return "No se ha mapeado la columna necesaria para esta agregación."
+    where, params = base.donde(filtros, [f"{clave} IS NOT NULL"])
+    tabla = base.consulta(
+        f"SELECT {clave} AS {nombre}, COUNT(DISTINCT ticket) AS CantidadTickets "
+        f"FROM {TABLA}{where} GROUP BY 1 ORDER BY CantidadTickets DESC, 1", params)
+    if nombre == "Dia":
+        tabla["Dia"] = pd.to_datetime(tabla["Dia"]).dt.date
+    return tabla
+
+
+def _distintos_por_mes(base, filtros, campo, nombre):
+    """Distintos por mes más la fila TOTAL sobre todo el período, como en pandas."""
+    where, params = base.donde(filtros, ["fecha IS NOT NULL"])
+    return base.consulta(
+        f"SELECT Mes, {nombre} FROM ("
+        f"SELECT substr(fecha, 1, 7) AS Mes, COUNT(DISTINCT {campo}) AS {nombre} FROM {TABLA}{where} GROUP BY 1 "
+        f"UNION ALL SELECT 'TOTAL' AS Mes, COUNT(DISTINCT {campo}) AS {nombre} FROM {TABLA}{where}"
+        f") ORDER BY Mes = 'TOTAL', Mes", params + params)
+
+
+def sql_productos_unicos_mes(base, filtros, **_):
+    if not base.tiene("producto", "fecha"):
+        return "Requiere IdArticulo y fecha."
+    return _distintos_por_mes(base, filtros, "producto", "ProductosUnicos")
+
+
+def sql_clientes_unicos(base, filtros, **_):
+    if not base.tiene("cliente"):
+        return "Requiere columna de cliente."
+    where, params = base.donde(filtros)
+    return int(base.consulta(f"SELECT COUNT(DISTINCT cliente) AS n FROM {TABLA}{where}", params)["n"].iloc[0])
+
+
+def sql_clientes_unicos_mes(base, filtros, **_):
+    if not base.tiene("cliente", "fecha"):
+        return "Requiere cliente y fecha."
+    return _distintos_por_mes(base, filtros, "cliente", "ClientesUnicos")
+
+
+def sql_clientes_recurrentes(base, filtros, min_veces=2):
+    if not base.tiene("cliente", "ticket"):
+        return "Requiere cliente y ticket."
+    where, params = base.donde(filtros, ["cliente IS NOT NULL"])
+    tabla = base.consulta(
+        f"SELECT cliente, COUNT(DISTINCT ticket) AS Compras FROM {TABLA}{where} "
+        f"GROUP BY cliente HAVING COUNT(DISTINCT ticket) >= ? ORDER BY cliente", params + [min_veces])
+    return tabla.rename(columns={"cliente": base.schema["cliente"]})
+
+
+def sql_precio_promedio_producto(base, filtros):
+    if not base.tiene("producto", "precio"):
+        return "Requiere IdArticulo y precio unitario."
+    where, params = base.donde(filtros, ["producto IS NOT NULL"])
+    return base.consulta(
+        f"SELECT producto AS IdArticulo, AVG(precio) AS PrecioPromedio FROM {TABLA}{where} "
+        f"GROUP BY producto ORDER BY PrecioPromedio DESC, producto", params)
+
+
+def sql_ticket_promedio_por(base, filtros, por="dia"):
+    if not base.tiene("ticket", "total"):
+        return "Requiere ticket y total."
+    where, params = base.donde(filtros, ["ticket IS NOT NULL"])
+
+    if por == "dia" and base.tiene("fecha"):
+        # Cada ticket cuenta en el día de su primera línea
+        tabla = base.consulta(
+            f"SELECT Dia, AVG(TotalTicket) AS TicketPromedio FROM ("
+            f"SELECT substr(MIN(fecha), 1, 10) AS Dia, {base.suma('total')} AS TotalTicket "
+            f"FROM {TABLA}{where} GROUP BY ticket) t "
+            f"WHERE Dia IS NOT NULL GROUP BY Dia ORDER BY Dia", params)
+        tabla["Dia"] = pd.to_datetime(tabla["Dia"]).dt.date
+        return tabla
+    if por == "vendedor" and base.tiene("vendedor"):
+        # Vendedor del ticket = primer vendedor no vacío en orden de fecha (como pandas .first())
+        where_v, params_v = base.donde(filtros, ["ticket IS NOT NULL", "vendedor IS NOT NULL"])
+        return base.consulta(
+            f"WITH tickets AS (SELECT ticket, {base.suma('total')} AS TotalTicket "
+            f"FROM {TABLA}{where} GROUP BY ticket), "
+            f"primeros AS (SELECT ticket, vendedor, ROW_NUMBER() OVER ("
+            f"PARTITION BY ticket ORDER BY fecha IS NULL, fecha, _fila) AS n FROM {TABLA}{where_v}) "
+            f"SELECT p.vendedor AS Vendedor, AVG(t.TotalTicket) AS TicketPromedio "
+            f"FROM tickets t JOIN primeros p ON p.ticket = t.ticket AND p.n = 1 "
+            f"GROUP BY p.vendedor ORDER BY p.vendedor", params + params_v)
+    return "Falta mapear fecha o vendedor."
+
+
+def sql_participacion(base, filtros, nivel="producto"):
+    if not base.tiene("total"):
+        return "Requiere columna total."
+    if nivel == "producto" and base.tiene("producto"):
+        campo, nombre = "producto", "IdArticulo"
+    elif nivel == "familia" and base.tiene("departamento"):
+        campo, nombre = "departamento", "Familia"
+    else:
+        return "No se ha mapeado la columna necesaria."
+    where, params = base.donde(filtros, [f"{campo} IS NOT NULL"])
+    tabla = base.consulta(
+        f"SELECT {campo} AS {nombre}, {base.suma('total')} AS Total FROM {TABLA}{where} "
+        f"GROUP BY {campo} ORDER BY {campo}", params)
+    tabla["Participacion_%"] = (tabla["Total"] / tabla["Total"].sum() * 100).round(2)
+    return tabla.sort_values("Total", ascending=False)
+
+
+def sql_segmentacion_sucursal(base, filtros):
+    if not base.tiene("sucursal", "total"):
+        return "Requiere sucursal y total."
+    where, params = base.donde(filtros, ["sucursal IS NOT NULL"])
+    return base.consulta(
+        f"SELECT sucursal AS Sucursal, {base.suma('total')} AS TotalFacturado FROM {TABLA}{where} "
+        f"GROUP BY sucursal ORDER BY TotalFacturado DESC, sucursal", params)
+
+
+def sql_jerarquia(base, filtros, cruce=None):
+    """Agrega el nivel más fino en SQL y arma los subtotales con ``rollup_jerarquia``."""
+    if not base.tiene("total"):
+        return "Requiere columna total."
+    niveles = [(clave, nombre) for clave, nombre in NIVELES_JERARQUIA if base.tiene(clave)]
+    if not niveles:
+        return "Requiere al menos una columna de la jerarquía (departamento, familia, subfamilia o IdArticulo)."
+
+    claves, nombres, condiciones = [], [], []
+    if cruce == "mes":
+        if not base.tiene("fecha"):
+            return "Requiere columna de fecha para cruzar por mes."
+        claves, nombres, condiciones = ["substr(fecha, 1, 7)"], ["Mes"], ["fecha IS NOT NULL"]
+    elif cruce:
+        if not base.tiene(cruce):
+            return f"Requiere columna de {cruce} para cruzar."
+        claves, nombres = [cruce], [cruce.capitalize()]
+    claves += [clave for clave, _ in niveles]
+    nombres += [nombre for _, nombre in niveles]
+
+    where, params = base.donde(filtros, condiciones)
+    columnas = ", ".join(f"{c} AS {n}" for c, n in zip(claves, nombres))
+    posiciones = ", ".join(str(i + 1) for i in range(len(claves)))
+    unidades = f", {base.suma('cantidad')} AS Unidades" if base.tiene("cantidad") else ""
+    fino = base.consulta(
+        f"SELECT {columnas}, {base.suma('total')} AS Total, COUNT(*) AS Lineas{unidades} "
+        f"FROM {TABLA}{where} GROUP BY {posiciones}", params)
+    if fino.empty:
+        return pd.DataFrame(columns=["Nivel", "Nodo", "Total"])
+    for col in nombres:
+        fino[col] = fino[col].astype(object).where(fino[col].notna(), SIN_DATO)
+    return rollup_jerarquia(fino, nombres[:len(nombres) - len(niveles)], nombres[len(nombres) - len(niveles):])
+
+
+def sql_tabla_mensual(base, filtros):
+    if not base.tiene("fecha", "total"):
+        return "Requiere fecha y total."
+    where, params = base.donde(filtros, ["fecha IS NOT NULL"])
+    return base.consulta(
+        f"SELECT CAST(substr(fecha, 1, 4) AS INTEGER) AS Anio, CAST(substr(fecha, 6, 2) AS INTEGER) AS Mes, "
+        f"{base.suma('total')} AS TotalFacturado FROM {TABLA}{where} GROUP BY 1, 2 ORDER BY 1, 2", params)
+
+
+def sql_comparacion_mensual(base, filtros):
+    tabla = sql_tabla_mensual(base, filtros)
+    if isinstance(tabla, str):
+        return tabla
+    return comparar_tabla_mensual(tabla)
+
+
+def sql_top_bottom(base, filtros, nivel="producto", n=10, por=None):
+    """Agrega en SQL y selecciona top/bottom sobre la tabla agregada (igual que pandas)."""
+    if not base.tiene("total"):
+        return "Requiere total."
+    if por and por == nivel:
+        return f"No se puede agrupar el ranking de {nivel} por {por}."
+    if (nivel == "dia" or por == "mes") and not base.tiene("fecha"):
+        return "Faltan columnas para este análisis."
+    if nivel == "producto" and base.tiene("producto"):
+        clave, nombre = "producto", "IdArticulo"
+    elif nivel == "dia":
+        clave, nombre = "substr(fecha, 1, 10)", "Dia"
+    elif nivel == "vendedor" and base.tiene("vendedor"):
+        clave, nombre = "vendedor", "Vendedor"
+    else:
+        return "Faltan columnas para este análisis."
+
+    claves, nombres = [clave], [nombre]
+    nombre_por = None
+    if por == "mes":
+        claves, nombres, nombre_por = ["substr(fecha, 1, 7)", clave], ["Mes", nombre], "Mes"
+    elif por:
+        if not base.tiene(por):
+            return f"Requiere columna de {por} para agrupar."
+        nombre_por = por.capitalize()
+        claves, nombres = [por, clave], [nombre_por, nombre]
+
+    where, params = base.donde(filtros, [f"{c} IS NOT NULL" for c in claves])
+    posiciones = ", ".join(str(i + 1) for i in range(len(claves)))
+    columnas = ", ".join(f"{c} AS {a}" for c, a in zip(claves, nombres))
+    g = base.consulta(
+        f"SELECT {columnas}, {base.suma('total')} AS Total FROM {TABLA}{where} "
+        f"GROUP BY {posiciones} ORDER BY {posiciones}", params)
+    if nombre == "Dia":
+        g["Dia"] = pd.to_datetime(g["Dia"]).dt.date
+    return seleccionar_top_bottom(g, nombre, nombre_por, n)
+
+
+def sql_sumatoria_ventas_mensuales_por_idarticulo(base, filtros):
+    """Agrega producto x mes en SQL y arma la tabla pivote con la función de pandas."""
+    if not base.tiene("producto", "fecha", "total"):
+        return "Requiere IdArticulo, fecha y total."
+    where, params = base.donde(filtros, ["producto IS NOT NULL", "fecha IS NOT NULL"])
+    mensual = base.consulta(
+        f"SELECT producto, substr(fecha, 1, 7) || '-01' AS fecha, {base.suma('total')} AS total "
+        f"FROM {TABLA}{where} GROUP BY 1, 2", params)
+    mensual["fecha"] = pd.to_datetime(mensual["fecha"])
+    schema = {"producto": "producto", "fecha": "fecha", "total": "total"}
+    return accion_sumatoria_ventas_mensuales_por_idarticulo(mensual, schema)
+
+
+def _agregado_abc_sql(base, filtros, por=None, periodo=None):
+    """Total por (``por``, mes, producto) agregado en SQL; mismo formato que ``_agregado_abc``."""
+    if not base.tiene("producto", "total"):
+        return "Requiere IdArticulo y total."
+    if por and not base.tiene(por):
+        return f"Requiere columna de {por} para agrupar."
+    if periodo == "mes" and not base.tiene("fecha"):
+        return "Requiere fecha para clasificar por mes."
+
+    claves, nombres, condiciones = [], [], ["producto IS NOT NULL"]
+    if por:
+        claves.append(por)
+        nombres.append(por.capitalize())
+        condiciones.append(f"{por} IS NOT NULL")
+    if periodo == "mes":
+        condiciones.append("fecha IS NOT NULL")
+        # Meses desde 1970, igual que datetime64[M] en la versión pandas
+        claves.append("(CAST(substr(fecha, 1, 4) AS INTEGER) - 1970) * 12 + CAST(substr(fecha, 6, 2) AS INTEGER) - 1")
+        nombres.append("Mes")
+    claves.append("producto")
+    nombres.append("IdArticulo")
+
+    where, params = base.donde(filtros, condiciones)
+    columnas = ", ".join(f"{c} AS {n}" for c, n in zip(claves, nombres))
+    posiciones = ", ".join(str(i + 1) for i in range(len(claves)))
+    g = base.consulta(
+        f"SELECT {columnas}, {base.suma('total')} AS Total FROM {TABLA}{where} GROUP BY {posiciones}", params)
+    if "Mes" in g.columns:
+        g["Mes"] = g["Mes"].astype(np.int64)
+    return g, nombres[:-1]
+
+
+def sql_abc(base, filtros, por=None, periodo=None, corte_a=80.0, corte_b=95.0):
+    agregado = _agregado_abc_sql(base, filtros, por, periodo)
+    if isinstance(agregado, str):
+        return agregado
+    tabla = clasificar_abc(*agregado, corte_a=corte_a, corte_b=corte_b)
+    if "Mes" in tabla.columns and len(tabla):
+        tabla["Mes"] = _meses_a_texto(tabla["Mes"].to_numpy())
+    return tabla
+
+
+def sql_transiciones_abc(base, filtros, por=None, corte_a=80.0, corte_b=95.0):
+    agregado = _agregado_abc_sql(base, filtros, por, "mes")
+    if isinstance(agregado, str):
+        return agregado
+    g, grupos = agregado
+    return transiciones_abc(clasificar_abc(g, grupos, corte_a, corte_b), grupos)
+
+
+# Traducciones SQL de las acciones de agregación, con los mismos nombres que ACCIONES
+ACCIONES_SQL = {
+    "Totales facturados por mes": lambda base, filtros, **kw: sql_totales_por_periodo(base, filtros, "mes", **kw),
+    "Totales facturados por día": lambda base, filtros, **kw: sql_totales_por_periodo(base, filtros, "dia", **kw),
+    "Totales facturados en rango": lambda base, filtros, **kw: sql_totales_por_periodo(base, filtros, "rango", **kw),
+    "Unidades por producto": lambda base, filtros, **kw: sql_unidades_totales(base, filtros, "producto"),
+    "Unidades por categoría": lambda base, filtros, **kw: sql_unidades_totales(base, filtros, "categoria"),
+    "Unidades por vendedor": lambda base, filtros, **kw: sql_unidades_totales(base, filtros, "vendedor"),
+    "Tickets por producto": lambda base, filtros, **kw: sql_conteo_tickets(base, filtros, "producto", **kw),
+    "Tickets por día": lambda base, filtros, **kw: sql_conteo_tickets(base, filtros, "dia", **kw),
+    "Tickets por vendedor": lambda base, filtros, **kw: sql_conteo_tickets(base, filtros, "vendedor", **kw),
+    "Productos únicos por mes": lambda base, filtros, **kw: sql_productos_unicos_mes(base, filtros, **kw),
+    "Clientes únicos (KPI)": lambda base, filtros, **kw: sql_clientes_unicos(base, filtros, **kw),
+    "Clientes únicos por mes": lambda base, filtros, **kw: sql_clientes_unicos_mes(base, filtros, **kw),
+    "Clientes recurrentes (>=2 compras)": lambda base, filtros, **kw: sql_clientes_recurrentes(base, filtros, 2),
+    "Precio promedio por producto": lambda base, filtros, **kw: sql_precio_promedio_producto(base, filtros),
+    "Ticket promedio por día": lambda base, filtros, **kw: sql_ticket_promedio_por(base, filtros, "dia"),
+    "Ticket promedio por vendedor": lambda base, filtros, **kw: sql_ticket_promedio_por(base, filtros, "vendedor"),
+    "Participación por producto": lambda base, filtros, **kw: sql_participacion(base, filtros, "producto"),
+    "Participación por familia": lambda base, filtros, **kw: sql_participacion(base, filtros, "familia"),
+    "Segmentación por sucursal": lambda base, filtros, **kw: sql_segmentacion_sucursal(base, filtros),
+    "Jerarquía de productos (drill-down)": lambda base, filtros, **kw: sql_jerarquia(base, filtros, **kw),
+    "Tabla mensual": lambda base, filtros, **kw: sql_tabla_mensual(base, filtros),
+    "Comparación vs mes anterior y año anterior": lambda base, filtros, **kw: sql_comparacion_mensual(base, filtros),
+    "Top/bottom productos": lambda base, filtros, **kw: sql_top_bottom(base, filtros, "producto", **kw),
+    "Top/bottom días": lambda base, filtros, **kw: sql_top_bottom(base, filtros, "dia", **kw),
+    "Top/bottom vendedores": lambda base, filtros, **kw: sql_top_bottom(base, filtros, "vendedor", **kw),
+    "Clasificación ABC (Pareto)": lambda base, filtros, **kw: sql_abc(base, filtros, **kw),
+    "Transiciones de clase ABC": lambda base, filtros, **kw: sql_transiciones_abc(base, filtros, **kw),
+    "Sumatoria Ventas mensuales por IdArticulo":
+        lambda base, filtros, **kw: sql_sumatoria_ventas_mensuales_por_idarticulo(base, filtros),
+}
+
+
+def ejecutar_accion_sql(nombre, base, parametros=None, filtros=None):
+    """Como ``core_analisis.ejecutar_accion`` pero sobre la base SQL (los filtros van en el WHERE)."""
+    kwargs = dict((parametros or {}).get(nombre, {}))
+    filtros = filtros or {}
+    if "rango" in nombre and (filtros.get("fecha_inicio") or filtros.get("fecha_fin")):
+        kwargs["fecha_inicio"] = filtros.get("fecha_inicio")
+        kwargs["fecha_fin"] = filtros.get("fecha_fin")
+    return ACCIONES_SQL[nombre](base, filtros, **kwargs)
@@ -0,0 +1,133 @@
+# core_telemetria.py
+"""Telemetría de tiempo y memoria por etapa (carga, acciones, exportación).
+
+Sin dependencia de Streamlit: la app guarda un ``Telemetria`` por sesión en
+``st.session_state`` y ``TrabajoAnalisis`` registra ahí cada acción desde su
+hilo. El tiempo se mide con ``time.perf_counter`` y la memoria con
+``tracemalloc`` (incluye los arrays de numpy/pandas); la memoria es el pico
+por encima de lo que estaba en uso al empezar la etapa.
+"""
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+MAX_REGISTROS = 1000
+COLUMNAS = ["Inicio", "Etapa", "Nombre", "Motor", "Estado", "Segundos", "MemoriaPico_MB",
+            "FilasEntrada", "FilasSalida"]
+
+
+def contar_filas(res):
+    """Filas de un resultado de acción: tablas por su largo, mensajes 0 y KPIs 1."""
+    if isinstance(res, pd.DataFrame):
+        return len(res)
+    if isinstance(res, str):
+        return 0
+    if isinstance(res, tuple):
+        tablas = [x for x in res if isinstance(x, pd.DataFrame)]
+        return sum(len(t) for t in tablas) if tablas else 1
+    return 1
+
+
+class Telemetria:
+    """Registro acotado de mediciones; ``medir`` es un context manager.
+
+    Con ``memoria=True`` se activa ``tracemalloc``, que hace más lento el
+    código que crea muchos objetos de Python (p. ej. la exportación con
+    openpyxl); los tiempos medidos con memoria no son comparables con los
+    medidos sin ella.
+
+    ``tracemalloc`` es global al proceso: si dos etapas se solapan (p. ej.
+    una acción en el hilo del trabajo y la carga de un rerun), el pico de
+    cada una incluye lo que asignó la otra mientras estaban activas.
+    """
+
+    def __init__(self, memoria=False, max_registros=MAX_REGISTROS):
+        self.memoria = memoria
+        self.registros = deque(maxlen=max_registros)
+        self._activas = []
+        self._lock = threading.Lock()
+
+    def _actualizar_picos(self):
+        """Lleva el pico actual a todas las mediciones activas y reinicia el pico global."""
+        actual, pico = tracemalloc.get_traced_memory()
+        for registro in self._activas:
+            registro["_pico"] = max(registro["_pico"], pico)
+        tracemalloc.reset_peak()
+        return actual
+
+    @contextmanager
+    def medir(self, etapa, nombre="", filas_entrada=None, motor=""):
+        """Mide el bloque; quien lo usa puede completar ``registro["FilasSalida"]``."""
+        registro = {
+            "Inicio": datetime.now().isoformat(timespec="seconds"),
+            "Etapa": etapa,
+            "Nombre": nombre,
+            "Motor": motor,
+            "Estado": "ok",
+            "FilasEntrada": filas_entrada,
+            "FilasSalida": None,
+        }
+        medir_memoria = self.memoria
+        if medir_memoria:
+            with self._lock:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                registro["_base"] = registro["_pico"] = self._actualizar_picos()
+                self._activas.append(registro)
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        except BaseException:
+            registro["Estado"] = "error"
+            raise
+        finally:
+            registro["Segundos"] = round(time.perf_counter() - inicio, 4)
+            registro["MemoriaPico_MB"] = None
+            with self._lock:
+                if medir_memoria and tracemalloc.is_tracing():
+                    self._actualizar_picos()
+                    registro["MemoriaPico_MB"] = round((registro["_pico"] - registro["_base"]) / 2**20, 2)
+                if registro in self._activas:
+                    self._activas.remove(registro)
+                registro.pop("_base", None)
+                registro.pop("_pico", None)
+                self.registros.append(registro)
+
+    def detener_memoria(self):
+        """Deja de medir memoria y apaga tracemalloc si no hay mediciones en curso."""
+        self.memoria = False
+        with self._lock:
+            if not self._activas and tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+    def limpiar(self):
+        with self._lock:
+            self.registros.clear()
+
+    def tabla(self):
+        with self._lock:
+            registros = list(self.registros)
+        tabla = pd.DataFrame(registros, columns=COLUMNAS)
+        tabla[["FilasEntrada", "FilasSalida"]] = tabla[["FilasEntrada", "FilasSalida"]].astype("Int64")
+        return tabla
+
+    def resumen_por_etapa(self):
+        """Segundos totales, pico máximo y cantidad de mediciones por etapa."""
+        tabla = self.tabla()
+        return (
+            tabla.groupby("Etapa", sort=False)
+            .agg(Mediciones=("Segundos", "size"), Segundos=("Segundos", "sum"),
+                 MemoriaPico_MB=("MemoriaPico_MB", "max"))
+            .reset_index()
+        )
+
+    def a_csv(self):
+        return self.tabla().to_csv(index=False)
+
+    def a_json(self):
+        return self.tabla().to_json(orient="records", force_ascii=False, indent=1)
@@ -0,0 +1,124 @@
+# core_trabajos.py
+"""Ejecución de análisis en segundo plano (sin dependencia de Streamlit).
+
+La app guarda el ``TrabajoAnalisis`` en ``st.session_state``: el hilo sigue
+corriendo aunque el usuario toque widgets y los reruns solo leen su estado
+y los resultados ya calculados.
+"""
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+
+import pandas as pd
+
+from core_analisis import ejecutar_accion
+from core_cubo import ACCIONES_CUBO, ejecutar_accion_cubo
+from core_sql import ACCIONES_SQL, ejecutar_accion_sql
+from core_telemetria import contar_filas
+
+PENDIENTE = "pendiente"
+EJECUTANDO = "ejecutando"
+LISTO = "listo"
+ERROR = "error"
+CANCELADO = "cancelado"
+
+
+class TrabajoAnalisis:
+    """Corre una lista de acciones, una tras otra, en un hilo aparte.
+
+    La cancelación se revisa entre acciones: la que está en curso termina y
+    las pendientes quedan como canceladas. Con ``base_sql`` (ver core_sql.py)
+    las acciones que tienen traducción SQL corren sobre la base y el resto
+    sobre ``df``. Con ``cubo`` (ver core_cubo.py) las acciones aditivas sin
+    traducción SQL corren sobre el cubo diario, si admite los filtros. Con
+    ``telemetria`` (ver core_telemetria.py) cada acción queda registrada con
+    su tiempo, memoria y filas.
+    """
+
+    def __init__(self, acciones, df, schema, parametros=None, filtros=None, base_sql=None, telemetria=None,
+                 cubo=None):
+        self.id = uuid.uuid4().hex[:8]
+        self.acciones = list(acciones)
+        self.df = df
+        self.schema = schema
+        self.parametros = parametros or {}
+        self.filtros = filtros or {}
+        self.base_sql = base_sql
+        self.telemetria = telemetria
+        self.cubo = cubo if cubo is not None and cubo.admite(self.filtros) else None
+        self.motores = {nombre: self._motor(nombre) for nombre in self.acciones}
+        self.estado = {nombre: PENDIENTE for nombre in self.acciones}
+        self.resultados = {}
+        self.errores = {}
+        self.segundos = {}
+        self.inicio = None
+        self.fin = None
+        self._cancelar = threading.Event()
+        self._hilo = threading.Thread(target=self._correr, name=f"trabajo-{self.id}", daemon=True)
+
+    def _motor(self, nombre):
+        if self.base_sql is not None and nombre in ACCIONES_SQL:
+            return self.base_sql.motor
+        if self.cubo is not None and nombre in ACCIONES_CUBO:
+            return "cubo"
+        return "pandas"
+
+    def iniciar(self):
+        self.inicio = time.time()
+        self._hilo.start()
+        return self
+
+    def cancelar(self):
+        self._cancelar.set()
+
+    @property
+    def terminado(self):
+        return self.inicio is not None and not self._hilo.is_alive()
+
+    @property
+    def cancelado(self):
+        return self._cancelar.is_set()
+
+    def progreso(self):
+        """Fracción de acciones ya resueltas (listas, con error o canceladas)."""
+        hechas = sum(1 for e in self.estado.values() if e not in (PENDIENTE, EJECUTANDO))
+        return hechas / len(self.acciones) if self.acciones else 1.0
+
+    def resumen(self):
+        """Tabla con el estado y la duración de cada acción."""
+        return pd.DataFrame({
+            "Accion": self.acciones,
+            "Estado": [self.estado[a] for a in self.acciones],
+            "Motor": [self.motores[a] for a in self.acciones],
+            "Segundos": [round(self.segundos[a], 2) if a in self.segundos else None for a in self.acciones],
+        })
+
+    def _correr(self):
+        for nombre in self.acciones:
+            if self._cancelar.is_set():
+                self.estado[nombre] = CANCELADO
+                continue
+            self.estado[nombre] = EJECUTANDO
+            inicio = time.perf_counter()
+            motor = self.motores[nombre]
+            origen = self.df if motor == "pandas" else self.cubo if motor == "cubo" else self.base_sql
+            filas = len(origen) if motor == "pandas" else origen.filas
+            medicion = nullcontext({}) if self.telemetria is None else self.telemetria.medir(
+                "accion", nombre, filas, motor)
+            try:
+                with medicion as registro:
+                    if motor == "pandas":
+                        res = ejecutar_accion(nombre, self.df, self.schema, self.parametros, self.filtros)
+                    elif motor == "cubo":
+                        res = ejecutar_accion_cubo(nombre, self.cubo, self.parametros, self.filtros)
+                    else:
+                        res = ejecutar_accion_sql(nombre, self.base_sql, self.parametros, self.filtros)
+                    registro["FilasSalida"] = contar_filas(res)
+                self.resultados[nombre] = res
+                self.estado[nombre] = LISTO
+            except Exception as e:
+                self.errores[nombre] = str(e)
+                self.estado[nombre] = ERROR
+            self.segundos[nombre] = time.perf_counter() - inicio
+        self.fin = time.time()
@@ -0,0 +1,166 @@
+# core_workspace.py
+"""Workspaces: datasets ya preparados guardados como columnas memory-mapped.
+
+Un workspace es una carpeta con ``meta.json`` (esquema, columnas y tipos) y
+un archivo ``.npy`` por columna; las categorías van en archivos aparte, así
+``meta.json`` queda chico aunque haya columnas de texto de alta cardinalidad. Al abrirlo, cada columna se mapea en modo
+solo lectura (``np.load(mmap_mode="r")``) y se arma el DataFrame sin copiar:
+reabrir tarda milisegundos y varios procesos que abren el mismo workspace
+comparten una sola copia física en el page cache del sistema operativo.
+
+Se guarda el DataFrame después de mapear el esquema, parsear fechas y
+optimizar tipos (ver ``core_analisis.optimizar_tipos``), ordenado por fecha.
+"""
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+VERSION_WORKSPACE = 2  # 2: categorías en archivos propios, fuera de meta.json
+VERSIONES_LEGIBLES = (1, 2)
+ARCHIVO_META = "meta.json"
+DIRECTORIO_WORKSPACES = os.environ.get("VENTAS_WORKSPACES", "workspaces")
+
+
+def _guardar_categorias(categorias, carpeta, base):
+    """Escribe las categorías en archivos propios (no en meta.json) conservando su tipo.
+
+    Números, booleanos y fechas se guardan como ``.npy`` de su tipo. El texto
+    (y cualquier otro objeto, convertido a texto) se guarda como los bytes
+    UTF-8 concatenados más los cortes de cada categoría.
+    """
+    if categorias.dtype == object:
+        categorias = categorias.infer_objects()
+    archivo = base + ".cat.npy"
+    if (pd.api.types.is_numeric_dtype(categorias) or pd.api.types.is_bool_dtype(categorias)
+            or isinstance(categorias.dtype, np.dtype) and categorias.dtype.kind == "M"):
+        np.save(os.path.join(carpeta, archivo), categorias.to_numpy())
+        return {"categorias": archivo}
+
+    textos = [str(c).encode("utf-8") for c in categorias]
+    cortes = np.zeros(len(textos) + 1, dtype="int64")
+    np.cumsum([len(t) for t in textos], out=cortes[1:])
+    np.save(os.path.join(carpeta, archivo), np.frombuffer(b"".join(textos), dtype=np.uint8))
+    np.save(os.path.join(carpeta, base + ".cat.cortes.npy"), cortes)
+    tipo = categorias.dtype if pd.api.types.is_string_dtype(categorias) else "object"
+    return {"categorias": archivo, "cortes": base + ".cat.cortes.npy", "tipo_categorias": str(tipo)}
+
+
+def _leer_categorias(ruta, desc):
+    categorias = desc["categorias"]
+    if not isinstance(categorias, str):
+        return categorias  # versión 1: texto dentro de meta.json
+    valores = np.load(os.path.join(ruta, categorias))
+    if "cortes" not in desc:
+        return valores
+    cortes = np.load(os.path.join(ruta, desc["cortes"])).tolist()
+    datos = valores.tobytes()
+    textos = [datos[i:j].decode("utf-8") for i, j in zip(cortes[:-1], cortes[1:])]
+    return pd.Index(textos, dtype=desc["tipo_categorias"])
+
+
+def _guardar_columna(serie, carpeta, base):
+    """Escribe una columna en disco y devuelve su descripción para meta.json."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        np.save(os.path.join(carpeta, base + ".npy"), serie.cat.codes.to_numpy())
+        desc = {"tipo": "categoria", "ordenada": bool(serie.cat.ordered)}
+        desc.update(_guardar_categorias(serie.cat.categories, carpeta, base))
+        return desc
+
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        valores = serie.to_numpy()
+        unidad = np.datetime_data(valores.dtype)[0]
+        np.save(os.path.join(carpeta, base + ".npy"), valores.view("int64"))
+        return {"tipo": "fecha", "unidad": unidad}
+
+    if pd.api.types.is_bool_dtype(serie) and not serie.isna().any():
+        np.save(os.path.join(carpeta, base + ".npy"), serie.to_numpy(dtype=bool))
+        return {"tipo": "numerico"}
+
+    if pd.api.types.is_numeric_dtype(serie):
+        valores = serie.to_numpy()
+        if valores.dtype == object or isinstance(serie.dtype, pd.api.extensions.ExtensionDtype):
+            valores = serie.to_numpy(dtype=float, na_value=np.nan)  # enteros con nulos (Int64, etc.)
+        np.save(os.path.join(carpeta, base + ".npy"), valores)
+        return {"tipo": "numerico"}
+
+    # Texto de alta cardinalidad u otros objetos: se guardan como categoría de texto
+    return _guardar_columna(serie.astype("string").astype("category"), carpeta, base)
+
+
+def guardar_workspace(df, schema, ruta, ordenado_por_fecha=True):
+    """Guarda ``df`` (ya preparado) y su esquema como workspace en ``ruta``.
+
+    La escritura se hace en una carpeta temporal que después reemplaza a la
+    anterior, así un lector nunca ve un workspace a medio escribir.
+    """
+    ruta = os.path.abspath(ruta)
+    padre = os.path.dirname(ruta)
+    os.makedirs(padre, exist_ok=True)
+    temporal = tempfile.mkdtemp(prefix=".tmp_ws_", dir=padre)
+    try:
+        columnas = []
+        for i, col in enumerate(df.columns):
+            desc = _guardar_columna(df[col], temporal, f"c{i}")
+            desc.update(nombre=col, archivo=f"c{i}.npy")
+            columnas.append(desc)
+        meta = {
+            "version": VERSION_WORKSPACE,
+            "filas": len(df),
+            "schema": schema,
+            "ordenado_por_fecha": ordenado_por_fecha,
+            "columnas": columnas,
+        }
+        with open(os.path.join(temporal, ARCHIVO_META), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=1)
+
+        if os.path.isdir(ruta):
+            shutil.rmtree(ruta)
+        os.replace(temporal, ruta)
+    except BaseException:
+        shutil.rmtree(temporal, ignore_errors=True)
+        raise
+    return ruta
+
+
+def leer_meta_workspace(ruta):
+    with open(os.path.join(ruta, ARCHIVO_META), encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") not in VERSIONES_LEGIBLES:
+        raise ValueError(f"Versión de workspace no soportada: {meta.get('version')}")
+    return meta
+
+
+def abrir_workspace(ruta):
+    """Abre un workspace en modo solo lectura, sin copiar columnas.
+
+    Devuelve (DataFrame, schema). Las columnas son vistas sobre archivos
+    mapeados en memoria: las acciones las leen normalmente y cualquier
+    transformación genera columnas nuevas en RAM.
+    """
+    meta = leer_meta_workspace(ruta)
+    columnas = {}
+    for desc in meta["columnas"]:
+        valores = np.load(os.path.join(ruta, desc["archivo"]), mmap_mode="r")
+        if desc["tipo"] == "categoria":
+            valores = pd.Categorical.from_codes(valores, categories=_leer_categorias(ruta, desc),
+                                                ordered=desc["ordenada"], validate=False)
+        elif desc["tipo"] == "fecha":
+            valores = valores.view(f"datetime64[{desc['unidad']}]")
+        columnas[desc["nombre"]] = pd.Series(valores, copy=False)
+
+    df = pd.DataFrame(columnas, copy=False)
+    return df, meta["schema"]
+
+
+def listar_workspaces(base=DIRECTORIO_WORKSPACES):
+    """Nombres de los workspaces disponibles en ``base`` (carpetas con meta.json)."""
+    if not os.path.isdir(base):
+        return []
+    return sorted(
+        nombre for nombre in os.listdir(base)
+        if not nombre.startswith(".") and os.path.isfile(os.path.join(base, nombre, ARCHIVO_META))
+    )